@@ -0,0 +1,596 @@
+# Benchmarks for metapool, written in the airspeed velocity (asv) style.
+#
+# Run with `asv run` from the repository root, or `asv dev` for a quick pass
+# against the working tree. Synthetic benchmarks are parametrized by the
+# number of wells: a 96, 384 and 1536 well plate, and a multi-plate run of
+# ten 384 well plates. Each has a `time_` and a `peakmem_` variant, so that
+# both the speed and the memory footprint of a function are tracked across
+# plate sizes. The `Fixtures` benchmarks run on the files in `test_data/`.
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from metapool.metapool import (read_plate_map_csv, read_pico_csv,
+                               read_quant_plate,
+                               calculate_norm_vol, format_dna_norm_picklist,
+                               write_dna_norm_picklist, IndexCombos,
+                               assign_index, format_index_picklist,
+                               write_index_picklist,
+                               compute_qpcr_concentration,
+                               compute_shotgun_pooling_values_qpcr_minvol,
+                               compute_shotgun_repooling_values,
+                               format_pooling_echo_pick_list,
+                               write_pooling_echo_pick_list,
+                               order_echo_pick_list, make_2D_array,
+                               check_index_distances, find_index_collisions,
+                               combine_dfs,
+                               format_sample_data, format_sample_sheet,
+                               parse_sample_sheet,
+                               write_sample_data, read_stats_json,
+                               read_multiqc_counts,
+                               reformat_interleaved_to_columns)
+from metapool.cache import read_excel_cached
+from metapool.profiling import Profile
+from metapool.wells import well_names, transform_layout, transform_wells
+
+
+# wells in a 96, 384 and 1536 well plate, and in ten 384 well plates
+SIZES = [96, 384, 1536, 3840]
+
+# pick lists are also written for 10,000 rows, to check that they scale
+# linearly beyond a set of plates
+PICKLIST_SIZES = SIZES + [10000]
+
+# (plates, rows, cols) of each size
+_LAYOUTS = {96: (1, 8, 12),
+            384: (1, 16, 24),
+            1536: (1, 32, 48),
+            3840: (10, 16, 24)}
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'test_data')
+
+
+def _wells(n):
+    if n not in _LAYOUTS:
+        # 384 well plates, the last one partly filled
+        return(np.resize(well_names(16, 24), n))
+
+    plates, rows, cols = _LAYOUTS[n]
+    return(np.tile(well_names(rows, cols), plates))
+
+
+def _names(prefix, n):
+    return(['%s%d' % (prefix, i) for i in range(n)])
+
+
+def _seqs(rng, n, length=8):
+    bases = np.array(list('ACGT'))
+    return([''.join(s) for s in rng.choice(bases, (n, length))])
+
+
+def _pico_text(wells, concs):
+    """Writes a MiniPico export in the layout of the plate reader"""
+    lines = ['Results\t\t\t\t\t', '\t\t\t\t\t',
+             'Well ID\tWell\t[Blanked-RFU]\t[DilutedConcentration]\t'
+             '[Concentration]\t']
+    lines += ['SPL%d\t%s\t%d\t%.3f\t%.3f\t' % (i + 1, well, conc * 250,
+                                               conc / 10, conc)
+              for i, (well, conc) in enumerate(zip(wells, concs))]
+    lines += ['\t\t\t\t\t', 'Curve2 Fitting Results\t\t\t\t\t', '\t\t\t\t\t',
+              'Curve Name\tCurve Formula\tA\tB\tR2\tFit F Prob',
+              'Curve2\tY=A*X+B\t1.54E+03\t0\t0.999\t?????']
+
+    return('\n'.join(lines) + '\n')
+
+
+class DNANormPicklist:
+    params = PICKLIST_SIZES
+    param_names = ['rows']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.dna_concs = rng.uniform(0, 50, n)
+        self.dna_vols = calculate_norm_vol(self.dna_concs, min_vol=25)
+        self.water_vols = 3500 - self.dna_vols
+        self.wells = _wells(n)
+        self.sample_names = np.array(_names('sample.', n))
+
+    def time_calculate_norm_vol(self, n):
+        calculate_norm_vol(self.dna_concs, min_vol=25)
+
+    def time_write_dna_norm_picklist(self, n):
+        write_dna_norm_picklist(StringIO(), self.dna_vols, self.water_vols,
+                                self.wells, dna_concs=self.dna_concs,
+                                sample_names=self.sample_names)
+
+    def peakmem_format_dna_norm_picklist(self, n):
+        format_dna_norm_picklist(self.dna_vols, self.water_vols, self.wells,
+                                 dna_concs=self.dna_concs,
+                                 sample_names=self.sample_names)
+
+
+class IndexPicklist:
+    params = PICKLIST_SIZES
+    param_names = ['rows']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.sample_names = pd.Series(_names('sample.', n))
+        self.sample_wells = pd.Series(_wells(n))
+        self.indices = pd.DataFrame({
+            'i5 name': ['iTru5_%d' % (i % 384) for i in range(n)],
+            'i5 plate': 'iTru5_plate',
+            'i5 sequence': _seqs(rng, n),
+            'i5 well': _wells(n),
+            'i7 name': ['iTru7_%d' % (i % 384) for i in range(n)],
+            'i7 plate': 'iTru7_plate',
+            'i7 sequence': _seqs(rng, n),
+            'i7 well': _wells(n),
+            'index combo': np.arange(n)})
+
+    def time_write_index_picklist(self, n):
+        write_index_picklist(StringIO(), self.sample_names,
+                             self.sample_wells, self.indices)
+
+    def peakmem_format_index_picklist(self, n):
+        format_index_picklist(self.sample_names, self.sample_wells,
+                              self.indices)
+
+
+class IndexDistances:
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.indices = pd.DataFrame({'index combo': np.arange(n),
+                                     'i5 sequence': _seqs(rng, n),
+                                     'i7 sequence': _seqs(rng, n)})
+
+    def time_check_index_distances(self, n):
+        check_index_distances(self.indices, barcode_mismatches=1)
+
+    def peakmem_check_index_distances(self, n):
+        check_index_distances(self.indices, barcode_mismatches=1)
+
+
+class IndexCollisions:
+    # samples on four lanes of a sample sheet
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.data = pd.DataFrame({'Lane': np.repeat([1, 2, 3, 4], n),
+                                  'Sample_ID': _names('sample_', n) * 4,
+                                  'index': _seqs(rng, n) * 4,
+                                  'index2': _seqs(rng, n) * 4})
+
+    def time_find_index_collisions(self, n):
+        find_index_collisions(self.data, barcode_mismatches=1)
+
+    def peakmem_find_index_collisions(self, n):
+        find_index_collisions(self.data, barcode_mismatches=1)
+
+
+class PoolingEchoPickList:
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        plates, rows, cols = _LAYOUTS[n]
+        rng = np.random.RandomState(42)
+        self.vols = rng.uniform(0, 3000, (plates * rows, cols))
+        self.vols[rng.uniform(size=self.vols.shape) < .05] = np.nan
+
+    def time_write_pooling_echo_pick_list(self, n):
+        write_pooling_echo_pick_list(StringIO(), self.vols,
+                                     max_vol_per_well=30000)
+
+    def peakmem_format_pooling_echo_pick_list(self, n):
+        format_pooling_echo_pick_list(self.vols, max_vol_per_well=30000)
+
+    def time_write_pooling_echo_pick_list_ffd(self, n):
+        write_pooling_echo_pick_list(StringIO(), self.vols,
+                                     max_vol_per_well=30000,
+                                     dest_plate_shape=[32, 48], packing='ffd')
+
+
+class Repooling:
+    # one pool per plate, with ten pools computed as a stack
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        plates, rows, cols = _LAYOUTS[n]
+        rng = np.random.RandomState(42)
+        shape = (plates, rows, cols) if plates > 1 else (rows, cols)
+        self.vols = rng.uniform(0, 3000, shape)
+        self.vols[rng.uniform(size=shape) < .05] = 0
+        self.concs = rng.uniform(0, 100, shape)
+        self.reads = np.round(self.vols * self.concs * rng.lognormal(0, 1,
+                                                                     shape))
+
+    def time_compute_shotgun_repooling_values(self, n):
+        compute_shotgun_repooling_values(self.reads, self.vols, self.concs)
+
+    def peakmem_compute_shotgun_repooling_values(self, n):
+        compute_shotgun_repooling_values(self.reads, self.vols, self.concs)
+
+
+class CombineDfs:
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        plates, rows, cols = _LAYOUTS[n]
+        rng = np.random.RandomState(42)
+        wells = _wells(n)
+        plate = np.repeat(['plate%d' % i for i in range(plates)],
+                          rows * cols)
+        names = _names('sample', n)
+
+        self.qpcr = pd.DataFrame({'Run': plate, 'Pos': wells,
+                                  'Cp': rng.uniform(10, 30, n)})
+        self.dna = pd.DataFrame({'Run': plate,
+                                 'Source Plate Name': 'Sample Plate',
+                                 'Concentration': rng.uniform(0, 60, n),
+                                 'Transfer Volume': rng.uniform(0, 3500, n),
+                                 'Destination Well': wells})
+        index = pd.DataFrame({'Run': plate, 'Sample Name': names,
+                              'Plate': plate, 'Counter': np.arange(n),
+                              'Primer': _names('primer', n),
+                              'Source Well': wells, 'Index': _seqs(rng, n),
+                              'Destination Well': wells})
+        self.index = pd.concat([index.assign(**{'Source Plate Name':
+                                                'i7 Source Plate'}),
+                                index.assign(**{'Source Plate Name':
+                                                'i5 Source Plate'})],
+                               ignore_index=True)
+
+    def time_combine_dfs(self, n):
+        combine_dfs(self.qpcr, self.dna, self.index, plate_col='Run')
+
+    def peakmem_combine_dfs(self, n):
+        combine_dfs(self.qpcr, self.dna, self.index, plate_col='Run')
+
+
+class OrderEchoPickList:
+    # index pick lists hold two transfers per well
+    params = PICKLIST_SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        indices = pd.DataFrame({'i5 name': _names('i5_', n),
+                                'i5 plate': 'i5_plate',
+                                'i5 sequence': _seqs(rng, n),
+                                'i5 well': _wells(n),
+                                'i7 name': _names('i7_', n),
+                                'i7 plate': 'i7_plate',
+                                'i7 sequence': _seqs(rng, n),
+                                'i7 well': _wells(n),
+                                'index combo': np.arange(n)})
+        self.picklist = format_index_picklist(_names('sample', n), _wells(n),
+                                              indices)
+
+    def time_order_echo_pick_list(self, n):
+        order_echo_pick_list(self.picklist)
+
+    def peakmem_order_echo_pick_list(self, n):
+        order_echo_pick_list(self.picklist)
+
+
+class Make2DArray:
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        plates, rows, cols = _LAYOUTS[n]
+        rng = np.random.RandomState(42)
+        self.shape = (rows, cols)
+        # one data frame per plate, in a shuffled well order
+        self.plates = [pd.DataFrame({'Pos': rng.permutation(_wells(n // plates)),
+                                     'Cp': rng.uniform(10, 30, n // plates)})
+                       for _ in range(plates)]
+
+    def time_make_2D_array(self, n):
+        for plate in self.plates:
+            make_2D_array(plate, rows=self.shape[0], cols=self.shape[1])
+
+    def peakmem_make_2D_array(self, n):
+        for plate in self.plates:
+            make_2D_array(plate, rows=self.shape[0], cols=self.shape[1])
+
+
+class ReadPicoCsv:
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.text = _pico_text(_wells(n), rng.uniform(0, 50, n))
+
+    def time_read_pico_csv(self, n):
+        read_pico_csv(StringIO(self.text))
+
+    def peakmem_read_pico_csv(self, n):
+        read_pico_csv(StringIO(self.text))
+
+    def time_read_quant_plate(self, n):
+        read_quant_plate(StringIO(self.text))
+
+    def peakmem_read_quant_plate(self, n):
+        read_quant_plate(StringIO(self.text))
+
+
+class SampleData:
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.sample_ids = _names('sample_', n)
+        self.names = ['index_%d' % (i % 384) for i in range(n)]
+        self.i5_seqs = _seqs(rng, n)
+        self.i7_seqs = _seqs(rng, n)
+        self.wells = list(_wells(n))
+
+    def time_write_sample_data(self, n):
+        write_sample_data(StringIO(), self.sample_ids, self.names,
+                          self.i7_seqs, self.names, self.i5_seqs, 'plate',
+                          'project', wells=self.wells, lanes=[1, 2, 3, 4])
+
+    def peakmem_format_sample_data(self, n):
+        format_sample_data(self.sample_ids, self.names, self.i7_seqs,
+                           self.names, self.i5_seqs, 'plate', 'project',
+                           wells=self.wells, lanes=[1, 2, 3, 4])
+
+
+class SampleSheet:
+    # parsing sheets of samples on four lanes
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        names = ['index_%d' % (i % 384) for i in range(n)]
+        data = format_sample_data(_names('sample_', n), names, _seqs(rng, n),
+                                  names, _seqs(rng, n), 'plate', 'project',
+                                  wells=list(_wells(n)), lanes=[1, 2, 3, 4])
+        self.sheet = format_sample_sheet({'comments': 'PI,Knight\n',
+                                          'IEMFileVersion': '4',
+                                          'Investigator Name': 'Knight',
+                                          'Experiment Name': 'benchmark',
+                                          'Date': '2017-08-13',
+                                          'Workflow': 'GenerateFASTQ',
+                                          'Application': 'FASTQ Only',
+                                          'Assay': 'Metagenomics',
+                                          'Description': '',
+                                          'Chemistry': 'Default',
+                                          'read1': 150, 'read2': 150,
+                                          'ReverseComplement': '0',
+                                          'data': data})
+        self.parsed = parse_sample_sheet(StringIO(self.sheet))
+
+    def time_parse_sample_sheet(self, n):
+        parse_sample_sheet(StringIO(self.sheet))
+
+    def peakmem_parse_sample_sheet(self, n):
+        parse_sample_sheet(StringIO(self.sheet))
+
+    def time_format_parsed_sample_sheet(self, n):
+        format_sample_sheet(self.parsed)
+
+
+class ReadCounts:
+    # demultiplexing stats and MultiQC tables of samples on four lanes
+    params = SIZES
+    param_names = ['samples']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        names = _names('sample', n)
+        reads = rng.randint(0, 10 ** 6, (4, n))
+
+        lanes = [{'LaneNumber': lane + 1,
+                  'DemuxResults': [
+                      {'SampleId': name, 'SampleName': name,
+                       'IndexMetrics': [{'IndexSequence': 'ACGTACGT+ACGTACGT',
+                                         'MismatchCounts': {'0': int(r)}}],
+                       'NumberReads': int(r), 'Yield': int(r) * 151,
+                       'ReadMetrics': [{'ReadNumber': 1, 'Yield': int(r)},
+                                       {'ReadNumber': 2, 'Yield': int(r)}]}
+                      for name, r in zip(names, reads[lane])],
+                  'Undetermined': {'NumberReads': 0}}
+                 for lane in range(4)]
+        self.stats = json.dumps({'ConversionResults': lanes}, indent=2)
+
+        lines = ['Sample\tFilename\tTotal Sequences\t%GC']
+        lines += ['%s_S%d_L%03d_R%d_001\tfile.fastq.gz\t%d.0\t45.0' %
+                  (name, i + 1, lane + 1, read, reads[lane, i])
+                  for lane in range(4) for i, name in enumerate(names)
+                  for read in (1, 2)]
+        self.multiqc = '\n'.join(lines) + '\n'
+
+    def time_read_stats_json(self, n):
+        read_stats_json(StringIO(self.stats))
+
+    def peakmem_read_stats_json(self, n):
+        read_stats_json(StringIO(self.stats))
+
+    def time_read_multiqc_counts(self, n):
+        read_multiqc_counts(StringIO(self.multiqc))
+
+
+class ReformatInterleaved:
+    # the interleaved layout is defined on 384 well plates, so every size is
+    # made of 384 well plate wells
+    params = SIZES
+    param_names = ['wells']
+
+    def setup(self, n):
+        self.wells = np.resize(well_names(16, 24), n)
+
+    def time_reformat_interleaved_to_columns(self, n):
+        reformat_interleaved_to_columns(self.wells)
+
+    def peakmem_reformat_interleaved_to_columns(self, n):
+        reformat_interleaved_to_columns(self.wells)
+
+
+class LayoutTransforms:
+    # sets of four 384 well plates condensed into 1536 well plates
+    params = [1, 10]
+    param_names = ['plates']
+
+    def setup(self, n):
+        rng = np.random.RandomState(42)
+        self.values = rng.uniform(size=(n, 4, 16, 24))
+        self.wells = np.tile(well_names(16, 24), 4 * n)
+        self.plates = np.tile(np.repeat(np.arange(4), 384), n)
+
+    def time_transform_layout(self, n):
+        for values in self.values:
+            transform_layout(values, '384_to_1536')
+
+    def time_transform_wells(self, n):
+        transform_wells(self.wells, '384_to_1536', plates=self.plates)
+
+
+class Fixtures:
+    """The notebook steps on the FinRisk 33-36 and MRSA files in test_data"""
+
+    def setup(self):
+        self.plate_map_fp = os.path.join(TEST_DATA, 'Plate_Maps',
+                                         'Finrisk 33-36_plate_map.tsv')
+        self.pico_fps = [os.path.join(TEST_DATA, 'Quant', 'MiniPico', fp)
+                         for fp in ['FinRisk_33-36_gDNA_quant.tsv',
+                                    '10-13-17_FinRisk_33-36_library_quant.txt']]
+        self.pico_fps.append(os.path.join(TEST_DATA, 'MRSA', 'Quant',
+                                          'MiniPico', '2017-08-01_MRSA_1-4.txt'))
+        self.qpcr_fp = os.path.join(TEST_DATA, 'Quant', 'qPCR',
+                                    '20170914_KHP_FinRisk_33-36_qPCR.txt')
+
+        index_fp = os.path.join(TEST_DATA, 'iTru',
+                                'new_iTru_index_list_Dec2017.xlsx')
+        self.i5 = pd.read_excel(index_fp, sheet_name='iTru5')
+        self.i7 = pd.read_excel(index_fp, sheet_name='iTru7')
+
+        plate_df = read_plate_map_csv(self.plate_map_fp)
+        with open(self.pico_fps[0]) as f:
+            plate_df = pd.merge(plate_df, read_pico_csv(f), on='Well')
+        self.plate_df = plate_df
+
+    def time_read_pico_csv(self):
+        for fp in self.pico_fps:
+            with open(fp) as f:
+                read_pico_csv(f)
+
+    def time_read_plate_map_csv(self):
+        read_plate_map_csv(self.plate_map_fp)
+
+    def time_index_combos(self):
+        combos = IndexCombos(self.i5, self.i7)
+        assign_index(384, combos, start_idx=len(combos) - 384)
+
+    def time_pipeline(self):
+        plate_df = self.plate_df.copy()
+        concs = plate_df['Sample DNA Concentration']
+
+        dna_vols = calculate_norm_vol(concs, min_vol=25)
+        format_dna_norm_picklist(np.array(dna_vols), np.array(3500 - dna_vols),
+                                 np.array(plate_df['Well']),
+                                 sample_names=np.array(plate_df['Sample']),
+                                 dna_concs=np.array(concs))
+
+        indices = assign_index(len(plate_df), IndexCombos(self.i5, self.i7))
+        format_index_picklist(plate_df['Sample'], plate_df['Well'], indices)
+
+        qpcr_df = pd.read_csv(self.qpcr_fp, sep='\t', skiprows=1, header=0)
+        plate_df = pd.merge(plate_df, qpcr_df[['Pos', 'Cp']], left_on='Well',
+                            right_on='Pos')
+        plate_df['Pooled Volume'] = compute_shotgun_pooling_values_qpcr_minvol(
+            np.nan_to_num(compute_qpcr_concentration(plate_df['Cp'])))
+        vols = make_2D_array(plate_df, data_col='Pooled Volume',
+                             well_col='Well').astype(float)
+        format_pooling_echo_pick_list(vols, max_vol_per_well=30000)
+
+    def peakmem_pipeline(self):
+        self.time_pipeline()
+
+
+class ExcelCache:
+    # reading the iTru index list, from the workbook and from the cache
+
+    def setup(self):
+        self.fp = os.path.join(TEST_DATA, 'iTru',
+                               'new_iTru_index_list_Dec2017.xlsx')
+        self.cache = tempfile.mkdtemp()
+        read_excel_cached(self.fp, sheet_name='iTru5', cache=self.cache)
+
+    def teardown(self):
+        shutil.rmtree(self.cache)
+
+    def time_read_excel(self):
+        pd.read_excel(self.fp, sheet_name='iTru5')
+
+    def time_read_excel_cached(self):
+        read_excel_cached(self.fp, sheet_name='iTru5', cache=self.cache)
+
+
+class Profiling:
+    # the cost of instrumentation, with and without an active profile, on a
+    # stage cheap enough for the overhead to show
+
+    def setup(self):
+        self.dna_concs = np.random.RandomState(42).uniform(0, 50, 384)
+
+    def time_uninstrumented(self):
+        calculate_norm_vol.__wrapped__(self.dna_concs)
+
+    def time_disabled(self):
+        calculate_norm_vol(self.dna_concs)
+
+    def time_enabled(self):
+        with Profile(memory=False):
+            calculate_norm_vol(self.dna_concs)
+
+
+class RenderPlates:
+    # QC figures of four 384 well plates, written to a PDF, with and without
+    # the distribution panel, in the calling process and in a worker pool
+    params = ([True, False], [1, None])
+    param_names = ['distribution', 'processes']
+    timeout = 300
+
+    def setup(self, distribution, processes):
+        rng = np.random.RandomState(42)
+        self.plates = [rng.uniform(0, 100, (16, 24)) for _ in range(4)]
+        self.tmp = tempfile.mkdtemp()
+
+    def teardown(self, distribution, processes):
+        shutil.rmtree(self.tmp)
+
+    def time_render_plates(self, distribution, processes):
+        from metapool.plotting import render_plates
+
+        render_plates(self.plates, os.path.join(self.tmp, 'plates.pdf'),
+                      distribution=distribution, processes=processes)
+
+
+class Import:
+    # run in a fresh interpreter, so that module caching does not hide the
+    # cost of importing the non-plotting API
+
+    def timeraw_import_metapool(self):
+        return('import metapool.metapool')
+
+    def timeraw_import_plotting(self):
+        return('import metapool.plotting')
@@ -0,0 +1,228 @@
+"""
+On-disk cache of parsed spreadsheets
+
+Index lists and plate specs are Excel workbooks that change rarely but are
+slow to parse. `read_excel_cached` stores each parsed sheet as a set of
+numpy column arrays in a `.npz` file, keyed on the path, size, modification
+time and content hash of the workbook, so that later reads skip the Excel
+parser entirely and pick up any change to the workbook.
+
+The cache lives in `$METAPOOL_CACHE_DIR`, or `~/.cache/metapool` by
+default, and is kept under a size cap by evicting the least recently used
+entries.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# default cap on the total size of the cache, in bytes
+MAX_CACHE_SIZE = 256 * 1024 ** 2
+
+_SUFFIX = '.npz'
+
+
+def cache_dir():
+    """
+    Locates the cache directory
+
+    Returns
+    -------
+    str
+        `$METAPOOL_CACHE_DIR` if set, else `metapool` in the user cache
+        directory
+    """
+    if os.environ.get('METAPOOL_CACHE_DIR'):
+        return(os.environ['METAPOOL_CACHE_DIR'])
+
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+
+    return(os.path.join(base, 'metapool'))
+
+
+def _file_key(fp, **kwargs):
+    """Hashes a file's path, size, mtime and contents with reader options"""
+    fp = os.path.abspath(fp)
+    stat = os.stat(fp)
+
+    content = hashlib.sha1()
+    with open(fp, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            content.update(block)
+
+    key = hashlib.sha1()
+    key.update(repr((fp, stat.st_size, stat.st_mtime_ns, content.hexdigest(),
+                     sorted(kwargs.items()))).encode('utf-8'))
+
+    return(key.hexdigest())
+
+
+def _write_frame(fp, df):
+    """Stores a DataFrame as one numpy array per column"""
+    if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and \
+            df.index.step == 1:
+        index_names = None
+        flat = df
+    else:
+        index_names = list(df.index.names)
+        flat = df.reset_index()
+
+    arrays = {}
+    columns = []
+    for i, (name, col) in enumerate(flat.items()):
+        if col.dtype.kind in 'biufcmM':
+            arrays['c%d' % i] = col.to_numpy()
+            kind = 'values'
+        else:
+            values = col.to_numpy(dtype=object)
+            null = pd.isnull(values)
+            if not all(isinstance(v, str) for v in values[~null]):
+                raise TypeError('Column %r is not all str' % (name,))
+            arrays['c%d' % i] = np.where(null, '', values).astype(str)
+            arrays['n%d' % i] = null
+            kind = 'str'
+        columns.append([name, kind, str(col.dtype)])
+
+    # raises TypeError for column names that JSON cannot hold
+    arrays['meta'] = np.array(json.dumps({'columns': columns,
+                                          'index': index_names}))
+
+    tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(fp),
+                                      suffix=_SUFFIX, delete=False)
+    try:
+        with tmp:
+            np.savez(tmp, **arrays)
+        os.replace(tmp.name, fp)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+
+
+def _read_frame(fp):
+    """Rebuilds a DataFrame stored by `_write_frame`"""
+    with np.load(fp, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays['meta']))
+
+        data = {}
+        for i, (name, kind, dtype) in enumerate(meta['columns']):
+            values = arrays['c%d' % i]
+            if kind == 'str':
+                values = values.astype(object)
+                values[arrays['n%d' % i]] = np.nan
+                data[i] = pd.Series(values, dtype=object).astype(dtype)
+            else:
+                data[i] = pd.Series(values)
+
+    df = pd.concat(data, axis=1) if data else pd.DataFrame()
+    df.columns = [name for name, _, _ in meta['columns']]
+
+    index = meta['index']
+    if index is None:
+        return(df)
+
+    df = df.set_index(df.columns[:len(index)].tolist())
+    df.index.names = index
+
+    return(df)
+
+
+def _evict(directory, max_size):
+    """Deletes the least recently used entries beyond `max_size` bytes"""
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(_SUFFIX):
+            stat = os.stat(os.path.join(directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            continue
+        total -= size
+
+
+def read_excel_cached(fp, sheet_name=0, cache=None,
+                      max_cache_size=MAX_CACHE_SIZE, **kwargs):
+    """
+    Reads a sheet of an Excel workbook, through an on-disk cache
+
+    Parameters
+    ----------
+    fp: str
+        path to the workbook
+    sheet_name: str or int
+        the sheet to read, by name or position. Lists of sheets, and None
+        for all sheets, are read without the cache.
+    cache: str
+        the cache directory, defaults to `cache_dir()`
+    max_cache_size: int
+        the size, in bytes, beyond which least recently used entries are
+        evicted from the cache
+    kwargs
+        further arguments to `pandas.read_excel`
+
+    Returns
+    -------
+    pandas DataFrame
+        the sheet, as `pandas.read_excel` would return it
+    """
+    if sheet_name is None or isinstance(sheet_name, list):
+        # several sheets come back as a dict of DataFrames, which is not
+        # cached
+        return(pd.read_excel(fp, sheet_name=sheet_name, **kwargs))
+
+    cache = cache_dir() if cache is None else cache
+    # entries written by another version of pandas may not rebuild the same
+    entry = os.path.join(cache, _file_key(fp, sheet_name=sheet_name,
+                                          pandas=pd.__version__,
+                                          **kwargs) + _SUFFIX)
+
+    if os.path.exists(entry):
+        try:
+            df = _read_frame(entry)
+        except (OSError, ValueError, KeyError):
+            pass
+        else:
+            # entries are evicted by modification time; a read-only cache,
+            # or an entry evicted meanwhile, only loses its place
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+            return(df)
+
+    df = pd.read_excel(fp, sheet_name=sheet_name, **kwargs)
+
+    try:
+        os.makedirs(cache, exist_ok=True)
+        _write_frame(entry, df)
+        _evict(cache, max_cache_size)
+    except (OSError, TypeError):
+        # an unwritable cache, or a sheet that cannot be stored, only costs
+        # the next read its speed
+        pass
+
+    return(df)
+
+
+def clear_cache(cache=None):
+    """
+    Deletes every entry of the cache
+
+    Parameters
+    ----------
+    cache: str
+        the cache directory, defaults to `cache_dir()`
+    """
+    cache = cache_dir() if cache is None else cache
+    if os.path.isdir(cache):
+        _evict(cache, 0)
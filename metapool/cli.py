@@ -0,0 +1,432 @@
+"""
+Command line interface to the metapool pipelines
+
+Each subcommand runs one step of the metagenomics pooling notebooks on one
+or more run directories. A run directory holds the input files of a plate
+set under fixed names (which can be changed with options) and collects the
+pick lists and sample sheets written for it, along with a plate dataframe
+(`plate_df.tsv`) that carries sample information from one step to the next:
+
+    metapool normalize runs/*
+    metapool index runs/* --index-combos iTru_combos.csv --start-combo 1152
+    metapool pool runs/* --method minvol
+    metapool samplesheet runs/* --sequencer HiSeq4000 --lanes 1 2 3 4
+
+Nothing here imports the plotting stack, so batches run without a display
+or a Jupyter kernel.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from metapool.metapool import (read_plate_map_csv, read_pico_csv,
+                               calculate_norm_vol, write_dna_norm_picklist,
+                               IndexCombos, assign_index,
+                               write_index_picklist,
+                               compute_qpcr_concentration,
+                               compute_shotgun_pooling_values_eqvol,
+                               compute_shotgun_pooling_values_qpcr,
+                               compute_shotgun_pooling_values_qpcr_minvol,
+                               make_2D_array, write_pooling_echo_pick_list,
+                               format_sheet_comments, write_sample_sheet,
+                               write_sample_data, bcl_scrub_name,
+                               sequencer_i5_index,
+                               reformat_interleaved_to_columns,
+                               order_echo_pick_list)
+from metapool.cache import read_excel_cached
+from metapool.profiling import Profile, stage
+
+
+PLATE_DF = 'plate_df.tsv'
+
+# columns of the plate dataframe that must stay str when read back in
+_STR_COLUMNS = ['Sample', 'Row', 'Well', 'Library Well', 'i5 name',
+                'i5 sequence', 'i5 well', 'i7 name', 'i7 sequence', 'i7 well']
+
+
+def _run_path(run, fp):
+    """Resolves a file name against a run directory"""
+    return(fp if os.path.isabs(fp) else os.path.join(run, fp))
+
+
+def read_plate_df(run):
+    """
+    Reads the plate dataframe of a run directory
+
+    Parameters
+    ----------
+    run: str
+        path to the run directory
+
+    Returns
+    -------
+    plate_df: pandas DataFrame
+        the sample information collected for the run so far
+    """
+    fp = _run_path(run, PLATE_DF)
+    header = pd.read_csv(fp, sep='\t', nrows=0).columns
+
+    return(pd.read_csv(fp, sep='\t', keep_default_na=False,
+                       na_values=[''],
+                       dtype={c: str for c in _STR_COLUMNS if c in header}))
+
+
+def write_plate_df(run, plate_df):
+    """
+    Writes the plate dataframe of a run directory
+
+    Parameters
+    ----------
+    run: str
+        path to the run directory
+    plate_df: pandas DataFrame
+        the sample information collected for the run
+    """
+    plate_df.to_csv(_run_path(run, PLATE_DF), sep='\t', index=False)
+
+
+def _write_picklist(run, args, write):
+    """Writes a pick list, ordering its transfers if asked to"""
+    fp = _run_path(run, args.output)
+
+    if not args.order_transfers:
+        with open(fp, 'w') as f:
+            write(f)
+        return('')
+
+    picklist = StringIO()
+    write(picklist)
+    picklist, moves = order_echo_pick_list(picklist.getvalue())
+
+    with open(fp, 'w') as f:
+        f.write(picklist)
+
+    return(', stage travel %d -> %d wells' %
+           (moves['stage travel']['before'], moves['stage travel']['after']))
+
+
+def normalize(run, args):
+    plate_df = read_plate_map_csv(_run_path(run, args.plate_map))
+
+    dupes = plate_df['Sample'][plate_df['Sample'].duplicated()]
+    if len(dupes):
+        raise ValueError('Duplicate sample names in plate map: %s' %
+                         ', '.join(map(str, dupes.unique())))
+
+    with open(_run_path(run, args.pico)) as f:
+        sample_concs = read_pico_csv(f)
+    plate_df = pd.merge(plate_df, sample_concs, on='Well')
+
+    dna_vols = calculate_norm_vol(plate_df['Sample DNA Concentration'],
+                                  ng=args.ng, min_vol=args.min_vol,
+                                  max_vol=args.total_vol,
+                                  resolution=args.resolution)
+    plate_df['Normalized DNA volume'] = dna_vols
+    plate_df['Normalized water volume'] = args.total_vol - dna_vols
+
+    if args.interleaved:
+        plate_df['Library Well'] = \
+            reformat_interleaved_to_columns(plate_df['Well'])
+    else:
+        plate_df['Library Well'] = plate_df['Well']
+
+    def write(f):
+        write_dna_norm_picklist(
+            f, np.array(plate_df['Normalized DNA volume']),
+            np.array(plate_df['Normalized water volume']),
+            np.array(plate_df['Well']),
+            dest_wells=np.array(plate_df['Library Well']),
+            sample_names=np.array(plate_df['Sample']),
+            dna_concs=np.array(plate_df['Sample DNA Concentration']))
+
+    ordered = _write_picklist(run, args, write)
+
+    write_plate_df(run, plate_df)
+
+    return('%d samples normalized%s' % (len(plate_df), ordered))
+
+
+def _read_index_combos(fp):
+    if fp.endswith(('.xls', '.xlsx')):
+        return(IndexCombos(read_excel_cached(fp, sheet_name='iTru5'),
+                           read_excel_cached(fp, sheet_name='iTru7')))
+
+    return(pd.read_csv(fp))
+
+
+def index(run, args):
+    plate_df = read_plate_df(run)
+    plate_df = plate_df.drop(columns=[c for c in plate_df.columns
+                                      if c.startswith(('i5 ', 'i7 ',
+                                                       'index combo'))])
+
+    indices = assign_index(len(plate_df), args.combos,
+                           start_idx=args.start_combo,
+                           barcode_mismatches=args.barcode_mismatches)
+    indices = indices.reset_index(drop=True)
+
+    def write(f):
+        write_index_picklist(f, plate_df['Sample'], plate_df['Library Well'],
+                             indices)
+
+    ordered = _write_picklist(run, args, write)
+
+    write_plate_df(run, pd.concat([plate_df, indices], axis=1))
+
+    return('%d samples assigned index combos %d-%d%s' %
+           (len(plate_df), args.start_combo,
+            args.start_combo + len(plate_df) - 1, ordered))
+
+
+def pool(run, args):
+    plate_df = read_plate_df(run)
+    plate_df = plate_df.drop(columns=[c for c in ['Pos', 'Cp',
+                                                  'Library Concentration',
+                                                  'Pooled Volume']
+                                      if c in plate_df.columns])
+
+    qpcr_df = pd.read_csv(_run_path(run, args.qpcr), sep='\t', skiprows=1,
+                          header=0)
+    plate_df = pd.merge(plate_df, qpcr_df[['Pos', 'Cp']],
+                        left_on='Library Well', right_on='Pos')
+
+    plate_df['Library Concentration'] = \
+        compute_qpcr_concentration(plate_df['Cp'])
+    # as in the qPCR normalization notebook, volumes are computed over the
+    # samples of the run rather than the wells of a plate, so the empty
+    # wells of a partly filled plate take no share of the pool
+    concs = np.nan_to_num(plate_df['Library Concentration'])
+
+    if args.method == 'eqvol':
+        vols = compute_shotgun_pooling_values_eqvol(concs,
+                                                    total_vol=args.total_vol)
+    elif args.method == 'minvol':
+        vols = compute_shotgun_pooling_values_qpcr_minvol(
+            concs, floor_vol=args.floor_vol, floor_conc=args.floor_conc,
+            total_nmol=args.total_nmol)
+    else:
+        vols = compute_shotgun_pooling_values_qpcr(
+            concs, min_conc=args.min_conc, floor_conc=args.floor_conc,
+            total_nmol=args.total_nmol)
+    plate_df['Pooled Volume'] = vols
+
+    vols = make_2D_array(plate_df, data_col='Pooled Volume',
+                         well_col='Library Well').astype(float)
+
+    def write(f):
+        write_pooling_echo_pick_list(f, vols,
+                                     max_vol_per_well=args.max_vol_per_well,
+                                     packing=args.packing)
+
+    ordered = _write_picklist(run, args, write)
+
+    write_plate_df(run, plate_df)
+
+    return('%d samples pooled, %.1f nL in total%s' %
+           (len(plate_df), np.nansum(plate_df['Pooled Volume']), ordered))
+
+
+def _parse_contacts(pairs):
+    contacts = {}
+    for pair in pairs:
+        name, sep, email = pair.partition('=')
+        if not sep:
+            raise ValueError('Contacts must be given as NAME=EMAIL, not %r'
+                             % pair)
+        contacts[name] = email
+
+    return(contacts)
+
+
+def samplesheet(run, args):
+    plate_df = read_plate_df(run)
+
+    i5_seq = sequencer_i5_index(args.sequencer,
+                                np.asarray(plate_df['i5 sequence']))
+
+    sample_ids = plate_df['Sample'].map(bcl_scrub_name)
+    if args.pi or args.contact:
+        comments = format_sheet_comments(
+            PI=_parse_contacts(args.pi) or None,
+            contacts=_parse_contacts(args.contact) or None)
+    else:
+        comments = ''
+
+    sample_sheet_dict = {'comments': comments,
+                         'IEMFileVersion': '4',
+                         'Investigator Name': args.investigator,
+                         'Experiment Name': args.experiment,
+                         'Date': args.date,
+                         'Workflow': 'GenerateFASTQ',
+                         'Application': 'FASTQ Only',
+                         'Assay': args.assay,
+                         'Description': '',
+                         'Chemistry': 'Default',
+                         'read1': args.read_length,
+                         'read2': args.read_length,
+                         'ReverseComplement': '0'}
+
+    # the [Data] rows are spooled to a temporary file rather than a string
+    with open(_run_path(run, args.output), 'w') as f, \
+            tempfile.TemporaryFile('w+') as data:
+        write_sample_data(data, sample_ids, plate_df['i7 name'],
+                          plate_df['i7 sequence'], plate_df['i5 name'],
+                          i5_seq, wells=plate_df['Library Well'],
+                          sample_plate=args.project_plate,
+                          description=plate_df['Sample'],
+                          sample_proj=args.project_name,
+                          lanes=args.lanes,
+                          barcode_mismatches=args.barcode_mismatches)
+        data.seek(0)
+        sample_sheet_dict['data'] = data
+        write_sample_sheet(f, sample_sheet_dict)
+
+    return('%d samples on %d lane(s)' % (len(plate_df), len(args.lanes)))
+
+
+def _write_profile(profile, fp):
+    if fp.endswith('.json'):
+        profile.to_json(fp)
+    else:
+        profile.to_csv(fp)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='metapool',
+        description='Run the metagenomics pooling steps on run directories.')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    def add_command(name, func, help, output):
+        sub = subparsers.add_parser(name, help=help, description=help)
+        sub.add_argument('runs', nargs='+', metavar='RUN',
+                         help='run directories to process')
+        sub.add_argument('--output', default=output,
+                         help='file written in each run directory '
+                              '(default: %(default)s)')
+        sub.add_argument('--profile', default=None, metavar='FILE',
+                         help='record the time and memory used by each step '
+                              'to this file in each run directory (.csv or '
+                              '.json)')
+        sub.set_defaults(func=func)
+        return(sub)
+
+    def add_ordering(sub):
+        sub.add_argument('--order-transfers', action='store_true',
+                         help='order the transfers by source plate and in a '
+                              'serpentine over its wells, to cut the moves '
+                              'of the Echo')
+
+    sub = add_command('normalize', normalize,
+                      'Write input DNA normalization pick lists.',
+                      'input_norm.txt')
+    sub.add_argument('--plate-map', default='plate_map.tsv')
+    sub.add_argument('--pico', default='pico.tsv',
+                     help='MiniPico export of the gDNA quantification')
+    sub.add_argument('--ng', type=float, default=5)
+    sub.add_argument('--total-vol', type=float, default=3500)
+    sub.add_argument('--min-vol', type=float, default=25)
+    sub.add_argument('--resolution', type=float, default=2.5)
+    sub.add_argument('--interleaved', action='store_true',
+                     help='reformat interleaved wells to columns')
+    add_ordering(sub)
+
+    sub = add_command('index', index, 'Write index pick lists.',
+                      'indices.txt')
+    sub.add_argument('--index-combos', required=True,
+                     help='index combination table (.csv), or iTru index '
+                          'list workbook (.xlsx)')
+    sub.add_argument('--start-combo', type=int, default=0)
+    sub.add_argument('--barcode-mismatches', type=int, default=None,
+                     help='check that the indices can be demultiplexed '
+                          'with this many mismatches')
+    add_ordering(sub)
+
+    sub = add_command('pool', pool, 'Write pooling pick lists.',
+                      'pooling.csv')
+    sub.add_argument('--qpcr', default='qpcr.txt')
+    sub.add_argument('--method', choices=['eqvol', 'minvol', 'floor'],
+                     default='minvol')
+    sub.add_argument('--total-vol', type=float, default=100,
+                     help='total volume (µL) pooled from the samples of '
+                          'each run for eqvol')
+    sub.add_argument('--floor-vol', type=float, default=80)
+    sub.add_argument('--floor-conc', type=float, default=40)
+    sub.add_argument('--min-conc', type=float, default=0)
+    sub.add_argument('--total-nmol', type=float, default=.008)
+    sub.add_argument('--max-vol-per-well', type=float, default=30000)
+    sub.add_argument('--packing', choices=['sequential', 'ffd'],
+                     default='sequential',
+                     help='fill destination wells in sample order, or pack '
+                          'samples into as few wells as possible')
+    add_ordering(sub)
+
+    sub = add_command('samplesheet', samplesheet, 'Write sample sheets.',
+                      'samplesheet.csv')
+    sub.add_argument('--sequencer', required=True)
+    sub.add_argument('--lanes', type=int, nargs='+', default=[1])
+    sub.add_argument('--project-name', required=True)
+    sub.add_argument('--project-plate', required=True)
+    sub.add_argument('--experiment', default='')
+    sub.add_argument('--date', default='')
+    sub.add_argument('--investigator', default='Knight')
+    sub.add_argument('--assay', default='Metagenomics')
+    sub.add_argument('--read-length', type=int, default=150)
+    sub.add_argument('--barcode-mismatches', type=int, default=None,
+                     help='check that the samples of each lane can be '
+                          'demultiplexed with this many mismatches')
+    sub.add_argument('--pi', action='append', default=[],
+                     metavar='NAME=EMAIL')
+    sub.add_argument('--contact', action='append', default=[],
+                     metavar='NAME=EMAIL')
+
+    return(parser)
+
+
+def main(argv=None):
+    """
+    Runs a metapool subcommand on each of the given run directories
+
+    Parameters
+    ----------
+    argv: list of str
+        command line arguments, defaults to `sys.argv[1:]`
+
+    Returns
+    -------
+    int
+        the exit status: 0 if every run succeeded, 1 otherwise
+    """
+    args = _parser().parse_args(argv)
+
+    # shared inputs are read once for the whole batch
+    if args.command == 'index':
+        args.combos = _read_index_combos(args.index_combos)
+
+    failed = 0
+    for run in args.runs:
+        try:
+            if args.profile:
+                with Profile() as profile:
+                    with stage(args.command):
+                        message = args.func(run, args)
+                _write_profile(profile, _run_path(run, args.profile))
+            else:
+                message = args.func(run, args)
+        except (IOError, ValueError, KeyError) as e:
+            failed += 1
+            print('%s: failed: %s' % (run, e), file=sys.stderr)
+        else:
+            print('%s: %s' % (run, message), file=sys.stderr)
+
+    return(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
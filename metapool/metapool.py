@@ -1,14 +1,23 @@
+import csv
+import itertools
+import json
 import os
 import re
+import shutil
 import numpy as np
 import pandas as pd
 import string
 import sys
-import seaborn as sns
-import matplotlib.pyplot as plt
+from contextlib import contextmanager
+from functools import lru_cache
 from io import StringIO
 
+from metapool.profiling import instrument
+from metapool.wells import (PLATE_SHAPES, plate_shape, well_names,
+                            well_to_index, well_to_rowcol, transform_wells)
 
+
+@instrument
 def read_plate_map_csv(f, sep = '\t'):
     """
     reads tab-delimited plate map into a Pandas dataframe
@@ -30,7 +39,26 @@ def read_plate_map_csv(f, sep = '\t'):
     return(plate_df)
 
 
+def _read_text(f):
+    """Reads the whole contents of a file path or open filehandle"""
+    if hasattr(f, 'read'):
+        return(f.read())
+
+    with open(f, 'r') as fh:
+        return(fh.read())
+
+
+def _count_table_rows(lines, sep='\t'):
+    """Counts the rows of a table up to the first blank line"""
+    for i, line in enumerate(lines):
+        if not line.strip().strip(sep).strip():
+            return(i)
+
+    return(len(lines))
+
+
 # method to read minipico output
+@instrument
 def read_pico_csv(f, sep='\t', conc_col_name='Sample DNA Concentration'):
     """
     reads tab-delimited pico quant
@@ -50,39 +78,248 @@ def read_pico_csv(f, sep='\t', conc_col_name='Sample DNA Concentration'):
         DataFrame relating well location and DNA concentration
     """
 
-    raw_df = pd.read_csv(f, sep = sep, skiprows=2,
-                         skipfooter=5, engine='python')
+    text = _read_text(f)
+
+    # the results table ends at the first blank line, before the curve
+    # fitting footer, so only that many rows need to be parsed
+    lines = text.splitlines()
+    nrows = _count_table_rows(lines[3:], sep=sep)
+
+    pico_df = pd.read_csv(StringIO(text), sep=sep, skiprows=2, nrows=nrows,
+                          usecols=['Well', '[Concentration]'],
+                          dtype={'Well': str, '[Concentration]': str})
 
-    pico_df = raw_df[['Well','[Concentration]']]
-    pico_df = pico_df.rename(columns={'[Concentration]':conc_col_name})
+    pico_df = pico_df.rename(columns={'[Concentration]': conc_col_name})
 
     # coerce oddball concentrations to np.nan
     pico_df[conc_col_name] = \
-        pd.to_numeric(pico_df[conc_col_name], errors = 'coerce')
-    
+        pd.to_numeric(pico_df[conc_col_name], errors='coerce')
+
     return(pico_df)
 
 
+def _quant_rows(rows, well_col, conc_col):
+    """Finds the header among rows of cells and reads the table below it"""
+    wells = []
+    concs = []
+    well_i = None
+
+    for row in rows:
+        cells = ['' if c is None else str(c).strip() for c in row]
+        if well_i is None:
+            if well_col in cells and conc_col in cells:
+                well_i = cells.index(well_col)
+                conc_i = cells.index(conc_col)
+            continue
+
+        # the table ends at the first row without a well
+        if len(cells) <= well_i or not cells[well_i]:
+            break
+        wells.append(cells[well_i])
+        concs.append(cells[conc_i] if len(cells) > conc_i else '')
+
+    if well_i is None:
+        raise ValueError('No header with columns %r and %r was found' %
+                         (well_col, conc_col))
+
+    return(wells, concs)
+
+
+def _excel_rows(fp, sheet_name=None):
+    """Iterates over the rows of a workbook sheet without loading it all"""
+    # openpyxl is the engine pandas uses for xlsx files
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fp, read_only=True, data_only=True)
+    try:
+        ws = wb.active if sheet_name is None else wb[sheet_name]
+        for row in ws.iter_rows(values_only=True):
+            yield(row)
+    finally:
+        wb.close()
+
+
+@instrument
+def read_quant_plate(f, conc_col='[Concentration]', well_col='Well',
+                     sep='\t', plate_size=None, sheet_name=None):
+    """
+    Reads the DNA concentrations of a plate from a quant export
+
+    The header row is found by its column names, wherever it is in the file,
+    and the table is read up to the first row without a well. Both Excel
+    workbooks (.xlsx) and tab-delimited exports are accepted.
+
+    Parameters
+    ----------
+    f: fp or open filehandle
+        quant file; paths ending in .xlsx or .xlsm are read as workbooks
+    conc_col: str
+        name of the concentration column
+    well_col: str
+        name of the well column
+    sep: str
+        sep char used in delimited quant files
+    plate_size: int
+        number of wells on the plate (96, 384 or 1536); by default the
+        smallest plate that holds all of the wells read
+    sheet_name: str
+        workbook sheet to read, defaults to the active sheet
+
+    Returns
+    -------
+    concs: numpy array of float
+        concentration of each well, indexed by row-major well index, with
+        NaN for wells that are not in the file or have no valid
+        concentration
+    """
+    if isinstance(f, str) and f.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _excel_rows(f, sheet_name=sheet_name)
+    else:
+        rows = (line.split(sep) for line in _read_text(f).splitlines())
+
+    wells, concs = _quant_rows(rows, well_col, conc_col)
+
+    # decode on the largest plate, then place the wells on the plate size
+    big_rows, big_cols = plate_shape(max(PLATE_SHAPES))
+    row, col = well_to_rowcol(wells, big_rows, big_cols)
+
+    if plate_size is None:
+        fits = [size for size, (r, c) in sorted(PLATE_SHAPES.items())
+                if not len(wells) or (row.max() < r and col.max() < c)]
+        plate_size = fits[0]
+    n_rows, n_cols = plate_shape(plate_size)
+    if len(wells) and (row.max() >= n_rows or col.max() >= n_cols):
+        raise ValueError('Wells are not all on a %d well plate' % plate_size)
+
+    out = np.full(plate_size, np.nan)
+    out[row * n_cols + col] = pd.to_numeric(np.array(concs, dtype=object),
+                                           errors='coerce')
+
+    return(out)
+
+
+@instrument
+def read_pico_csvs(fps, plate_names=None, plate_col='Plate', sep='\t',
+                   conc_col_name='Sample DNA Concentration'):
+    """
+    reads several tab-delimited pico quants into a single long DataFrame
+
+    Parameters
+    ----------
+    fps: list of fp or open filehandle
+        pico quant files, one per plate
+    plate_names: list of str
+        plate name for each file. Defaults to the file names without
+        extension, or to 'Plate1', 'Plate2', ... for filehandles without a
+        file name
+    plate_col: str
+        name to use for the plate column output
+    sep: str
+        sep char used in quant files
+    conc_col_name: str
+        name to use for concentration column output
+
+    Returns
+    -------
+    pico_df: pandas DataFrame object
+        DataFrame relating plate, well location and DNA concentration
+    """
+    if plate_names is None:
+        plate_names = []
+        for i, f in enumerate(fps):
+            name = f if isinstance(f, str) else getattr(f, 'name', None)
+            if isinstance(name, str):
+                name = os.path.splitext(os.path.basename(name))[0]
+            else:
+                name = 'Plate%d' % (i + 1)
+            plate_names.append(name)
+
+    if len(plate_names) != len(fps):
+        raise ValueError('%s plate names given for %s files' %
+                         (len(plate_names), len(fps)))
+
+    plates = [read_pico_csv(f, sep=sep, conc_col_name=conc_col_name)
+              for f in fps]
+
+    pico_df = pd.concat(plates, ignore_index=True)
+    pico_df.insert(0, plate_col,
+                   pd.Categorical(np.repeat(plate_names,
+                                            [len(p) for p in plates]),
+                                  categories=pd.unique(np.array(plate_names))))
+
+    return(pico_df)
+
+
+def _is_plate_stack(a):
+    """Whether an array is a stack of plates, shaped (n_plates, rows, cols)"""
+    return(np.ndim(a) == 3)
+
+
+def _per_plate(param, a):
+    """
+    Shapes a parameter so it broadcasts against the plates in `a`
+
+    A 1D `param` given for a stack of plates holds one value per plate, and
+    is reshaped to (n_plates, 1, 1). Anything else is returned as is.
+    """
+    if _is_plate_stack(a) and np.ndim(param) == 1:
+        param = np.asarray(param)
+        if param.size != np.shape(a)[0]:
+            raise ValueError('%s per-plate values given for %s plates' %
+                             (param.size, np.shape(a)[0]))
+        return(param[:, np.newaxis, np.newaxis])
+
+    return(param)
+
+
+def _plate_sum(a, keepdims=False):
+    """Sums each plate of a stack of plates, or the whole of a single plate"""
+    if _is_plate_stack(a):
+        return(a.sum(axis=(1, 2), keepdims=keepdims))
+
+    return(a.sum())
+
+
+def _plate_size(a):
+    """Number of wells in each plate of a stack, or in a single plate"""
+    if _is_plate_stack(a):
+        return(np.shape(a)[1] * np.shape(a)[2])
+
+    return(np.size(a))
+
+
+@instrument
 def calculate_norm_vol(dna_concs, ng=5, min_vol=2.5, max_vol=3500, resolution=2.5):
     """
     Calculates nanoliters of each sample to add to achieve a normalized pool
 
+    `dna_concs` may be a single plate or a stack of plates shaped
+    (n_plates, rows, cols), in which case each parameter may also be given
+    as a vector with one value per plate.
+
     Parameters
     ----------
     dna_concs : numpy array of float
         The concentrations calculated via PicoGreen (ng/uL)
-    ng : float
+    ng : float or 1D array of float
         The amount of DNA to pool (ng)
-    max_vol : float
+    max_vol : float or 1D array of float
         The maximum volume to pool (nL)
-    min_vol : float
+    min_vol : float or 1D array of float
         The minimum volume to pool (nL)
+    resolution : float or 1D array of float
+        The resolution to round volumes to (nL)
 
     Returns
     -------
     sample_vols : numpy array of float
         The volumes to pool (nL)
     """
+    ng = _per_plate(ng, dna_concs)
+    min_vol = _per_plate(min_vol, dna_concs)
+    max_vol = _per_plate(max_vol, dna_concs)
+    resolution = _per_plate(resolution, dna_concs)
+
     sample_vols = ng / np.nan_to_num(dna_concs) * 1000
     
     sample_vols = np.clip(sample_vols, min_vol, max_vol)
@@ -92,16 +329,71 @@ def calculate_norm_vol(dna_concs, ng=5, min_vol=2.5, max_vol=3500, resolution=2.
     return(sample_vols)
 
 
-def format_dna_norm_picklist(dna_vols, water_vols, wells, dest_wells=None,
-                             dna_concs=None, sample_names=None,
-                             sample_plates = None, water_plate_name='Water',
-                             dna_plate_type='384PP_AQ_BP2_HT', water_plate_type='384PP_AQ_BP2_HT',
-                             dest_plate_name='NormalizedDNA'):
+def _str_column(values, size=None):
     """
-    Writes Echo-format pick list to achieve a normalized input DNA pool
+    Flattens an array (or repeats a scalar) into a list of str
 
     Parameters
     ----------
+    values: array-like or scalar
+        the values to convert, flattened in row-major order
+    size: int
+        the number of rows to repeat a scalar `values` across
+
+    Returns
+    -------
+    column: list of str
+        the values as they would be formatted by `str`
+    """
+    if np.isscalar(values) or values is None:
+        return([str(values)] * size)
+
+    return(np.asarray(values).astype(str).ravel().tolist())
+
+
+def _write_rows(f, columns, sep='\t', chunk_size=10000):
+    """
+    Streams rows built from equal-length columns of str to a file handle
+
+    Every row, including the first, is preceded by a newline, so that the
+    rows can directly follow a header line without a trailing newline.
+
+    Parameters
+    ----------
+    f: open filehandle
+        writable text stream
+    columns: list of list of str
+        the columns of the table
+    sep: str
+        field separator
+    chunk_size: int
+        number of rows to join per write
+    """
+    n = len(columns[0])
+
+    for start in range(0, n, chunk_size):
+        rows = zip(*[col[start:start + chunk_size] for col in columns])
+        f.write('\n' + '\n'.join(sep.join(row) for row in rows))
+
+
+@instrument
+def write_dna_norm_picklist(f, dna_vols, water_vols, wells, dest_wells=None,
+                            dna_concs=None, sample_names=None,
+                            sample_plates=None, water_plate_name='Water',
+                            dna_plate_type='384PP_AQ_BP2_HT',
+                            water_plate_type='384PP_AQ_BP2_HT',
+                            dest_plate_name='NormalizedDNA'):
+    """
+    Streams an Echo-format pick list for a normalized input DNA pool
+
+    Produces exactly the same text as `format_dna_norm_picklist`, but
+    builds each field as a whole column and writes the rows in chunks
+    to `f` instead of accumulating a single string.
+
+    Parameters
+    ----------
+    f: open filehandle
+        writable text stream to which the pick list is written
     dna_vols:  numpy array of float
         The volumes of dna to add
     water_vols:  numpy array of float
@@ -117,18 +409,13 @@ def format_dna_norm_picklist(dna_vols, water_vols, wells, dest_wells=None,
         The sample names in the same orientation as the DNA concentrations
     sample_plates: numpy array of str
         The sample plates in the same orientation as the DNA concentrations
- 
-    Returns
-    -------
-    picklist : str
-        The Echo formatted pick list
     """
-    
+
     # check that arrays are the right size
     if dna_vols.shape != wells.shape != water_vols.shape:
         raise ValueError('dna_vols %r has a size different from wells %r or water_vols' %
                          (dna_vols.shape, wells.shape, water_vols.shape))
-    
+
     # if destination wells not specified, use source wells
     if dest_wells is None:
         dest_wells = wells
@@ -148,28 +435,464 @@ def format_dna_norm_picklist(dna_vols, water_vols, wells, dest_wells=None,
     if dna_concs.shape != sample_names.shape != dna_vols.shape != sample_plates.shape != dna_plate_type.shape:
         raise ValueError('dna_vols %r has a size different from dna_concs %r or sample_names' %
                          (dna_vols.shape, dna_concs.shape, sample_names.shape))
-        
-    picklist = ''
-    
+
+    n = np.size(sample_names)
+
+    # columns shared by the water and DNA additions
+    samples = _str_column(sample_names)
+    source_wells = _str_column(wells)
+    concs = _str_column(dna_concs)
+    dest_plates = _str_column(dest_plate_name, n)
+    destinations = _str_column(dest_wells)
+
     # header
-    picklist += 'Sample\tSource Plate Name\tSource Plate Type\tSource Well\tConcentration\t' \
-                'Transfer Volume\tDestination Plate Name\tDestination Well'
-    
+    f.write('Sample\tSource Plate Name\tSource Plate Type\tSource Well\tConcentration\t'
+            'Transfer Volume\tDestination Plate Name\tDestination Well')
+
     # water additions
-    for index, sample in np.ndenumerate(sample_names):
-        picklist += '\n' + '\t'.join([str(sample), water_plate_name, water_plate_type,
-                               str(wells[index]), str(dna_concs[index]), str(water_vols[index]),
-                               dest_plate_name, str(dest_wells[index])]) 
+    _write_rows(f, [samples, _str_column(water_plate_name, n),
+                    _str_column(water_plate_type, n), source_wells, concs,
+                    _str_column(water_vols), dest_plates, destinations])
     # DNA additions
-    for index, sample in np.ndenumerate(sample_names):
-        picklist += '\n' + '\t'.join([str(sample), str(sample_plates[index]), str(dna_plate_type[index]),
-                               str(wells[index]), str(dna_concs[index]), str(dna_vols[index]),
-                               dest_plate_name, str(dest_wells[index])])    
-    
-    return(picklist)
+    _write_rows(f, [samples, _str_column(sample_plates),
+                    _str_column(dna_plate_type), source_wells, concs,
+                    _str_column(dna_vols), dest_plates, destinations])
 
 
-def assign_index(samples, index_df, start_idx=0):
+@instrument
+def format_dna_norm_picklist(dna_vols, water_vols, wells, dest_wells=None,
+                             dna_concs=None, sample_names=None,
+                             sample_plates = None, water_plate_name='Water',
+                             dna_plate_type='384PP_AQ_BP2_HT', water_plate_type='384PP_AQ_BP2_HT',
+                             dest_plate_name='NormalizedDNA'):
+    """
+    Writes Echo-format pick list to achieve a normalized input DNA pool
+
+    Parameters
+    ----------
+    dna_vols:  numpy array of float
+        The volumes of dna to add
+    water_vols:  numpy array of float
+        The volumes of water to add
+    wells: numpy array of str
+        The well codes in the same orientation as the DNA concentrations
+    dest_wells: numpy array of str
+        The well codes, in the same orientation as `wells`,
+        in which to place each sample if reformatting
+    dna_concs:  numpy array of float
+        The concentrations calculated via PicoGreen (ng/uL)
+    sample_names: numpy array of str
+        The sample names in the same orientation as the DNA concentrations
+    sample_plates: numpy array of str
+        The sample plates in the same orientation as the DNA concentrations
+ 
+    Returns
+    -------
+    picklist : str
+        The Echo formatted pick list
+    """
+    picklist = StringIO()
+
+    write_dna_norm_picklist(picklist, dna_vols, water_vols, wells,
+                            dest_wells=dest_wells, dna_concs=dna_concs,
+                            sample_names=sample_names,
+                            sample_plates=sample_plates,
+                            water_plate_name=water_plate_name,
+                            dna_plate_type=dna_plate_type,
+                            water_plate_type=water_plate_type,
+                            dest_plate_name=dest_plate_name)
+
+    return(picklist.getvalue())
+
+
+class IndexCombos(object):
+    """
+    Compact table of i5 x i7 index combinations
+
+    Only the i5 and i7 index lists are kept, with sequences stored as
+    fixed-width byte strings. Combination `c` pairs i5 index `c % n_i5` with
+    i7 index `(c // n_i5 + c % n_i5) % n_i7`, the same order as the combo
+    tables written by the iTru index combo generator notebook, so rows can
+    be computed for any window of combinations without building the whole
+    table.
+
+    Parameters
+    ----------
+    i5: pandas DataFrame
+        i5 index list, with columns ['Primer Name', 'Primer Index Sequence',
+        'Row', 'Col'] giving the index name, sequence and source well
+    i7: pandas DataFrame
+        i7 index list, with the same columns as `i5`
+    i5_plate: str
+        name of the i5 source plate
+    i7_plate: str
+        name of the i7 source plate
+    """
+
+    columns = ['index combo', 'index combo seq',
+               'i5 name', 'i5 sequence', 'i5 well', 'i5 plate',
+               'i7 name', 'i7 sequence', 'i7 well', 'i7 plate']
+
+    def __init__(self, i5, i7, i5_plate='iTru5_plate', i7_plate='iTru7_plate'):
+        self.i5_names, self.i5_seqs, self.i5_wells = self._index_table(i5)
+        self.i7_names, self.i7_seqs, self.i7_wells = self._index_table(i7)
+        self.i5_plate = i5_plate
+        self.i7_plate = i7_plate
+
+    @staticmethod
+    def _index_table(index_df):
+        names = np.asarray(index_df['Primer Name'], dtype=object)
+        seqs = np.asarray(index_df['Primer Index Sequence'], dtype=str)
+        seqs = np.char.encode(seqs, 'ascii')
+        wells = (index_df['Row'].astype(str) +
+                 index_df['Col'].astype(str)).values.astype(object)
+
+        return(names, seqs, wells)
+
+    def __len__(self):
+        return(len(self.i5_names) * len(self.i7_names))
+
+    def ids(self, start=0, stop=None):
+        """
+        Gets the i5 and i7 index ids of a window of combinations
+
+        Parameters
+        ----------
+        start: int
+            first index combo of the window
+        stop: int
+            end of the window (exclusive), defaults to the last combo
+
+        Returns
+        -------
+        combos: numpy array of int
+            the index combo numbers
+        i5_ids: numpy array of int
+            position of each combination's i5 index in the i5 list
+        i7_ids: numpy array of int
+            position of each combination's i7 index in the i7 list
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        combos = np.arange(start, stop)
+
+        n_i5 = len(self.i5_names)
+        i5_ids = combos % n_i5
+        i7_ids = (combos // n_i5 + i5_ids) % len(self.i7_names)
+
+        return(combos, i5_ids, i7_ids)
+
+    def to_frame(self, start=0, stop=None):
+        """
+        Materializes a window of combinations as an index combo DataFrame
+
+        Parameters
+        ----------
+        start: int
+            first index combo of the window
+        stop: int
+            end of the window (exclusive), defaults to the last combo
+
+        Returns
+        -------
+        index_df: pandas DataFrame
+            the index information, one row per combination, indexed by
+            index combo number
+        """
+        combos, i5_ids, i7_ids = self.ids(start, stop)
+
+        i5_seqs = self.i5_seqs[i5_ids]
+        i7_seqs = self.i7_seqs[i7_ids]
+
+        index_df = pd.DataFrame(
+            {'index combo': combos,
+             'index combo seq': np.char.add(i5_seqs, i7_seqs).astype(str),
+             'i5 name': self.i5_names[i5_ids],
+             'i5 sequence': i5_seqs.astype(str),
+             'i5 well': self.i5_wells[i5_ids],
+             'i5 plate': self.i5_plate,
+             'i7 name': self.i7_names[i7_ids],
+             'i7 sequence': i7_seqs.astype(str),
+             'i7 well': self.i7_wells[i7_ids],
+             'i7 plate': self.i7_plate},
+            columns=self.columns, index=combos)
+
+        return(index_df)
+
+
+# 2-bit codes of each nucleotide, indexed by ASCII value
+_BASE_CODES = np.full(256, 255, dtype=np.uint8)
+for _i, _base in enumerate('ACGT'):
+    _BASE_CODES[ord(_base)] = _i
+    _BASE_CODES[ord(_base.lower())] = _i
+
+
+def _seq_bytes(seqs):
+    """Views sequences as an (n, length) array of ASCII codes"""
+    seqs = np.char.encode(np.asarray(seqs, dtype=str), 'ascii')
+    length = seqs.dtype.itemsize
+
+    return(seqs.view(np.uint8).reshape(len(seqs), length))
+
+
+def encode_sequences(seqs):
+    """
+    Packs nucleotide sequences into integers, two bits per base
+
+    Parameters
+    ----------
+    seqs: array-like of str
+        sequences of A, C, G and T, all of the same length (up to 32 bases)
+
+    Returns
+    -------
+    codes: numpy array of uint64
+        the packed sequences, with the first base in the highest bits
+    """
+    seqs = np.asarray(seqs, dtype=str)
+    lengths = np.char.str_len(seqs)
+
+    if len(seqs) and (lengths != lengths[0]).any():
+        raise ValueError('Sequences must all be the same length')
+
+    codes = _BASE_CODES[_seq_bytes(seqs)]
+    if codes.shape[1] > 32:
+        raise ValueError('Sequences longer than 32 bases cannot be encoded')
+    if (codes == 255).any():
+        bad = seqs[(codes == 255).any(axis=1)]
+        raise ValueError('Sequence(s) %s contain bases other than A, C, G '
+                         'and T' % ', '.join(bad[:5]))
+
+    shifts = np.arange(2 * (codes.shape[1] - 1), -1, -2, dtype=np.uint64)
+
+    return((codes.astype(np.uint64) << shifts).sum(axis=1, dtype=np.uint64))
+
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _BYTE_POPCOUNTS = np.array([bin(x).count('1') for x in range(256)],
+                               dtype=np.uint8)
+
+    def _popcount(x):
+        x = np.ascontiguousarray(x, dtype=np.uint64)
+        counts = _BYTE_POPCOUNTS[x.view(np.uint8)]
+        return(counts.reshape(x.shape + (8,)).sum(axis=-1))
+
+
+def hamming_distances(codes, others=None):
+    """
+    Computes pairwise Hamming distances between 2-bit packed sequences
+
+    Parameters
+    ----------
+    codes: numpy array of uint64
+        sequences packed by `encode_sequences`
+    others: numpy array of uint64
+        sequences to compare `codes` to, by default `codes` themselves
+
+    Returns
+    -------
+    distances: 2D numpy array of int
+        the number of mismatched bases between each sequence of `codes`
+        (rows) and each sequence of `others` (columns)
+    """
+    codes = np.asarray(codes, dtype=np.uint64)
+    others = codes if others is None else np.asarray(others, dtype=np.uint64)
+
+    return(_base_mismatches(codes[:, np.newaxis] ^ others[np.newaxis, :]))
+
+
+def _base_mismatches(diff):
+    """Counts the bases that differ in XORed 2-bit packed sequences"""
+    # a base differs if either of its two bits differs
+    diff = (diff | (diff >> np.uint64(1))) & np.uint64(0x5555555555555555)
+
+    return(_popcount(diff).astype(int))
+
+
+@lru_cache(maxsize=None)
+def _mismatch_masks(length, mismatches):
+    """
+    XOR masks turning a 2-bit packed sequence into each of its variants
+
+    Parameters
+    ----------
+    length: int
+        number of bases in the sequences
+    mismatches: int
+        the most bases in which a variant differs from the sequence
+
+    Returns
+    -------
+    masks: numpy array of uint64
+        one mask per variant, starting with 0 for the sequence itself
+    """
+    masks = [0]
+    for k in range(1, mismatches + 1):
+        for positions in itertools.combinations(range(length), k):
+            for changes in itertools.product((1, 2, 3), repeat=k):
+                masks.append(sum(change << 2 * (length - 1 - pos)
+                                 for pos, change in zip(positions, changes)))
+
+    masks = np.array(masks, dtype=np.uint64)
+    masks.flags.writeable = False
+
+    return(masks)
+
+
+def _group_offsets(lengths):
+    """Position of each element within consecutive groups of given lengths"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.cumsum(lengths)
+
+    return(np.arange(ends[-1] if len(ends) else 0) -
+           np.repeat(ends - lengths, lengths))
+
+
+def _index_collisions(i7_seqs, i5_seqs, barcode_mismatches=1):
+    """
+    Finds pairs of samples whose dual indices cannot be told apart
+
+    Two samples collide when both their i7 and their i5 sequences are no
+    more than twice `barcode_mismatches` apart, which is when some pair of
+    index reads is within `barcode_mismatches` of both. For up to one
+    mismatch, every such (i7, i5) variant of every sample is enumerated and
+    bucketed, so that the cost grows with the number of samples (and
+    colliding pairs) rather than the number of pairs. Larger tolerances
+    compare every pair, a block of rows at a time.
+
+    Parameters
+    ----------
+    i7_seqs, i5_seqs: array-like of str
+        the index sequences of each sample. An i5 column of empty strings
+        stands for single indexing.
+    barcode_mismatches: int
+        number of mismatches allowed per index read when demultiplexing
+
+    Returns
+    -------
+    first, second: numpy array of int
+        positions of the colliding samples, with first < second, ordered by
+        first then second
+    i7_dist, i5_dist: numpy array of int
+        the Hamming distances between the indices of each pair
+    """
+    n = len(i7_seqs)
+    codes, lengths = [], []
+    for seqs in (i7_seqs, i5_seqs):
+        seqs = np.asarray(seqs, dtype=str)
+        if n and not np.char.str_len(seqs).any():
+            # single indexed
+            codes.append(np.zeros(n, dtype=np.uint64))
+            lengths.append(0)
+        else:
+            codes.append(encode_sequences(seqs))
+            lengths.append(len(seqs[0]) if n else 0)
+
+    if sum(lengths) > 32:
+        raise ValueError('Index pairs longer than 32 bases in total cannot '
+                         'be checked for collisions')
+
+    if n < 2:
+        first = second = np.zeros(0, dtype=int)
+    elif barcode_mismatches <= 1:
+        i7_masks, i5_masks = [_mismatch_masks(length, barcode_mismatches)
+                              for length in lengths]
+
+        # every (i7, i5) variant of every sample, as one integer
+        keys = ((codes[0][:, np.newaxis, np.newaxis] ^
+                 i7_masks[np.newaxis, :, np.newaxis]) <<
+                np.uint64(2 * lengths[1])) | \
+            (codes[1][:, np.newaxis, np.newaxis] ^
+             i5_masks[np.newaxis, np.newaxis, :])
+        keys = keys.ravel()
+        samples = np.repeat(np.arange(n, dtype=np.int32),
+                            len(i7_masks) * len(i5_masks))
+
+        # variants are bucketed by sorting, which at millions of keys is
+        # faster than a hash table; each sample's variants are all distinct
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        samples = samples[order]
+
+        # every pair within each run of equal keys; samples are ascending
+        # within a run, as the sort is stable
+        same = np.flatnonzero(keys[1:] == keys[:-1])
+        new_run = np.diff(same, prepend=-2) > 1
+        start = same[new_run]
+        length = np.diff(np.r_[np.flatnonzero(new_run), len(same)]) + 1
+
+        # position of the first sample of each pair, and how many later
+        # samples of the same run it pairs with
+        left = np.repeat(start, length) + _group_offsets(length)
+        later = np.repeat(start + length, length) - left - 1
+        right = np.repeat(left, later) + 1 + _group_offsets(later)
+
+        # samples colliding on several variants are paired once
+        pairs = np.unique(samples[np.repeat(left, later)].astype(np.int64) *
+                          n + samples[right])
+        first, second = np.divmod(pairs, n)
+    else:
+        limit = 2 * barcode_mismatches
+        # rows compared at once, keeping each block to about a million pairs
+        block = max(1, 2 ** 20 // n)
+        first, second = [], []
+        for top in range(0, n - 1, block):
+            rows = slice(top, min(top + block, n))
+            close = ((hamming_distances(codes[0][rows], codes[0]) <= limit) &
+                     (hamming_distances(codes[1][rows], codes[1]) <= limit))
+            row, col = np.nonzero(close)
+            row += top
+            later = col > row
+            first.append(row[later])
+            second.append(col[later])
+        first, second = np.concatenate(first), np.concatenate(second)
+
+    return(first, second,
+           _base_mismatches(codes[0][first] ^ codes[0][second]),
+           _base_mismatches(codes[1][first] ^ codes[1][second]))
+
+
+@instrument
+def check_index_distances(indices, barcode_mismatches=1):
+    """
+    Finds pairs of samples whose index combinations cannot be told apart
+
+    bcl2fastq assigns a read to a sample if both its i5 and its i7 index
+    reads are within `barcode_mismatches` of the sample's indices. Two
+    samples therefore conflict when both their i5 and their i7 sequences
+    are no more than twice that many mismatches apart.
+
+    Parameters
+    ----------
+    indices: pandas DataFrame
+        index information, as returned by `assign_index`
+    barcode_mismatches: int
+        number of mismatches allowed per index read when demultiplexing
+
+    Returns
+    -------
+    conflicts: pandas DataFrame
+        one row per conflicting pair, with the index combos of both samples
+        and the Hamming distances between their i5 and i7 sequences
+    """
+    first, second, i7_dist, i5_dist = _index_collisions(
+        indices['i7 sequence'], indices['i5 sequence'], barcode_mismatches)
+
+    combos = np.asarray(indices['index combo'])
+
+    conflicts = pd.DataFrame({'index combo 1': combos[first],
+                              'index combo 2': combos[second],
+                              'i5 distance': i5_dist,
+                              'i7 distance': i7_dist},
+                             columns=['index combo 1', 'index combo 2',
+                                      'i5 distance', 'i7 distance'])
+
+    return(conflicts)
+
+
+@instrument
+def assign_index(samples, index_df, start_idx=0, barcode_mismatches=None):
     """
     Writes Echo-format pick list to achieve a normalized input DNA pool
 
@@ -177,22 +900,100 @@ def assign_index(samples, index_df, start_idx=0):
     ----------
     samples:  int
         The number of samples for which to get indices 
-    index_df:  pandas DataFrame
+    index_df:  pandas DataFrame or IndexCombos
         The dataframe of complete index combinations and information
     start_idx: int
         The starting index combo to use
+    barcode_mismatches: int
+        If given, check that the chosen indices can be demultiplexed with
+        this many barcode mismatches
  
     Returns
     -------
     indices : pandasDataFrame
         The index information for the chosen indices
+
+    Raises
+    ------
+    ValueError
+        if `barcode_mismatches` is given and any of the chosen index
+        combinations are too similar to demultiplex
     """
-    
-    indices = index_df.iloc[start_idx:(start_idx + samples)]
-    
+
+    if isinstance(index_df, IndexCombos):
+        indices = index_df.to_frame(start_idx, start_idx + samples)
+    else:
+        indices = index_df.iloc[start_idx:(start_idx + samples)]
+
+    if barcode_mismatches is not None:
+        conflicts = check_index_distances(indices, barcode_mismatches)
+        if len(conflicts):
+            raise ValueError('%d pair(s) of index combos cannot be '
+                             'demultiplexed with %d barcode mismatch(es):\n%s'
+                             % (len(conflicts), barcode_mismatches,
+                                conflicts.to_string(index=False)))
+
     return(indices)
 
 
+@instrument
+def write_index_picklist(f, sample_names, sample_wells, indices,
+                         i5_vol=250, i7_vol=250,
+                         i5_plate_type='384LDV_AQ_B2_HT',
+                         i7_plate_type='384LDV_AQ_B2_HT',
+                         dest_plate_name='IndexPCRPlate'):
+    """
+    Streams an Echo-format pick list for index addition
+
+    Produces exactly the same text as `format_index_picklist`, but pulls
+    each of the i5 and i7 columns out of `indices` once and writes the rows
+    in chunks to `f` instead of looking up every sample individually.
+
+    Parameters
+    ----------
+    f: open filehandle
+        writable text stream to which the pick list is written
+    sample_names:  array-like of str
+        The sample names matching index order of indices
+    sample_wells:  array-like of str
+        The wells matching sample name order
+    indices: pandas DataFrame
+        The dataframe with index info matching sample_names
+    """
+
+    # check that arrays are the right size, as the columns are written
+    # side by side
+    n = len(sample_names)
+    if not n == len(sample_wells) == len(indices):
+        raise ValueError('sample_names (%s) has a size different from sample_wells (%s) or index list (%s)' %
+                         (len(sample_names), len(sample_wells), len(indices)))
+
+    samples = _str_column(sample_names)
+    wells = _str_column(sample_wells)
+    combos = _str_column(indices['index combo'].values)
+    dest_plates = _str_column(dest_plate_name, n)
+
+    def index_columns(prefix, vol, plate_type):
+        return([samples,
+                _str_column(indices[prefix + ' plate'].values),
+                _str_column(plate_type, n),
+                _str_column(indices[prefix + ' well'].values),
+                _str_column(vol, n),
+                _str_column(indices[prefix + ' name'].values),
+                _str_column(indices[prefix + ' sequence'].values),
+                combos, dest_plates, wells])
+
+    # header
+    f.write('Sample\tSource Plate Name\tSource Plate Type\tSource Well\tTransfer Volume\t'
+            'Index Name\tIndex Sequence\tIndex Combo\tDestination Plate Name\tDestination Well')
+
+    # i5 additions
+    _write_rows(f, index_columns('i5', i5_vol, i5_plate_type))
+    # i7 additions
+    _write_rows(f, index_columns('i7', i7_vol, i7_plate_type))
+
+
+@instrument
 def format_index_picklist(sample_names, sample_wells, indices,
                           i5_vol=250, i7_vol=250,
                           i5_plate_type='384LDV_AQ_B2_HT', i7_plate_type='384LDV_AQ_B2_HT',
@@ -214,48 +1015,35 @@ def format_index_picklist(sample_names, sample_wells, indices,
     picklist : str
         The Echo formatted pick list
     """
-    
-    # check that arrays are the right size
-    if len(sample_names) != len(sample_wells) != len(indices):
-        raise ValueError('sample_names (%s) has a size different from sample_wells (%s) or index list (%s)' %
-                         (len(sample_names), len(sample_wells), len(indices)))
-            
-    picklist = ''
-    
-    # header
-    picklist += 'Sample\tSource Plate Name\tSource Plate Type\tSource Well\tTransfer Volume\t' \
-                'Index Name\tIndex Sequence\tIndex Combo\tDestination Plate Name\tDestination Well'
-    
-    # i5 additions
-    for i, (sample, well) in enumerate(zip(sample_names, sample_wells)):
-        picklist += '\n' + '\t'.join([str(sample), indices.iloc[i]['i5 plate'], i5_plate_type,
-                                      indices.iloc[i]['i5 well'], str(i5_vol), indices.iloc[i]['i5 name'],
-                                      indices.iloc[i]['i5 sequence'], str(indices.iloc[i]['index combo']),
-                                      dest_plate_name, well])
-    # i7 additions
-    for i, (sample, well) in enumerate(zip(sample_names, sample_wells)):
-        picklist += '\n' + '\t'.join([str(sample), indices.iloc[i]['i7 plate'], i7_plate_type,
-                                      indices.iloc[i]['i7 well'], str(i7_vol), indices.iloc[i]['i7 name'],
-                                      indices.iloc[i]['i7 sequence'], str(indices.iloc[i]['index combo']),
-                                      dest_plate_name, well]) 
-    
-    return(picklist)
+    picklist = StringIO()
+
+    write_index_picklist(picklist, sample_names, sample_wells, indices,
+                         i5_vol=i5_vol, i7_vol=i7_vol,
+                         i5_plate_type=i5_plate_type,
+                         i7_plate_type=i7_plate_type,
+                         dest_plate_name=dest_plate_name)
 
+    return(picklist.getvalue())
 
+
+@instrument
 def compute_qpcr_concentration(cp_vals, m=-3.231, b=12.059, dil_factor=25000):
     """Computes molar concentration of libraries from qPCR Cp values.
 
     Returns a 2D array of calculated concentrations, in nanomolar units
 
+    `cp_vals` may also be a stack of plates shaped (n_plates, rows, cols),
+    with a standard curve and dilution factor given per plate.
+
     Parameters
     ----------
     cp_vals : numpy array of float
         The Cp values parsed from the plate reader
-    m : float
+    m : float or 1D array of float
         The slope of the qPCR standard curve
-    b : float
+    b : float or 1D array of float
         The intercept of the qPCR standard curve
-    dil_factor: float or int
+    dil_factor: float or int, or 1D array of them
         The dilution factor of the samples going into the qPCR
 
     Returns
@@ -263,21 +1051,29 @@ def compute_qpcr_concentration(cp_vals, m=-3.231, b=12.059, dil_factor=25000):
     np.array of floats
         A 2D array of floats
     """
+    m = _per_plate(m, cp_vals)
+    b = _per_plate(b, cp_vals)
+    dil_factor = _per_plate(dil_factor, cp_vals)
+
     qpcr_concentration = np.power(10, ((cp_vals - b) / m)) * dil_factor / 1000
 
     return(qpcr_concentration)
 
 
+@instrument
 def compute_shotgun_pooling_values_eqvol(sample_concs, total_vol=60.0):
     """Computes molar concentration of libraries from qPCR Cp values.
 
     Returns a 2D array of calculated concentrations, in nanomolar units
 
+    `sample_concs` may also be a stack of plates shaped
+    (n_plates, rows, cols), pooled separately with one `total_vol` per plate.
+
     Parameters
     ----------
     sample_concs : numpy array of float
         The concentrations calculated via qPCR (nM)
-    total_vol : float
+    total_vol : float or 1D array of float
         The total volume to pool (uL)
 
     Returns
@@ -285,13 +1081,16 @@ def compute_shotgun_pooling_values_eqvol(sample_concs, total_vol=60.0):
     np.array of floats
         A 2D array of floats
     """
-    per_sample_vol = (total_vol / sample_concs.size) * 1000.0
+    total_vol = _per_plate(total_vol, sample_concs)
+
+    per_sample_vol = (total_vol / _plate_size(sample_concs)) * 1000.0
 
     sample_vols = np.zeros(sample_concs.shape) + per_sample_vol
 
     return(sample_vols)
 
 
+@instrument
 def compute_shotgun_pooling_values_qpcr(sample_concs, sample_fracs=None,
                                         min_conc=10, floor_conc=50,
                                         total_nmol=.01):
@@ -313,18 +1112,22 @@ def compute_shotgun_pooling_values_qpcr(sample_concs, sample_fracs=None,
     had all samples at a concentration of exactly 400 nM and wanted a total
     volume of 60 uL, this would be 0.024 nmol.
 
+    A whole run can be computed at once by passing a stack of plates shaped
+    (n_plates, rows, cols); each plate is then pooled separately, and the
+    parameters may be given as vectors with one value per plate.
+
     Parameters
     ----------
     sample_concs: 2D array of float
         nM calculated by compute_qpcr_concentration
     sample_fracs: 2D of float
         fractional value for each sample (default 1/N)
-    min_conc: float
+    min_conc: float or 1D array of float
         minimum nM concentration to be included in pool
-    floor_conc: float
+    floor_conc: float or 1D array of float
         minimum value for pooling for samples above min_conc
         corresponds to a maximum vol in pool
-    total_nmol : float
+    total_nmol : float or 1D array of float
         total number of nM to have in pool
 
     Returns
@@ -332,20 +1135,25 @@ def compute_shotgun_pooling_values_qpcr(sample_concs, sample_fracs=None,
     sample_vols: np.array of floats
         the volumes in nL per each sample pooled
     """
+    min_conc = _per_plate(min_conc, sample_concs)
+    floor_conc = _per_plate(floor_conc, sample_concs)
+    total_nmol = _per_plate(total_nmol, sample_concs)
 
     if sample_fracs is None:
-        sample_fracs = np.ones(sample_concs.shape) / sample_concs.size
+        sample_fracs = np.ones(sample_concs.shape) / _plate_size(sample_concs)
 
     # get samples above threshold
     sample_fracs_pass = sample_fracs.copy()
     sample_fracs_pass[sample_concs <= min_conc] = 0
 
     # renormalize to exclude lost samples
-    sample_fracs_pass *= 1/sample_fracs_pass.sum()
+    sample_fracs_pass *= 1/_plate_sum(sample_fracs_pass, keepdims=True)
 
     # floor concentration value
     sample_concs_floor = sample_concs.copy()
-    sample_concs_floor[sample_concs < floor_conc] = floor_conc
+    below_floor = sample_concs < floor_conc
+    sample_concs_floor[below_floor] = \
+        np.broadcast_to(floor_conc, np.shape(sample_concs))[below_floor]
 
     # calculate volumetric fractions including floor val
     sample_vols = (total_nmol * sample_fracs_pass) / sample_concs_floor
@@ -356,6 +1164,7 @@ def compute_shotgun_pooling_values_qpcr(sample_concs, sample_fracs=None,
     return(sample_vols)
 
 
+@instrument
 def compute_shotgun_pooling_values_qpcr_minvol(sample_concs, sample_fracs=None,
                                           floor_vol=100, floor_conc=40,
                                           total_nmol=.01):
@@ -382,17 +1191,21 @@ def compute_shotgun_pooling_values_qpcr_minvol(sample_concs, sample_fracs=None,
     due to exclusion of primer dimers (1/2), figure we need 4 times that or
     0.0024.
 
+    A whole run can be computed at once by passing a stack of plates shaped
+    (n_plates, rows, cols); each plate is then pooled separately, and the
+    parameters may be given as vectors with one value per plate.
+
     Parameters
     ----------
     sample_concs: 2D array of float
         nM calculated by compute_qpcr_concentration
     sample_fracs: 2D of float
         fractional value for each sample (default 1/N)
-    floor_vol: float
+    floor_vol: float or 1D array of float
         volume (nL) at which samples below floor_conc will be pooled
-    floor_conc: float
+    floor_conc: float or 1D array of float
         minimum value (nM) for pooling at real estimated value (default 40)
-    total_nmol : float
+    total_nmol : float or 1D array of float
         total number of nM to have in pool
 
     Returns
@@ -400,9 +1213,12 @@ def compute_shotgun_pooling_values_qpcr_minvol(sample_concs, sample_fracs=None,
     sample_vols: np.array of floats
         the volumes in nL per each sample pooled
     """
+    floor_vol = _per_plate(floor_vol, sample_concs)
+    floor_conc = _per_plate(floor_conc, sample_concs)
+    total_nmol = _per_plate(total_nmol, sample_concs)
 
     if sample_fracs is None:
-        sample_fracs = np.ones(sample_concs.shape) / sample_concs.size
+        sample_fracs = np.ones(sample_concs.shape) / _plate_size(sample_concs)
 
     # calculate volumetric fractions including floor val
     sample_vols = (total_nmol * sample_fracs) / sample_concs
@@ -411,46 +1227,316 @@ def compute_shotgun_pooling_values_qpcr_minvol(sample_concs, sample_fracs=None,
     sample_vols *= 10**9
     
     # drop volumes for samples below floor concentration to floor_vol
-    sample_vols[sample_concs < floor_conc] = floor_vol
+    below_floor = sample_concs < floor_conc
+    sample_vols[below_floor] = \
+        np.broadcast_to(floor_vol, np.shape(sample_concs))[below_floor]
     
     return(sample_vols)
 
 
-def estimate_pool_conc_vol(sample_vols, sample_concs):
-    """Estimates the actual molarity and volume of a pool.
+@instrument
+def compute_shotgun_repooling_values(read_counts, sample_vols, sample_concs,
+                                     target_reads=400000, max_vol=None,
+                                     blanks=None):
+    """Computes the volumes to repool so each sample reaches a read target
+
+    The reads each sample returned per nL pooled are taken from the last
+    sequencing run, and the volume to repool is the shortfall from
+    `target_reads` divided by that yield. Samples that were not pooled, or
+    returned no reads, have their yield estimated from their qPCR
+    concentration and the median reads per nM per nL of the other samples
+    in their pool.
+
+    A whole run can be computed at once by passing stacks of plates shaped
+    (n_plates, rows, cols), one plate per pool. Each plate of the result
+    can be passed to `format_pooling_echo_pick_list`.
+
+    Parameters
+    ----------
+    read_counts: 2D array of float
+        reads sequenced for each sample
+    sample_vols: 2D array of float
+        volume (nL) at which each sample was pooled
+    sample_concs: 2D array of float
+        nM calculated by compute_qpcr_concentration
+    target_reads: float or 1D array of float
+        number of reads wanted for each sample (default 400000), or one
+        number per plate
+    max_vol: float or 1D array of float
+        largest volume (nL) worth repooling; samples that need more are
+        left out, to be remade instead
+    blanks: 2D array of bool
+        samples that have no read target
+
+    Returns
+    -------
+    repool_vols: np.array of floats
+        the volumes in nL per each sample to repool: 0 for samples at or
+        over the target, and NaN for samples whose yield cannot be
+        estimated or that need more than `max_vol`
+    """
+    target_reads = _per_plate(target_reads, read_counts)
+    read_counts = np.asarray(read_counts, dtype=float)
+    sample_vols = np.asarray(sample_vols, dtype=float)
+    sample_concs = np.asarray(sample_concs, dtype=float)
+
+    measured = (read_counts > 0) & (sample_vols > 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reads_per_nl = np.where(measured, read_counts / sample_vols, np.nan)
+
+        # reads per nM per nL in each pool, for the samples without a yield
+        per_nm = reads_per_nl / sample_concs
+        per_nm[~np.isfinite(per_nm) | (per_nm <= 0)] = np.nan
+        axis = (1, 2) if _is_plate_stack(per_nm) else None
+        has_yield = np.any(~np.isnan(per_nm), axis=axis, keepdims=True)
+        pool_per_nm = np.nanmedian(np.where(has_yield, per_nm, 0),
+                                   axis=axis, keepdims=True)
+        pool_per_nm = np.where(has_yield, pool_per_nm, np.nan)
+
+        estimated = sample_concs * pool_per_nm
+        estimated[~(estimated > 0)] = np.nan
+        reads_per_nl = np.where(measured, reads_per_nl, estimated)
+
+        shortfall = np.clip(target_reads - read_counts, 0, None)
+        repool_vols = shortfall / reads_per_nl
+
+    # samples at the target need nothing, whatever their yield
+    repool_vols[shortfall == 0] = 0
+
+    if blanks is not None:
+        repool_vols[np.asarray(blanks, dtype=bool)] = 0
+
+    if max_vol is not None:
+        repool_vols[repool_vols > _per_plate(max_vol, read_counts)] = np.nan
+
+    return(repool_vols)
+
+
+@instrument
+def estimate_pool_conc_vol(sample_vols, sample_concs):
+    """Estimates the actual molarity and volume of a pool.
+
+    Given stacks of plates shaped (n_plates, rows, cols), each plate is
+    taken to be a separate pool, and the concentration and volume of each
+    are returned as vectors.
+
+    Parameters
+    ----------
+    sample_concs : numpy array of float
+        The concentrations calculated via qPCR (nM)
+    sample_vols : numpy array of float
+        The calculated pooling volumes (nL)
+
+    Returns
+    -------
+    pool_conc : float or 1D array of float
+        The estimated actual concentration of the pool, in nM
+    total_vol : float or 1D array of float
+        The total volume of the pool, in nL
+    """
+    # scalar to adjust nL to L for molarity calculations
+    nl_scalar = 10**-9
+
+    # calc total pool pmols
+    total_pmols = np.multiply(sample_concs, sample_vols) * nl_scalar
+
+    # calc total pool vol in nanoliters
+    total_vol = _plate_sum(sample_vols)
+
+    # pool pM is total pmols divided by total liters
+    # (total vol in nL * 1 L / 10^9 nL)
+    pool_conc = _plate_sum(total_pmols) / (total_vol * nl_scalar)
+
+    return(pool_conc, total_vol)
+
+
+def _fill_dest_wells(vols, max_vol_per_well):
+    """
+    Assigns each transfer to a destination well, filling wells in order
+
+    A new destination well is started whenever the next transfer would take
+    the running total of the current well over `max_vol_per_well`. Running
+    totals are cumulative sums over each well's transfers, so the wells are
+    the same as those found by adding up the volumes one at a time.
+
+    Parameters
+    ----------
+    vols : 1D numpy array of float
+        The transfer volumes, in order, in nL
+    max_vol_per_well : float
+        Maximum destination well volume, in nL
+
+    Returns
+    -------
+    dest : 1D numpy array of int
+        The 1-based destination well number of each transfer
+    """
+    n = len(vols)
+    dest = np.empty(n, dtype=int)
+
+    # totals over all transfers, only used to guess where each well ends
+    totals = np.cumsum(vols)
+
+    start = 0
+    d = 1
+    # the first transfer can itself overflow the (empty) first well
+    first = 0
+    while start < n:
+        base = totals[start - 1] if start else 0
+        end = np.searchsorted(totals, base + max_vol_per_well, side='right')
+
+        # find where the well overflows from its own running total,
+        # widening the window if the guess was short
+        size = max(end - start + 2, 16)
+        while True:
+            running = np.cumsum(vols[start:start + size])
+            over = np.flatnonzero(running[first:] > max_vol_per_well)
+            if len(over) or start + size >= n:
+                break
+            size *= 2
+
+        stop = start + first + over[0] if len(over) else n
+
+        dest[start:stop] = d
+        d += 1
+        start = stop
+        first = 1
+
+    return(dest)
+
+
+def _pack_dest_wells(vols, max_vol_per_well):
+    """
+    Assigns each transfer to a destination well, packing wells first fit
+
+    Transfers are placed from the largest volume down, each into the first
+    well that still has room for it (first-fit decreasing), which uses at
+    most 11/9 of the fewest wells possible plus one. A volume over
+    `max_vol_per_well` gets a well of its own.
 
     Parameters
     ----------
-    sample_concs : numpy array of float
-        The concentrations calculated via qPCR (nM)
-    sample_vols : numpy array of float
-        The calculated pooling volumes (nL)
+    vols : 1D numpy array of float
+        The transfer volumes, in nL
+    max_vol_per_well : float
+        Maximum destination well volume, in nL
 
     Returns
     -------
-    pool_conc : float
-        The estimated actual concentration of the pool, in nM
-    total_vol : float
-        The total volume of the pool, in nL
+    dest : 1D numpy array of int
+        The 0-based destination well number of each transfer, numbered in
+        the order the wells are first used
     """
-    # scalar to adjust nL to L for molarity calculations
-    nl_scalar = 10**-9
+    n = len(vols)
+    dest = np.empty(n, dtype=int)
+    room = np.empty(n)
+    used = 0
+
+    for i in np.argsort(-vols, kind='stable'):
+        # the first well with room, among those used so far
+        fits = np.flatnonzero(room[:used] >= vols[i])
+        if len(fits):
+            d = fits[0]
+        else:
+            d = used
+            room[d] = max_vol_per_well
+            used += 1
+        room[d] -= vols[i]
+        dest[i] = d
 
-    # calc total pool pmols
-    total_pmols = np.multiply(sample_concs, sample_vols) * nl_scalar
+    return(dest)
 
-    # calc total pool vol in nanoliters
-    total_vol = sample_vols.sum()
 
-    # pool pM is total pmols divided by total liters
-    # (total vol in nL * 1 L / 10^9 nL)
-    pool_conc = total_pmols.sum() / (total_vol * nl_scalar)
+@instrument
+def write_pooling_echo_pick_list(f, vol_sample,
+                                 max_vol_per_well=60000,
+                                 dest_plate_shape=[16,24],
+                                 packing='sequential'):
+    """Streams the contents of an echo pooling pick list
 
-    return(pool_conc, total_vol)
+    Produces exactly the same text as `format_pooling_echo_pick_list`. With
+    'sequential' packing, destination wells are assigned by segmenting the
+    flattened volumes on their running totals rather than well by well.
+    With 'ffd' packing, first-fit decreasing assigns them instead, so that
+    samples far apart on the plate can share a destination well, and the
+    wells are named from `dest_plate_shape`.
+
+    Parameters
+    ----------
+    f: open filehandle
+        writable text stream to which the pick list is written
+    vol_sample : 2d numpy array of floats
+        The per well sample volume, in nL
+    max_vol_per_well : 2d numpy array of floats
+        Maximum destination well volume, in nL
+    dest_plate_shape : list of int
+        The shape of the destination plate
+    packing : str
+        'sequential' to fill destination wells in the order of the samples,
+        starting a new well whenever the next sample would overflow the
+        current one, or 'ffd' to pack the samples, largest volume first,
+        into the first well with room for them. 'ffd' uses as few
+        destination wells as first-fit decreasing finds, but changes which
+        samples share a destination well; the transfers stay in sample
+        order either way.
+
+    Raises
+    ------
+    ValueError
+        if `packing` is not recognized, or if 'ffd' packing needs more
+        destination wells than `dest_plate_shape` holds
+    """
+    # Write the sample transfer volumes
+    rows, cols = vol_sample.shape
+
+    # replace NaN values with 0s to leave a trail of unpooled wells
+    pool_vols = np.nan_to_num(vol_sample).ravel()
+
+    if packing == 'sequential':
+        dest = _fill_dest_wells(pool_vols, max_vol_per_well)
+
+        # name each destination well once
+        dest_names = np.array(
+            ["%s%d" % (chr(ord('A') + d // dest_plate_shape[0]),
+                       d % dest_plate_shape[1])
+             for d in range(dest.max() + 1 if len(dest) else 1)])
+    elif packing == 'ffd':
+        dest = _pack_dest_wells(pool_vols, max_vol_per_well)
+
+        dest_rows, dest_cols = dest_plate_shape
+        n_dest = dest.max() + 1 if len(dest) else 0
+        if n_dest > dest_rows * dest_cols:
+            raise ValueError('The pool needs %d destination wells, more than '
+                             'the %d of the destination plate' %
+                             (n_dest, dest_rows * dest_cols))
+
+        # wells are filled in row-major order on the destination plate
+        dest_names = well_names(dest_rows, dest_cols)
+    else:
+        raise ValueError("packing must be 'sequential' or 'ffd', not %r" %
+                         (packing,))
+
+    n = rows * cols
+
+    f.write('Source Plate Name,Source Plate Type,Source Well,'
+            'Concentration,Transfer Volume,Destination Plate Name,'
+            'Destination Well')
 
+    # Machine will round, so just give it enough info to do the
+    # correct rounding.
+    _write_rows(f, [_str_column('1', n), _str_column('384LDV_AQ_B2_HT', n),
+                    well_names(rows, cols).tolist(), _str_column('', n),
+                    ['%.2f' % v for v in pool_vols.tolist()],
+                    _str_column('NormalizedDNA', n),
+                    dest_names[dest].tolist()], sep=',')
+
+
+@instrument
 def format_pooling_echo_pick_list(vol_sample,
                                   max_vol_per_well=60000,
-                                  dest_plate_shape=[16,24]):
+                                  dest_plate_shape=[16,24],
+                                  packing='sequential'):
     """Format the contents of an echo pooling pick list
 
     Parameters
@@ -459,112 +1545,171 @@ def format_pooling_echo_pick_list(vol_sample,
         The per well sample volume, in nL
     max_vol_per_well : 2d numpy array of floats
         Maximum destination well volume, in nL
+    dest_plate_shape : list of int
+        The shape of the destination plate
+    packing : str
+        'sequential' to fill destination wells in the order of the samples,
+        starting a new well whenever the next sample would overflow the
+        current one, or 'ffd' to pack the samples, largest volume first,
+        into the first well with room for them. 'ffd' uses as few
+        destination wells as first-fit decreasing finds, but changes which
+        samples share a destination well; the transfers stay in sample
+        order either way.
+
+    Returns
+    -------
+    picklist : str
+        The Echo formatted pick list
+
+    Raises
+    ------
+    ValueError
+        if `packing` is not recognized, or if 'ffd' packing needs more
+        destination wells than `dest_plate_shape` holds
     """
-    contents = ['Source Plate Name,Source Plate Type,Source Well,'
-                'Concentration,Transfer Volume,Destination Plate Name,'
-                'Destination Well']
-    # Write the sample transfer volumes
-    rows, cols = vol_sample.shape
+    picklist = StringIO()
 
-    # replace NaN values with 0s to leave a trail of unpooled wells
-    pool_vols = np.nan_to_num(vol_sample)
+    write_pooling_echo_pick_list(picklist, vol_sample,
+                                 max_vol_per_well=max_vol_per_well,
+                                 dest_plate_shape=dest_plate_shape,
+                                 packing=packing)
 
-    running_tot = 0
-    d = 1
-    for i in range(rows):
-        for j in range(cols):
-            well_name = "%s%d" % (chr(ord('A') + i), j+1)
-            # Machine will round, so just give it enough info to do the
-            # correct rounding.
-            val = "%.2f" % pool_vols[i][j]
-
-            # test to see if we will exceed total vol per well
-            if running_tot + pool_vols[i][j] > max_vol_per_well:
-                d += 1
-                running_tot = pool_vols[i][j]
-            else:
-                running_tot += pool_vols[i][j]
+    return(picklist.getvalue())
 
-            dest = "%s%d" % (chr(ord('A') +
-                             int(np.floor(d/dest_plate_shape[0]))),
-                             (d % dest_plate_shape[1]))
 
-            contents.append(
-                ",".join(['1', '384LDV_AQ_B2_HT', well_name, "",
-                          val, 'NormalizedDNA', dest]))
+def _stage_steps(wells):
+    """Well pitches a stage moves between consecutive wells"""
+    rows, cols = plate_shape(max(PLATE_SHAPES))
+    try:
+        row, col = well_to_rowcol(wells, rows, cols)
+    except ValueError:
+        # wells that are not on a plate, such as the 'B0' destinations of
+        # sequential pooling pick lists, count one pitch per change
+        return((np.diff(pd.factorize(wells)[0]) != 0).astype(int))
 
-    return "\n".join(contents)
+    # a stage moves along both axes at once
+    return(np.maximum(np.abs(np.diff(row)), np.abs(np.diff(col))))
 
-def plot_plate_vals(dataset, color_map='YlGnBu', annot_str=None,
-                    annot_fmt='.5s'):
+
+def _echo_moves(src_plates, src_wells, dest_plates, dest_wells):
+    """Estimates the plate swaps and stage travel of a series of transfers"""
+    swaps = (src_plates[1:] != src_plates[:-1]) | \
+        (dest_plates[1:] != dest_plates[:-1])
+
+    moves = {'plate swaps': int(np.count_nonzero(swaps))}
+    steps = {}
+    for name, wells in [('source travel', src_wells),
+                        ('destination travel', dest_wells)]:
+        # the stage is reset by a plate swap
+        steps[name] = _stage_steps(wells)
+        steps[name][swaps] = 0
+        moves[name] = int(steps[name].sum())
+
+    # the source and destination stages also move at the same time
+    moves['stage travel'] = int(np.maximum(*steps.values()).sum())
+
+    return(moves)
+
+
+@instrument
+def order_echo_pick_list(picklist, sep=None):
     """
-    Plots values in a plate format. Returns a heatmap in the shape of the
-    plate, with bar graphs aligned to the rows and columns showing the mean and
-    spread of each row and column, and a histogram showing the distribution of
-    values.
+    Orders the transfers of an Echo pick list to cut instrument moves
 
-    Optionally can plot an array of names or other annotations on top of the
-    heatmap.
+    Transfers are grouped by source plate, in the order the plates first
+    appear, and then by destination plate. Within each group the source
+    wells are visited in a serpentine, going left to right along the first
+    row, right to left along the next, and so on. Transfers from the same
+    source well keep their order, so the rows are only reordered where the
+    Echo would otherwise swap plates or travel back across a plate.
 
     Parameters
     ----------
-    dataset: 2D array of numeric
-        data to plot
-    color_map: str
-        matplotlib color map name for heatmap
-    annot_str: 2D array of str
-        values to write over heatmap values to annotate wells
-    annot_fmt: str
-        string formatting values for annotations. Defaults to first 5 char per
-        well.
+    picklist: str
+        pick list as written by `format_dna_norm_picklist`,
+        `format_index_picklist` or `format_pooling_echo_pick_list`
+    sep: str
+        field separator, found from the header line by default
 
     Returns
     -------
+    picklist: str
+        the same rows, reordered
+    moves: pandas DataFrame
+        the plate swaps, and the travel in well pitches of the source stage,
+        the destination stage and of both as they move together, estimated
+        for the transfers 'before' and 'after' ordering
+    """
+    header, _, body = picklist.partition('\n')
+    if sep is None:
+        sep = '\t' if '\t' in header else ','
+
+    # the rows written back are those sorted, so blank lines are dropped
+    # and quoted fields are kept whole, newlines included
+    records = [row for row in csv.reader(StringIO(body), delimiter=sep)
+               if any(row)]
+    names = next(csv.reader([header], delimiter=sep), [])
+
+    columns = ['Source Plate Name', 'Source Well', 'Destination Plate Name',
+               'Destination Well']
+    missing = [c for c in columns if c not in names]
+    if missing:
+        raise ValueError('Pick list has no %s column(s)' %
+                         ', '.join(missing))
+    positions = [names.index(c) for c in columns]
+    if any(len(row) <= max(positions) for row in records):
+        raise ValueError('Pick list rows must have a field per column')
+
+    transfers = pd.DataFrame([[row[i] for i in positions]
+                              for row in records], columns=columns,
+                             dtype=object)
+
+    src_plates = pd.factorize(transfers['Source Plate Name'])[0]
+    dest_plates = pd.factorize(transfers['Destination Plate Name'])[0]
+    src_wells = transfers['Source Well'].values
+    dest_wells = transfers['Destination Well'].values
+
+    rows, cols = plate_shape(max(PLATE_SHAPES))
+    src_row, src_col = well_to_rowcol(src_wells, rows, cols)
+    serpentine = np.where(src_row % 2, -src_col, src_col)
+
+    # lexsort is stable and sorts on the last key first
+    order = np.lexsort((serpentine, src_row, dest_plates, src_plates))
+
+    moves = pd.DataFrame([_echo_moves(src_plates, src_wells, dest_plates,
+                                      dest_wells),
+                          _echo_moves(src_plates[order], src_wells[order],
+                                      dest_plates[order], dest_wells[order])],
+                         index=['before', 'after'])
+
+    if not records:
+        return(picklist, moves)
+
+    f = StringIO()
+    f.write(header + '\n')
+    csv.writer(f, delimiter=sep, lineterminator='\n').writerows(
+        records[i] for i in order)
+
+    # rows end without a newline, as the pick list writers leave them
+    return(f.getvalue()[:-1], moves)
+
+
+@instrument
+def plot_plate_vals(dataset, color_map='YlGnBu', annot_str=None,
+                    annot_fmt='.5s', distribution=True):
+    """
+    Plots values in a plate format
+
+    matplotlib and seaborn are only imported on the first call; see
+    `metapool.plotting.plot_plate_vals` for the parameters.
     """
-    fig = plt.figure(figsize=(20,20))
+    from metapool.plotting import plot_plate_vals as _plot_plate_vals
 
+    return(_plot_plate_vals(dataset, color_map=color_map, annot_str=annot_str,
+                            annot_fmt=annot_fmt, distribution=distribution))
 
-    with sns.axes_style("white"):
-        ax1 = plt.subplot2grid((40,20), (20,0), colspan=18, rowspan=18)
-        ax1.xaxis.tick_top()
-        if annot_str is None:
-            sns.heatmap(dataset,
-                        ax=ax1,
-                        xticklabels = [x + 1 for x in range(dataset.shape[1])],
-                        yticklabels = list(string.ascii_uppercase)[0:dataset.shape[0]],
-                        #square = True,
-                        annot = True,
-                        fmt = '.0f',
-                        cmap = color_map,
-                        cbar = False)
-        else:
-            sns.heatmap(dataset,
-                        ax=ax1,
-                        xticklabels = [x + 1 for x in range(dataset.shape[1])],
-                        yticklabels = list(string.ascii_uppercase)[0:dataset.shape[0]],
-                        #square = True,
-                        annot = annot_str,
-                        fmt = annot_fmt,
-                        cmap = color_map,
-                        cbar = False)
-
-    with sns.axes_style("white"):
-        ax2 = plt.subplot2grid((40,20), (38,0), colspan=18, rowspan=2)
-        ax3 = plt.subplot2grid((40,20), (20,18), colspan=2, rowspan=18)
-        sns.despine()
-        sns.barplot(data=dataset, orient='v', ax=ax2, color = 'grey')
-        sns.barplot(data=dataset.transpose(), orient='h', ax=ax3,
-                    color = 'grey')
-        ax2.set(xticklabels=[], yticklabels=[])
-        ax3.set(xticklabels=[], yticklabels=[])
-
-    with sns.axes_style():
-        ax4 = plt.subplot2grid((40,20), (0,0), colspan=18, rowspan=18)
-        sns.distplot(dataset.flatten()[~np.isnan(dataset.flatten())], ax=ax4,
-                     bins = 20)
-
-    return
 
+@instrument
 def make_2D_array(qpcr, data_col='Cp', well_col='Pos', rows=16, cols=24):
     """
     Pulls a column of data out of a dataframe and puts into array format
@@ -585,25 +1730,53 @@ def make_2D_array(qpcr, data_col='Cp', well_col='Pos', rows=16, cols=24):
 
     Returns
     -------
+    array: numpy array
+        `rows` x `cols` array of the values, float for numeric data
     """
-    # initialize empty Cp array
-    cp_array = np.empty((rows,cols), dtype=object)
+    values = qpcr[data_col]
+    wells = well_to_index(qpcr[well_col], rows, cols)
+
+    # numeric data come back as float, with NaN for wells without a value
+    if (pd.api.types.is_numeric_dtype(values) and
+            not pd.api.types.is_bool_dtype(values)):
+        array = np.full(rows * cols, np.nan)
+        array[wells] = values.astype(float)
+    else:
+        array = np.empty(rows * cols, dtype=object)
+        array[wells] = values.values
+
+    return(array.reshape(rows, cols))
 
-    # fill Cp array with the post-cleaned values from the right half of the
-    # plate
-    for record in qpcr.iterrows():
-        row = ord(str.upper(record[1][well_col][0])) - ord('A')
-        col = int(record[1][well_col][1:]) - 1
-        cp_array[row,col] = record[1][data_col]
 
-    return(cp_array)
+def _plate_well_keys(wells, plates=None, plate_codes=None):
+    """Encodes (plate, well) pairs as single integer join keys"""
+    # every standard plate fits in the well numbering of a 1536 well plate
+    rows, cols = plate_shape(max(PLATE_SHAPES))
+    keys = well_to_index(np.asarray(wells, dtype=object), rows, cols)
 
+    if plates is not None:
+        keys = keys + plate_codes.get_indexer(np.asarray(plates)) * \
+            (rows * cols)
 
-def combine_dfs(qpcr_df, dna_picklist, index_picklist):
+    return(keys)
+
+
+def _take_rows(df, columns, positions):
+    """Gathers columns of `df` at row positions, with NaN where -1"""
+    return({name: df[col].reset_index(drop=True).reindex(positions).values
+            for name, col in columns.items()})
+
+
+@instrument
+def combine_dfs(qpcr_df, dna_picklist, index_picklist, plate_col=None):
     """
     Combines information from the three dataframes into a single frame suitable
     for plotting
 
+    The pick lists are joined to the qPCR wells in one pass, on integer keys
+    built from the well (and plate) of each row, taking only the columns
+    that are kept.
+
     Parameters
     ----------
     qpcr_df: Pandas DataFrame
@@ -615,53 +1788,99 @@ def combine_dfs(qpcr_df, dna_picklist, index_picklist):
         df from index addition picklist import. Expects cols
         ['Destination Well','Plate','Sample Name',
          'Counter','Primer','Source Well','Index']
+    plate_col: str
+        column naming the plate of each row in all three dataframes, to
+        combine the tables of many plates at once. By default the tables
+        are taken to describe a single plate.
 
     Returns
     -------
     combined_df: Pandas DataFrame
-        new DataFrame with the relevant columns
-    """
-    combined_df = pd.DataFrame({'Well': qpcr_df['Pos'],
-                                'Cp': qpcr_df['Cp']})
-
-    combined_df.set_index('Well', inplace=True)
-
-    b = dna_picklist.loc[dna_picklist['Source Plate Name'] != 'water',
-                         ].set_index('Destination Well')
-    c = index_picklist.loc[index_picklist['Source Plate Name'] ==
-                           'i7 Source Plate',].set_index('Destination Well')
-    d = index_picklist.loc[index_picklist['Source Plate Name'] ==
-                           'i5 Source Plate',].set_index('Destination Well')
+        new DataFrame with the relevant columns, with one row per qPCR well
 
-    # Add DNA conc columns
-    combined_df['DNA Concentration'] = b['Concentration']
-    combined_df['DNA Transfer Volume'] = b['Transfer Volume']
-
-    # Add Index columns
-    combined_df['Sample Name'] = c['Sample Name']
-    combined_df['Plate'] = c['Plate']
-    combined_df['Counter'] = d['Counter']
-    combined_df['Source Well i7'] = c['Source Well']
-    combined_df['Index i7'] = c['Index']
-    combined_df['Primer i7'] = c['Primer']
-    combined_df['Source Well i5'] = d['Source Well']
-    combined_df['Index i5'] = d['Index']
-    combined_df['Primer i5'] = d['Primer']
-
-    combined_df.reset_index(inplace=True)
-
-    return(combined_df)
+    Raises
+    ------
+    ValueError
+        if a pick list has more than one transfer of a kind into a well
+    """
+    dna = dna_picklist.loc[dna_picklist['Source Plate Name'] != 'water']
+    i7 = index_picklist.loc[index_picklist['Source Plate Name'] ==
+                            'i7 Source Plate']
+    i5 = index_picklist.loc[index_picklist['Source Plate Name'] ==
+                            'i5 Source Plate']
+
+    if plate_col is None:
+        plates = {'qpcr': None, 'dna': None, 'i7': None, 'i5': None}
+        plate_codes = None
+    else:
+        plates = {'qpcr': qpcr_df[plate_col], 'dna': dna[plate_col],
+                  'i7': i7[plate_col], 'i5': i5[plate_col]}
+        plate_codes = pd.Index(pd.unique(np.concatenate(
+            [np.asarray(p, dtype=object) for p in plates.values()])))
+
+    qpcr_keys = _plate_well_keys(qpcr_df['Pos'], plates['qpcr'], plate_codes)
+
+    combined = {}
+    if plate_col is not None:
+        combined[plate_col] = qpcr_df[plate_col].values
+    combined['Well'] = qpcr_df['Pos'].values
+    combined['Cp'] = qpcr_df['Cp'].values
+
+    tables = [('dna', dna, {'DNA Concentration': 'Concentration',
+                            'DNA Transfer Volume': 'Transfer Volume'}),
+              ('i7', i7, {'Sample Name': 'Sample Name',
+                          'Plate': 'Plate',
+                          'Source Well i7': 'Source Well',
+                          'Index i7': 'Index',
+                          'Primer i7': 'Primer'}),
+              ('i5', i5, {'Counter': 'Counter',
+                          'Source Well i5': 'Source Well',
+                          'Index i5': 'Index',
+                          'Primer i5': 'Primer'})]
+
+    for name, table, columns in tables:
+        keys = pd.Index(_plate_well_keys(table['Destination Well'],
+                                         plates[name], plate_codes))
+        if not keys.is_unique:
+            raise ValueError('The %s pick list has more than one transfer '
+                             'into a well' % name)
+
+        combined.update(_take_rows(table, columns,
+                                   keys.get_indexer(qpcr_keys)))
+
+    # the columns in the order the notebooks write them out
+    order = ([plate_col] if plate_col is not None else []) + \
+        ['Well', 'Cp', 'DNA Concentration', 'DNA Transfer Volume',
+         'Sample Name', 'Plate', 'Counter', 'Source Well i7', 'Index i7',
+         'Primer i7', 'Source Well i5', 'Index i5', 'Primer i5']
+
+    return(pd.DataFrame(combined, columns=order))
+
+
+@instrument
+def parse_dna_conc_csv(fp):
+    """
+    Reads the DNA concentrations of a plate from a quant workbook
 
+    Parameters
+    ----------
+    fp: str
+        path to the quant file, see `read_quant_plate`
 
-def parse_dna_conc_csv(fp):
-    dna_df = pd.read_excel(fp, skiprows=4, parse_cols=[1,2,3,4,5])
+    Returns
+    -------
+    dna_df: pandas DataFrame
+        the 'Well' and concentration ('pico_conc') of every well on the plate
+    """
+    concs = read_quant_plate(fp)
 
-    dna_df = dna_df.loc[list(range(384)),]
+    dna_df = pd.DataFrame({'Well': well_names(*plate_shape(len(concs))),
+                           'pico_conc': concs})
 
-    dna_df['pico_conc'] = pd.to_numeric(dna_df['[Concentration]'], errors='Coerce')
     return(dna_df)
 
 
+@instrument
 def add_dna_conc(combined_df, dna_df):
     new_df = combined_df.set_index('Well')
     dna = dna_df.set_index('Well')['pico_conc']
@@ -673,6 +1892,7 @@ def add_dna_conc(combined_df, dna_df):
     return(new_df)
 
 
+@instrument
 def compute_pico_concentration(dna_vals, size=400):
     """Computes molar concentration of libraries from library DNA concentration values.
 
@@ -728,6 +1948,50 @@ def format_sheet_comments(PI=None, contacts=None, other=None, sep=','):
     return(comments)
 
 
+@instrument
+def write_sample_sheet(f, sample_sheet_dict, sep=',', template=ss_temp()):
+    """Writes Illumina-compatible sample sheet to an open file handle
+
+    Parameters
+    ----------
+    f: open filehandle
+        writable text stream
+    sample_sheet_dict : 2-level dict
+        dict with 1st level headers 'Comments', 'Header', 'Reads', 'Settings', and 'Data'. 
+        'data' can be a str, or a readable text stream (e.g. one written by
+        `write_sample_data`) which is copied across without being read
+        into memory at once, or a DataFrame such as the one returned by
+        `parse_sample_sheet`.
+    sep: str
+        field separator
+    template: str
+        the sample sheet template
+    """
+    sample_sheet_dict = dict(sample_sheet_dict)
+    data = sample_sheet_dict.pop('data')
+
+    if sample_sheet_dict['comments']:
+        sample_sheet_dict['comments'] = re.sub('^',
+                                               '# ',
+                                               sample_sheet_dict['comments'].rstrip(),
+                                               flags=re.MULTILINE) + '\n'
+
+    head, tail = template.split('{data}', 1)
+
+    f.write(head.format(**sample_sheet_dict, **{'sep': sep}))
+    if isinstance(data, str):
+        f.write(data)
+    elif isinstance(data, pd.DataFrame):
+        f.write(sep.join(map(str, data.columns)))
+        if len(data):
+            _write_rows(f, [_str_column(data[c].values) for c in data],
+                        sep=sep)
+    else:
+        shutil.copyfileobj(data, f)
+    f.write(tail.format(**sample_sheet_dict, **{'sep': sep}))
+
+
+@instrument
 def format_sample_sheet(sample_sheet_dict, sep=',', template=ss_temp()):
     """Formats Illumina-compatible sample sheet.
 
@@ -741,15 +2005,131 @@ def format_sample_sheet(sample_sheet_dict, sep=',', template=ss_temp()):
     sample_sheet : str
         the sample sheet string
     """
-    if sample_sheet_dict['comments']:
-        sample_sheet_dict['comments'] = re.sub('^',
-                                               '# ',
-                                               sample_sheet_dict['comments'].rstrip(),
-                                               flags=re.MULTILINE) + '\n'
+    f = StringIO()
+    write_sample_sheet(f, sample_sheet_dict, sep=sep, template=template)
+
+    return(f.getvalue())
+
+
+@instrument
+def parse_sample_sheet(f, sep=','):
+    """Parses an Illumina sample sheet, as written by `format_sample_sheet`
+
+    The sheet is read in a single pass over its lines, up to the [Data]
+    section, which is read as a table. Formatting the result with
+    `format_sample_sheet` gives back the same sheet.
+
+    Parameters
+    ----------
+    f: str or open filehandle
+        path to, or open filehandle of, the sample sheet
+    sep: str
+        field separator
+
+    Returns
+    -------
+    sample_sheet_dict : dict
+        'comments' without their leading '# ', each [Header] and [Settings]
+        field by name, the [Reads] as 'read1', 'read2', ..., and 'data', the
+        [Data] rows as a DataFrame with an int 'Lane' column and str columns
+        otherwise
+
+    Raises
+    ------
+    ValueError
+        if the sheet has no [Data] section
+    """
+    lines = _read_text(f).replace('\r\n', '\n').split('\n')
+
+    sheet = {'comments': []}
+    section = None
+    reads = 0
+    for i, line in enumerate(lines):
+        if line.startswith('[') and line.rstrip(sep).endswith(']'):
+            section = line.rstrip(sep)[1:-1]
+            if section == 'Data':
+                break
+        elif section is None:
+            if line:
+                sheet['comments'].append(re.sub('^# ?', '', line))
+        elif section == 'Reads':
+            if line.strip(sep):
+                reads += 1
+                sheet['read%d' % reads] = line
+        elif line.strip(sep):
+            key, _, value = line.partition(sep)
+            sheet[key] = value
+    else:
+        raise ValueError('The sample sheet has no [Data] section')
+
+    comments = sheet['comments']
+    sheet['comments'] = '\n'.join(comments) + '\n' if comments else ''
+
+    data = '\n'.join(lines[i + 1:])
+    # quotes are kept verbatim, as write_sample_sheet wrote them
+    header = pd.read_csv(StringIO(data), sep=sep, nrows=0,
+                         quoting=csv.QUOTE_NONE).columns
+    sheet['data'] = pd.read_csv(StringIO(data), sep=sep,
+                                quoting=csv.QUOTE_NONE,
+                                keep_default_na=False,
+                                dtype={c: (np.int64 if c == 'Lane' else str)
+                                       for c in header})
+
+    return(sheet)
+
+
+def _parse_sample_sheet_file(job):
+    """Parses one sample sheet of a batch, for a worker process"""
+    fp, sep = job
+
+    return(parse_sample_sheet(fp, sep=sep)['data'])
+
 
-    sample_sheet = template.format(**sample_sheet_dict, **{'sep': sep})
+@instrument
+def read_sample_sheets(fps, sep=',', processes=None):
+    """Parses many sample sheets into a single table of their [Data] rows
 
-    return(sample_sheet)
+    Parameters
+    ----------
+    fps: str or list of str
+        the sample sheet files, or a directory whose `.csv` files are all
+        sample sheets
+    sep: str
+        field separator
+    processes: int
+        the number of worker processes to parse the sheets in, defaults to
+        the number of CPUs. With a single process, the sheets are parsed in
+        the calling process.
+
+    Returns
+    -------
+    data: pandas DataFrame
+        the [Data] rows of every sheet, in the order of the files, after a
+        'Sample Sheet' column naming the file each row comes from
+    """
+    if isinstance(fps, str):
+        fps = sorted(os.path.join(fps, fp) for fp in os.listdir(fps)
+                     if fp.endswith('.csv'))
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    jobs = [(fp, sep) for fp in fps]
+    if processes > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(min(processes, len(jobs))) as pool:
+            tables = list(pool.map(_parse_sample_sheet_file, jobs))
+    else:
+        tables = [_parse_sample_sheet_file(job) for job in jobs]
+
+    for fp, table in zip(fps, tables):
+        table.insert(0, 'Sample Sheet', os.path.basename(fp))
+
+    if not tables:
+        return(pd.DataFrame(columns=['Sample Sheet']))
+
+    return(pd.concat(tables, ignore_index=True))
 
 
 def bcl_scrub_name(name):
@@ -769,96 +2149,501 @@ def bcl_scrub_name(name):
     return(re.sub('[^0-9a-zA-Z\-\_]+', '_', name))
 
 
+# complement of each nucleotide; other characters are left as they are
+_COMPLEMENT = str.maketrans('ACGT', 'TGCA')
+_COMPLEMENT_BYTES = np.arange(256, dtype=np.uint8)
+_COMPLEMENT_BYTES[np.frombuffer(b'ACGT', dtype=np.uint8)] = \
+    np.frombuffer(b'TGCA', dtype=np.uint8)
+
+
 def rc(seq):
     """
-    from http://stackoverflow.com/a/25189185/7146785
+    Reverse complements a nucleotide sequence
+
+    Parameters
+    ----------
+    seq: str
+        the sequence
+
+    Returns
+    -------
+    str
+        the reverse complement of `seq`
     """
-    complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
-    
-    rev_seq = "".join(complement.get(base, base) for base in reversed(seq))
-    
-    return(rev_seq)
+    return(seq.translate(_COMPLEMENT)[::-1])
+
+
+@instrument
+def rc_array(seqs):
+    """
+    Reverse complements many nucleotide sequences at once
+
+    Parameters
+    ----------
+    seqs: array-like of str
+        the sequences, which may differ in length
+
+    Returns
+    -------
+    numpy array of str
+        the reverse complement of each sequence, in the shape of `seqs`
+    """
+    seqs = np.asarray(seqs, dtype=str)
+    shape = seqs.shape
+    seqs = seqs.ravel()
+
+    if not len(seqs):
+        return(seqs.reshape(shape))
+
+    lengths = np.char.str_len(seqs)
+    codes = _seq_bytes(seqs)
+    width = codes.shape[1]
+
+    # reversing the rows moves the padding of shorter sequences to their
+    # start, so each row is shifted back to the left as it is reversed
+    cols = width - 1 - np.arange(width) - (width - lengths)[:, np.newaxis]
+    codes = np.where(cols >= 0,
+                     _COMPLEMENT_BYTES[codes[np.arange(len(codes))[:, None],
+                                             np.maximum(cols, 0)]],
+                     0).astype(np.uint8)
+
+    out = codes.view('S%d' % width).ravel().astype(str)
+
+    return(out.reshape(shape))
 
 
+@instrument
 def sequencer_i5_index(sequencer, indices):
+    """
+    Orients i5 index sequences as they are read by a given sequencer
+
+    The HiSeq4000, HiSeq3000, MiniSeq and NextSeq read i5 barcodes as
+    reverse complements; the HiSeq2500, HiSeq1500, MiSeq and NovaSeq read
+    them in the standard direction.
+
+    Parameters
+    ----------
+    sequencer: str
+        the sequencer model, e.g. 'HiSeq4000' or 'MiSeq'
+    indices: list, tuple, numpy array or pandas Series of str
+        i5 index sequences, in the standard direction
+
+    Returns
+    -------
+    indices
+        the i5 index sequences as read by the sequencer, in the same type
+        of container as `indices`
+
+    Raises
+    ------
+    ValueError
+        if the sequencer is not recognized
+    """
     revcomp_sequencers = ['HiSeq4000','MiniSeq','NextSeq','HiSeq3000']
     other_sequencers = ['HiSeq2500','HiSeq1500','MiSeq','NovaSeq']
 
     if sequencer in revcomp_sequencers:
-        print('%s: i5 barcodes are output as reverse compliments' % sequencer)
-        return([rc(x) for x in indices])
+        rev = rc_array(indices)
+        if isinstance(indices, pd.Series):
+            return(pd.Series(rev, index=indices.index, name=indices.name,
+                             dtype=indices.dtype))
+        elif isinstance(indices, np.ndarray):
+            return(rev.astype(indices.dtype))
+        elif isinstance(indices, tuple):
+            return(tuple(rev.tolist()))
+        return(rev.tolist())
     elif sequencer in other_sequencers:
-        print('%s: i5 barcodes are output in standard direction' % sequencer)
         return(indices)
     else:
         raise ValueError('Your indicated sequencer [%s] is not recognized.\n'
-                         'Recognized sequencers are: \n'
-                         ' '.join(revcomp_sequencers + other_sequencers))
+                         'Recognized sequencers are: \n%s' %
+                         (sequencer,
+                          ' '.join(revcomp_sequencers + other_sequencers)))
+
+
+@instrument
+def write_sample_data(f, sample_ids, i7_name, i7_seq, i5_name, i5_seq,
+                      sample_plate, sample_proj, wells=None,
+                      description=None, lanes=[1], sep=',',
+                      barcode_mismatches=None):
+    """
+    Writes the [Data] component of the Illumina sample sheet to an open
+    file handle
+
+    The columns are built once for all samples and repeated for each lane.
+
+    Parameters
+    ----------
+    f: open filehandle
+        writable text stream
+    sample_ids: array-like of str
+        the sample ids, used as both Sample_ID and Sample_Name
+    i7_name, i7_seq, i5_name, i5_seq: array-like of str
+        the index names and sequences of each sample
+    sample_plate, sample_proj: str or array-like of str
+        the plate and project of all samples, or of each one
+    wells: array-like of str
+        the well of each sample
+    description: array-like of str
+        the description of each sample
+    lanes: list of int
+        the lanes on which the samples are sequenced
+    sep: str
+        field separator
+    barcode_mismatches: int
+        If given, check that the samples of each lane can be demultiplexed
+        with this many barcode mismatches before anything is written
+
+    Raises
+    ------
+    ValueError
+        if the sample information is not all the same length, or if
+        `barcode_mismatches` is given and the indices of two samples are
+        too similar to demultiplex
+    """
+    n = len(sample_ids)
+
+    if len({n, len(i7_name), len(i7_seq), len(i5_name), len(i5_seq)}) != 1:
+        raise ValueError('Sample information lengths are not all equal')
 
+    if wells is None:
+        wells = ''
+    if description is None:
+        description = ''
+
+    sample_ids = _str_column(sample_ids)
+    columns = [sample_ids,
+               sample_ids,
+               _str_column(sample_plate, n),
+               _str_column(wells, n),
+               _str_column(i7_name),
+               _str_column(i7_seq),
+               _str_column(i5_name),
+               _str_column(i5_seq),
+               _str_column(sample_proj, n),
+               _str_column(description, n)]
+
+    if len({len(col) for col in columns}) != 1:
+        raise ValueError('Sample information lengths are not all equal')
 
+    lanes = list(lanes)
+
+    if barcode_mismatches is not None and lanes:
+        # every lane holds the same samples
+        first, second, i7_dist, i5_dist = _index_collisions(
+            columns[5], columns[7], barcode_mismatches)
+        if len(first):
+            collisions = pd.DataFrame({'Sample_ID 1': np.take(sample_ids,
+                                                              first),
+                                       'Sample_ID 2': np.take(sample_ids,
+                                                              second),
+                                       'index distance': i7_dist,
+                                       'index2 distance': i5_dist})
+            raise ValueError('%d pair(s) of samples cannot be demultiplexed '
+                             'with %d barcode mismatch(es) in lane(s) %s:\n%s'
+                             % (len(first), barcode_mismatches,
+                                ', '.join(map(str, lanes)),
+                                collisions.to_string(index=False)))
+
+    columns = [_str_column(np.repeat(np.asarray(lanes, dtype=object), n))] + \
+              [col * len(lanes) for col in columns]
+
+    f.write(sep.join(['Lane','Sample_ID','Sample_Name','Sample_Plate',
+                      'Sample_Well','I7_Index_ID','index','I5_Index_ID',
+                      'index2','Sample_Project','Description']))
+    if n and lanes:
+        _write_rows(f, columns, sep=sep)
+
+
+@instrument
 def format_sample_data(sample_ids, i7_name, i7_seq, i5_name, i5_seq,
                         sample_plate, sample_proj, wells=None,
-                       description=None, lanes=[1], sep=','):
+                       description=None, lanes=[1], sep=',',
+                       barcode_mismatches=None):
     """
     Creates the [Data] component of the Illumina sample sheet from plate information
 
     Parameters
     ----------
-    sample_sheet_dict : 2-level dict
-        dict with 1st level headers 'Comments', 'Header', 'Reads', 'Settings', and 'Data'. 
+    sample_ids: array-like of str
+        the sample ids, used as both Sample_ID and Sample_Name
+    i7_name, i7_seq, i5_name, i5_seq: array-like of str
+        the index names and sequences of each sample
+    sample_plate, sample_proj: str or array-like of str
+        the plate and project of all samples, or of each one
+    wells: array-like of str
+        the well of each sample
+    description: array-like of str
+        the description of each sample
+    lanes: list of int
+        the lanes on which the samples are sequenced
+    sep: str
+        field separator
+    barcode_mismatches: int
+        If given, check that the samples of each lane can be demultiplexed
+        with this many barcode mismatches
 
     Returns
     -------
     data : str
         the sample sheet string
+
+    Raises
+    ------
+    ValueError
+        if `barcode_mismatches` is given and the indices of two samples are
+        too similar to demultiplex
     """
-    data = ''
-    
-    if len(sample_ids) != len(i7_name) != len(i7_seq) != len(i5_name) != len(i5_seq):
-        raise ValueError('Sample information lengths are not all equal')
-    
-    if wells is None:
-        wells = [''] * len(sample_ids)
-    if description is None:
-        description = [''] * len(sample_ids)
-    if isinstance(sample_plate, str):
-        sample_plate = [sample_plate] * len(sample_ids)
-    if isinstance(sample_proj, str):
-        sample_proj = [sample_proj] * len(sample_ids)
-    
-    header = ','.join(['Lane','Sample_ID','Sample_Name','Sample_Plate',
-                       'Sample_Well','I7_Index_ID','index','I5_Index_ID',
-                       'index2','Sample_Project','Description'])
-        
-    data += header
-
-    sample_plate = list(sample_plate)
-    wells = list(wells)
-    i7_name = list(i7_name)
-    i7_seq = list(i7_seq)
-    i5_name = list(i5_name)
-    i5_seq = list(i5_seq)
-    sample_proj = list(sample_proj)
-    description = list(description)
-
-    for lane in lanes:
-        for i, sample in enumerate(sample_ids):
-            line = sep.join([str(lane),
-                             sample,
-                             sample,
-                             sample_plate[i],
-                             wells[i],
-                             i7_name[i],
-                             i7_seq[i],
-                             i5_name[i],
-                             i5_seq[i],
-                             sample_proj[i],
-                             description[i]])
-            data += '\n' + line
-    
-    return(data)
+    f = StringIO()
+    write_sample_data(f, sample_ids, i7_name, i7_seq, i5_name, i5_seq,
+                      sample_plate, sample_proj, wells=wells,
+                      description=description, lanes=lanes, sep=sep,
+                      barcode_mismatches=barcode_mismatches)
+
+    return(f.getvalue())
+
+
+@instrument
+def find_index_collisions(data, barcode_mismatches=1):
+    """
+    Finds samples sequenced in the same lane whose indices collide
+
+    bcl2fastq refuses a sample sheet in which a pair of index reads could be
+    assigned to two samples of one lane, that is where both the `index` and
+    the `index2` sequences of the two samples are no more than twice
+    `barcode_mismatches` apart. The check takes time in proportion to the
+    number of samples, rather than the number of pairs, for up to one
+    mismatch.
+
+    Parameters
+    ----------
+    data: pandas DataFrame
+        [Data] rows of a sample sheet, as returned by `parse_sample_sheet`,
+        with 'Sample_ID', 'index' and optionally 'Lane' and 'index2'
+        columns
+    barcode_mismatches: int
+        number of mismatches allowed per index read when demultiplexing
+
+    Returns
+    -------
+    collisions: pandas DataFrame
+        one row per colliding pair of samples, with their lane (0 for sheets
+        without lanes), sample ids and the Hamming distances between their
+        index and index2 sequences
+    """
+    n = len(data)
+    lanes = np.asarray(data['Lane']) if 'Lane' in data else np.zeros(n, int)
+    sample_ids = np.asarray(data['Sample_ID'], dtype=object)
+    i7_seqs = np.asarray(data['index'].fillna(''), dtype=str)
+    if 'index2' in data:
+        i5_seqs = np.asarray(data['index2'].fillna(''), dtype=str)
+    else:
+        i5_seqs = np.full(n, '')
+
+    collisions = []
+    for lane in pd.unique(lanes):
+        rows = np.flatnonzero(lanes == lane)
+        first, second, i7_dist, i5_dist = _index_collisions(
+            i7_seqs[rows], i5_seqs[rows], barcode_mismatches)
+        collisions.append(pd.DataFrame(
+            {'Lane': lane,
+             'Sample_ID 1': sample_ids[rows[first]],
+             'Sample_ID 2': sample_ids[rows[second]],
+             'index distance': i7_dist,
+             'index2 distance': i5_dist},
+            columns=['Lane', 'Sample_ID 1', 'Sample_ID 2', 'index distance',
+                     'index2 distance']))
+
+    if not collisions:
+        return(pd.DataFrame(columns=['Lane', 'Sample_ID 1', 'Sample_ID 2',
+                                     'index distance', 'index2 distance']))
+
+    return(pd.concat(collisions, ignore_index=True))
+
+
+@contextmanager
+def _text_stream(f):
+    """Opens a file path, or passes an open filehandle through"""
+    if hasattr(f, 'read'):
+        yield f
+    else:
+        with open(f, 'r') as fh:
+            yield fh
+
+
+# keys of a bcl2fastq Stats.json that precede the values read from it
+_STATS_KEY = re.compile(r'"(LaneNumber|DemuxResults)"\s*:\s*')
+_STATS_LANE = re.compile(r'(\d+)\s*[,}]')
+_STATS_ARRAY = re.compile(r'[\s,]*')
+
+
+def _iter_demux_results(f, chunk_size=1 << 16):
+    """
+    Yields (sample id, lane, reads) from a bcl2fastq Stats.json stream
 
+    The document is read in chunks, and only the per-sample entries of each
+    lane's `DemuxResults` are decoded, one at a time, so that memory does
+    not grow with the size of the flowcell.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    lane = None
+
+    def more(buf, pos):
+        chunk = f.read(chunk_size)
+        return(buf[pos:] + chunk, 0, not chunk)
+
+    while True:
+        key = _STATS_KEY.search(buf, pos)
+        if key is None or key.end() == len(buf):
+            if eof:
+                return
+            # keep enough to find a key cut by the end of the chunk
+            buf, pos, eof = more(buf, max(pos, len(buf) - 64))
+            continue
+
+        if key.group(1) == 'LaneNumber':
+            value = _STATS_LANE.match(buf, key.end())
+            if value is None:
+                if eof:
+                    raise ValueError('Stats.json has a malformed LaneNumber')
+                buf, pos, eof = more(buf, key.start())
+                continue
+            lane = int(value.group(1))
+            pos = value.end(1)
+            continue
+
+        pos = key.end()
+        if buf[pos] != '[':
+            raise ValueError('Stats.json has a malformed DemuxResults')
+        pos += 1
+
+        while True:
+            pos = _STATS_ARRAY.match(buf, pos).end()
+            if pos == len(buf):
+                if eof:
+                    raise ValueError('Stats.json ends within DemuxResults')
+                buf, pos, eof = more(buf, pos)
+                continue
+            if buf[pos] == ']':
+                pos += 1
+                break
+
+            try:
+                sample, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError('Stats.json ends within DemuxResults')
+                buf, pos, eof = more(buf, pos)
+                continue
+
+            yield(sample['SampleId'], lane, sample['NumberReads'])
+            pos = end
+
+
+def _read_counts_frame(sample_ids, lanes, reads):
+    """Tabulates read counts to join against sample sheet [Data] rows"""
+    return(pd.DataFrame({'Sample_ID': pd.Series(sample_ids, dtype=str),
+                         'Lane': np.array(lanes, dtype=np.int64),
+                         'Reads': np.array(reads, dtype=np.int64)}))
+
+
+@instrument
+def read_stats_json(f):
+    """
+    Reads the per-sample read counts of a bcl2fastq Stats.json file
+
+    The file is parsed incrementally, so flowcells with tens of thousands
+    of samples are read without holding the whole document in memory. Only
+    the samples of each lane's demultiplexing results are kept; reads that
+    were not assigned to a sample are left out.
+
+    Parameters
+    ----------
+    f: str or open filehandle
+        path to, or open filehandle of, the Stats.json file
+
+    Returns
+    -------
+    counts: pandas DataFrame
+        one row per sample and lane, with columns 'Sample_ID', 'Lane' and
+        'Reads', which join against the [Data] rows of `format_sample_data`
+        on 'Sample_ID' and 'Lane'
+    """
+    with _text_stream(f) as fh:
+        results = list(_iter_demux_results(fh))
+
+    return(_read_counts_frame(*zip(*results)) if results
+           else _read_counts_frame([], [], []))
+
+
+# names of the FASTQ files written by bcl2fastq, as listed by MultiQC
+FASTQ_NAME_REGEX = r'^(?P<sample>.+?)_S\d+_L(?P<lane>\d+)_R(?P<read>\d)_\d+'
+
+
+@instrument
+def read_multiqc_counts(f, count_col='Total Sequences',
+                        regex=FASTQ_NAME_REGEX, read='1'):
+    """
+    Reads per-sample read counts from a MultiQC table
 
+    The table, such as `multiqc_fastqc.txt`, is read a line at a time, and
+    only its 'Sample' column and `count_col` are kept.
+
+    Parameters
+    ----------
+    f: str or open filehandle
+        path to, or open filehandle of, the tab-separated MultiQC table
+    count_col: str
+        the column holding the number of reads
+    regex: str
+        pattern splitting the 'Sample' column into a `sample` id, and
+        optionally a `lane` and a `read`, as named groups. Rows that do not
+        match are left out. By default, bcl2fastq FASTQ names are matched.
+    read: str
+        the read to count, when `regex` has a `read` group, so that each
+        read pair is only counted once
+
+    Returns
+    -------
+    counts: pandas DataFrame
+        one row per sample and lane, with columns 'Sample_ID', 'Lane' and
+        'Reads', which join against the [Data] rows of `format_sample_data`
+        on 'Sample_ID' and 'Lane'. Lane is 0 where `regex` has no `lane`
+        group.
+    """
+    pattern = re.compile(regex)
+    groups = pattern.groupindex
+
+    sample_ids, lanes, reads = [], [], []
+    with _text_stream(f) as fh:
+        header = next(fh, '').rstrip('\r\n').split('\t')
+        try:
+            name_idx = header.index('Sample')
+            count_idx = header.index(count_col)
+        except ValueError:
+            raise ValueError('MultiQC table has no Sample or %r column' %
+                             count_col)
+        ncols = max(name_idx, count_idx) + 1
+
+        for line in fh:
+            fields = line.rstrip('\r\n').split('\t', ncols)
+            if len(fields) < ncols:
+                continue
+            match = pattern.match(fields[name_idx])
+            if match is None:
+                continue
+            if 'read' in groups and match.group('read') != read:
+                continue
+
+            sample_ids.append(match.group('sample'))
+            lanes.append(int(match.group('lane')) if 'lane' in groups else 0)
+            reads.append(int(float(fields[count_idx])))
+
+    return(_read_counts_frame(sample_ids, lanes, reads))
+
+
+@instrument
 def reformat_interleaved_to_columns(wells):
     """
     converts condensed 96-to-384 plates in this format:
@@ -886,30 +2671,7 @@ def reformat_interleaved_to_columns(wells):
     new_wells: np array of str
         then new well locations in matching array positions
     """
-    
-    wells = np.array(wells)
-    new_wells = np.empty(np.shape(wells), dtype='object')
-    
-    for i, owell in np.ndenumerate(wells):
-        row = ord(str(owell[0]).upper()) - 65
-        col = int(owell[1:]) - 1
-        
-        # ROWS
-        # roffset = ROW % 2
-        # row = ROW - roffset + floor(COL / 12)
-        
-        roffset = row % 2
-        nrow = int(row - roffset + np.floor(col / 12))
-        
-        # COLS
-        # coffset = COL % 2 + (ROW % 2) * 2
-        # col = coffset * 6 + (col / 2) % 6
-        
-        coffset = col % 2 + (row % 2) * 2
-        ncol = int(coffset * 6 + (col / 2) % 6)
 
-        nwell = '%s%s' % (chr(nrow + 65), ncol + 1)
-    
-        new_wells[i] = nwell
-    
+    new_wells = transform_wells(wells, 'interleaved_to_columns')
+
     return(new_wells)
@@ -0,0 +1,331 @@
+"""
+Plate plots for the metapool notebooks
+
+This module imports matplotlib and seaborn, so it is kept apart from
+`metapool.metapool` and only loaded when a plot is drawn.
+"""
+import os
+import re
+import string
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO
+
+import numpy as np
+import seaborn as sns
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+def _draw_plate(fig, dataset, color_map='YlGnBu', annot_str=None,
+                annot_fmt='.5s', distribution=True):
+    """Draws the panels of a plate plot on a figure"""
+    # without the distribution panel, the heatmap takes the whole figure
+    top = 20 if distribution else 0
+    grid = fig.add_gridspec(top + 20, 20)
+
+    with sns.axes_style("white"):
+        ax1 = fig.add_subplot(grid[top:top + 18, 0:18])
+        ax1.xaxis.tick_top()
+        if annot_str is None:
+            annot, fmt = True, '.0f'
+        else:
+            annot, fmt = annot_str, annot_fmt
+        sns.heatmap(dataset,
+                    ax=ax1,
+                    xticklabels=[x + 1 for x in range(dataset.shape[1])],
+                    yticklabels=list(
+                        string.ascii_uppercase)[0:dataset.shape[0]],
+                    annot=annot,
+                    fmt=fmt,
+                    cmap=color_map,
+                    cbar=False)
+
+    with sns.axes_style("white"):
+        ax2 = fig.add_subplot(grid[top + 18:top + 20, 0:18])
+        ax3 = fig.add_subplot(grid[top:top + 18, 18:20])
+        sns.despine(fig=fig)
+        sns.barplot(data=dataset, orient='v', ax=ax2, color='grey')
+        sns.barplot(data=dataset.transpose(), orient='h', ax=ax3,
+                    color='grey')
+        ax2.set(xticklabels=[], yticklabels=[])
+        ax3.set(xticklabels=[], yticklabels=[])
+
+    if distribution:
+        with sns.axes_style():
+            ax4 = fig.add_subplot(grid[0:18, 0:18])
+            sns.distplot(dataset.flatten()[~np.isnan(dataset.flatten())],
+                         ax=ax4, bins=20)
+
+
+def plot_plate_vals(dataset, color_map='YlGnBu', annot_str=None,
+                    annot_fmt='.5s', distribution=True):
+    """
+    Plots values in a plate format. Returns a heatmap in the shape of the
+    plate, with bar graphs aligned to the rows and columns showing the mean and
+    spread of each row and column, and a histogram showing the distribution of
+    values.
+
+    Optionally can plot an array of names or other annotations on top of the
+    heatmap.
+
+    Parameters
+    ----------
+    dataset: 2D array of numeric
+        data to plot
+    color_map: str
+        matplotlib color map name for heatmap
+    annot_str: 2D array of str
+        values to write over heatmap values to annotate wells
+    annot_fmt: str
+        string formatting values for annotations. Defaults to first 5 char per
+        well.
+    distribution: bool
+        whether to draw the histogram of values above the heatmap
+
+    Returns
+    -------
+    """
+    fig = plt.figure(figsize=(20, 20 if distribution else 10))
+
+    _draw_plate(fig, dataset, color_map=color_map, annot_str=annot_str,
+                annot_fmt=annot_fmt, distribution=distribution)
+
+    return
+
+
+def _new_figure(distribution):
+    """A figure on the Agg canvas that pyplot does not keep track of"""
+    fig = Figure(figsize=(20, 20 if distribution else 10))
+    FigureCanvasAgg(fig)
+
+    return(fig)
+
+
+def _render_png(job):
+    """Draws one plate and writes it to a PNG file"""
+    fp, title, dataset, annot_str, kwargs, dpi = job
+
+    fig = _new_figure(kwargs['distribution'])
+    try:
+        _draw_plate(fig, dataset, annot_str=annot_str, **kwargs)
+        fig.suptitle(title)
+        fig.savefig(fp, dpi=dpi)
+    finally:
+        fig.clear()
+
+    return(fp)
+
+
+def _render_pdf(job):
+    """Draws one plate and writes it to a single-page PDF, as bytes"""
+    _, title, dataset, annot_str, kwargs, _ = job
+
+    fig = _new_figure(kwargs['distribution'])
+    try:
+        _draw_plate(fig, dataset, annot_str=annot_str, **kwargs)
+        fig.suptitle(title)
+        page = BytesIO()
+        fig.savefig(page, format='pdf')
+    finally:
+        fig.clear()
+
+    return(page.getvalue())
+
+
+_PDF_REF = re.compile(rb'(\d+) 0 R\b')
+
+
+def _pdf_objects(data):
+    """
+    Splits a PDF written by matplotlib into its numbered objects
+
+    matplotlib writes a single cross-reference table, without object
+    streams, so each object runs from its offset in the table to the next
+    object, or to the table itself.
+
+    Returns
+    -------
+    objects: dict of int to bytes
+        the body of each object, between 'obj' and 'endobj'
+    root: int
+        the number of the document catalog
+    """
+    xref = int(data[data.rindex(b'startxref') + 9:].split()[0])
+    table, trailer = data[xref:].split(b'trailer', 1)
+    entries = table.split(b'\n')[1:]
+    first, count = map(int, entries[0].split())
+
+    offsets = {}
+    for i, entry in enumerate(entries[1:count + 1]):
+        offset, _, kind = entry.split()
+        if kind == b'n':
+            offsets[first + i] = int(offset)
+
+    ends = sorted(offsets.values()) + [xref]
+    objects = {}
+    for number, offset in offsets.items():
+        body = data[offset:ends[bisect_right(ends, offset)]]
+        objects[number] = body[body.index(b'obj') + 3:body.rindex(b'endobj')]
+
+    root = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+
+    return(objects, root)
+
+
+def _merge_pdfs(documents, f):
+    """
+    Writes the pages of PDFs written by matplotlib into one PDF
+
+    The objects of each document are renumbered after those of the ones
+    before it. Their catalogs and page trees are replaced by a single
+    catalog (object 1) and page tree (object 2) holding every page, in
+    order.
+
+    Parameters
+    ----------
+    documents: iterable of bytes
+        the PDFs to merge
+    f: open binary filehandle
+        where to write the merged PDF
+    """
+    header = b'%PDF-1.4\n%\xac\xdc \xab\xba\n'
+    f.write(header)
+    position = len(header)
+    # offsets of the objects, with the catalog and page tree written last
+    offsets = [None, None]
+    kids = []
+
+    def write(number, content):
+        nonlocal position
+        chunk = b'%d 0 obj' % number + content + b'endobj\n'
+        f.write(chunk)
+        offsets[number - 1] = position
+        position += len(chunk)
+
+    for data in documents:
+        objects, root = _pdf_objects(data)
+        pages = int(re.search(rb'/Pages (\d+) 0 R', objects[root]).group(1))
+        old_kids = re.search(rb'/Kids \[(.*?)\]', objects[pages], re.S)
+
+        # the page tree of the document becomes the shared one
+        numbers = {pages: 2}
+        for number in sorted(objects):
+            if number not in (root, pages):
+                numbers[number] = len(offsets) + 1
+                offsets.append(None)
+
+        def renumber(match):
+            return(b'%d 0 R' % numbers[int(match.group(1))])
+
+        for number in sorted(objects):
+            if number in (root, pages):
+                continue
+            content = objects[number]
+            # references are only rewritten ahead of any stream data
+            split = content.find(b'stream\n')
+            if split < 0:
+                split = len(content)
+            write(numbers[number],
+                  _PDF_REF.sub(renumber, content[:split]) + content[split:])
+
+        kids.extend(numbers[int(kid)]
+                    for kid in _PDF_REF.findall(old_kids.group(1)))
+
+    write(1, b'\n<< /Type /Catalog /Pages 2 0 R >>\n')
+    write(2, b'\n<< /Type /Pages /Kids [ %s ] /Count %d >>\n' %
+          (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)))
+
+    f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1))
+    f.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+    f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (len(offsets) + 1, position))
+
+
+def render_plates(datasets, output, color_map='YlGnBu', annot_strs=None,
+                  annot_fmt='.5s', distribution=True, processes=None,
+                  dpi=100):
+    """
+    Renders the plate plots of many plates to files
+
+    Each plate is drawn as by `plot_plate_vals` in a pool of worker
+    processes, on the Agg canvas rather than the pyplot backend, so that no
+    figure is left open in the calling process. The workers also write
+    each plate out, to a PNG file or to a single-page vector PDF that the
+    calling process only copies into the multi-page PDF.
+
+    Parameters
+    ----------
+    datasets: dict of 2D array of numeric, or list of 2D array of numeric
+        the data of each plate, keyed by plate name. Plates in a list are
+        named `plate_1`, `plate_2`, ...
+    output: str
+        a `.pdf` file, to which the plates are written one per page, or a
+        directory, in which a `<plate name>.png` file is written per plate
+    color_map: str
+        matplotlib color map name for heatmaps
+    annot_strs: dict or list of 2D array of str
+        values to write over the heatmap values of each plate, keyed or
+        ordered as `datasets`
+    annot_fmt: str
+        string formatting values for annotations
+    distribution: bool
+        whether to draw the histogram of values of each plate, which is the
+        slowest panel to draw
+    processes: int
+        the number of worker processes, defaults to the number of CPUs. With
+        a single process the plates are drawn in the calling process.
+    dpi: int
+        resolution of the PNG files
+
+    Returns
+    -------
+    list of str
+        the files written: the PDF file, or one PNG file per plate
+    """
+    if not isinstance(datasets, dict):
+        datasets = {'plate_%d' % (i + 1): d for i, d in enumerate(datasets)}
+    names = list(datasets)
+
+    if annot_strs is None:
+        annot_strs = [None] * len(names)
+    elif isinstance(annot_strs, dict):
+        annot_strs = [annot_strs.get(name) for name in names]
+    if len(annot_strs) != len(names):
+        raise ValueError('annot_strs holds %d plates, datasets %d' %
+                         (len(annot_strs), len(names)))
+
+    pdf = output.lower().endswith('.pdf')
+    if pdf:
+        fps = [None] * len(names)
+    else:
+        os.makedirs(output, exist_ok=True)
+        fps = [os.path.join(output, '%s.png' % name) for name in names]
+
+    kwargs = {'color_map': color_map, 'annot_fmt': annot_fmt,
+              'distribution': distribution}
+    jobs = [(fp, name, np.asarray(datasets[name]), annot, kwargs, dpi)
+            for fp, name, annot in zip(fps, names, annot_strs)]
+
+    render = _render_pdf if pdf else _render_png
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    with ExitStack() as stack:
+        if processes > 1 and len(jobs) > 1:
+            pool = stack.enter_context(ProcessPoolExecutor(
+                min(processes, len(jobs))))
+            results = pool.map(render, jobs)
+        else:
+            results = map(render, jobs)
+
+        if not pdf:
+            return(list(results))
+
+        # the workers write each page, which are only merged here
+        with open(output, 'wb') as f:
+            _merge_pdfs(results, f)
+
+    return([output])
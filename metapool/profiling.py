@@ -0,0 +1,232 @@
+"""
+Opt-in timing and memory instrumentation of the metapool pipeline steps
+
+The public functions of `metapool.metapool` are registered as stages with
+the `instrument` decorator. Nothing is recorded unless a `Profile` is
+active, in which case every call to a stage adds to its wall time, call
+count, input size and peak memory:
+
+    with Profile() as prof:
+        plate_df = read_plate_map_csv(fp)
+        with stage('volumes'):
+            ...
+    prof.to_csv('profile.csv')
+
+When no profile is active, an instrumented function costs a single extra
+function call and a global lookup.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+
+# names of the instrumented stages, in the order they were registered
+STAGES = []
+
+# the profile recording stage calls, if any
+_active = None
+
+
+def _input_size(args):
+    """Number of rows (or wells) in the first array-like argument"""
+    for arg in args:
+        if isinstance(arg, (str, bytes)):
+            continue
+        if hasattr(arg, 'shape'):
+            shape = arg.shape
+            if isinstance(arg, pd.DataFrame) or len(shape) < 2:
+                return(shape[0] if shape else 1)
+            # plates, and stacks of plates, are counted in wells
+            return(int(arg.size))
+        if isinstance(arg, (list, tuple)):
+            return(len(arg))
+
+    return(None)
+
+
+class Profile(object):
+    """
+    Records the calls to instrumented stages made while it is active
+
+    Parameters
+    ----------
+    memory: bool
+        whether to trace the peak memory allocated by each stage, which
+        slows down the profiled code
+
+    Attributes
+    ----------
+    records: dict of dict
+        the calls, wall time (in seconds), input rows and peak memory (in
+        bytes) of each stage, keyed by stage name. Rows are None for stages
+        whose input size is unknown.
+    """
+    columns = ['stage', 'calls', 'wall time', 'rows', 'peak memory']
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = {}
+        self._frames = []
+        self._previous = None
+        self._tracing = False
+
+    def __enter__(self):
+        global _active
+
+        self._previous = _active
+        _active = self
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+        return(self)
+
+    def __exit__(self, *exc):
+        global _active
+
+        _active = self._previous
+
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+        return(False)
+
+    def _enter_stage(self):
+        frame = {'start': time.perf_counter(), 'mem': 0, 'peak': 0}
+
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # the enclosing stage keeps the peak reached so far, because
+            # tracemalloc only tracks a single peak
+            if self._frames:
+                self._frames[-1]['peak'] = max(self._frames[-1]['peak'], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            frame['mem'] = frame['peak'] = current
+
+        self._frames.append(frame)
+
+    def _exit_stage(self, name, rows):
+        frame = self._frames.pop()
+        elapsed = time.perf_counter() - frame['start']
+
+        peak = 0
+        if self.memory and tracemalloc.is_tracing():
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            if self._frames:
+                self._frames[-1]['peak'] = max(self._frames[-1]['peak'],
+                                               peak)
+            peak -= frame['mem']
+
+        record = self.records.setdefault(name, {'calls': 0, 'wall time': 0.0,
+                                                'rows': None,
+                                                'peak memory': 0})
+        record['calls'] += 1
+        record['wall time'] += elapsed
+        if rows is not None:
+            record['rows'] = (record['rows'] or 0) + rows
+        record['peak memory'] = max(record['peak memory'], peak)
+
+    def to_frame(self):
+        """
+        Tabulates the recorded stages
+
+        Returns
+        -------
+        pandas DataFrame
+            one row per stage, in the order the stages were first called
+        """
+        return(pd.DataFrame([dict(stage=name, **record)
+                             for name, record in self.records.items()],
+                            columns=self.columns))
+
+    def to_csv(self, f):
+        """
+        Writes the recorded stages as a CSV table
+
+        Parameters
+        ----------
+        f: str or open filehandle
+            where to write the table
+        """
+        self.to_frame().to_csv(f, index=False)
+
+    def to_json(self, f):
+        """
+        Writes the recorded stages as a JSON list of records
+
+        Parameters
+        ----------
+        f: str or open filehandle
+            where to write the records
+        """
+        records = [dict(stage=name, **record)
+                   for name, record in self.records.items()]
+
+        if isinstance(f, str):
+            with open(f, 'w') as fh:
+                json.dump(records, fh, indent=1)
+        else:
+            json.dump(records, f, indent=1)
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Records a block of code as a stage of the active profile, if any
+
+    Parameters
+    ----------
+    name: str
+        the name of the stage
+    rows: int
+        the number of rows (or wells) the block processes
+    """
+    profile = _active
+    if profile is None:
+        yield
+        return
+
+    profile._enter_stage()
+    try:
+        yield
+    finally:
+        profile._exit_stage(name, rows)
+
+
+def instrument(func):
+    """
+    Registers a function as a stage recorded by active profiles
+
+    Parameters
+    ----------
+    func: callable
+        the function, whose name is used as the stage name
+
+    Returns
+    -------
+    callable
+        the instrumented function
+    """
+    name = func.__name__
+    STAGES.append(name)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _active
+        if profile is None:
+            return(func(*args, **kwargs))
+
+        profile._enter_stage()
+        try:
+            return(func(*args, **kwargs))
+        finally:
+            profile._exit_stage(name, _input_size(args))
+
+    return(wrapper)
@@ -0,0 +1,116 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from metapool.cache import read_excel_cached, clear_cache
+
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INDEX_LIST = os.path.join(REPO, 'test_data', 'iTru',
+                          'new_iTru_index_list_Dec2017.xlsx')
+PLATE_SPECS = os.path.join(REPO, 'test_data', 'iTru',
+                           'Plate_Specs_iTru5_96-1-4_iTru7_96-1-4_'
+                           'OnePerPlate_Dec_2017.xlsx')
+
+
+class CacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache)
+        shutil.rmtree(self.tmp)
+
+    def _entries(self):
+        return(sorted(os.listdir(self.cache)))
+
+    def test_round_trip(self):
+        for fp, kwargs in [(INDEX_LIST, {'sheet_name': 'iTru5'}),
+                           (INDEX_LIST, {'sheet_name': 'iTru7',
+                                         'index_col': 0}),
+                           (PLATE_SPECS, {})]:
+            exp = pd.read_excel(fp, **kwargs)
+
+            obs = read_excel_cached(fp, cache=self.cache, **kwargs)
+            pd.testing.assert_frame_equal(obs, exp)
+
+            # the second read comes from the cache
+            with patch('pandas.read_excel', side_effect=AssertionError):
+                obs = read_excel_cached(fp, cache=self.cache, **kwargs)
+            pd.testing.assert_frame_equal(obs, exp)
+
+        self.assertEqual(len(self._entries()), 3)
+
+    def test_read_only_hit(self):
+        exp = read_excel_cached(PLATE_SPECS, cache=self.cache)
+
+        # a hit whose access time cannot be updated is still a hit
+        with patch('os.utime', side_effect=PermissionError), \
+                patch('pandas.read_excel', side_effect=AssertionError):
+            obs = read_excel_cached(PLATE_SPECS, cache=self.cache)
+        pd.testing.assert_frame_equal(obs, exp)
+
+    def test_invalidation(self):
+        fp = os.path.join(self.tmp, 'index_list.xlsx')
+        shutil.copy(INDEX_LIST, fp)
+
+        read_excel_cached(fp, sheet_name='iTru5', cache=self.cache)
+        first = self._entries()
+
+        # a changed workbook is parsed again
+        shutil.copy(PLATE_SPECS, fp)
+        obs = read_excel_cached(fp, sheet_name=0, cache=self.cache)
+        pd.testing.assert_frame_equal(obs, pd.read_excel(PLATE_SPECS))
+        self.assertNotEqual(self._entries(), first)
+
+        # as is one that only has a new modification time
+        stat = os.stat(fp)
+        os.utime(fp, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        read_excel_cached(fp, sheet_name=0, cache=self.cache)
+        self.assertEqual(len(self._entries()), 3)
+
+    def test_eviction(self):
+        temp_list = os.path.join(REPO, 'test_data', 'iTru',
+                                 'temp_iTru_index_list.xlsx')
+
+        def entry_size(fp, **kwargs):
+            cache = tempfile.mkdtemp(dir=self.tmp)
+            read_excel_cached(fp, cache=cache, **kwargs)
+            entry, = os.listdir(cache)
+            return(os.path.getsize(os.path.join(cache, entry)))
+
+        read_excel_cached(INDEX_LIST, sheet_name='iTru7', cache=self.cache)
+        read_excel_cached(INDEX_LIST, sheet_name='iTru5', cache=self.cache)
+        read_excel_cached(PLATE_SPECS, cache=self.cache)
+        for age, entry in enumerate(self._entries()):
+            os.utime(os.path.join(self.cache, entry), (age, age))
+
+        # iTru7 is read last, so the other two entries are older
+        read_excel_cached(INDEX_LIST, sheet_name='iTru7', cache=self.cache)
+
+        cap = (entry_size(INDEX_LIST, sheet_name='iTru7') +
+               entry_size(temp_list, sheet_name='iTru5') +
+               entry_size(PLATE_SPECS))
+        read_excel_cached(temp_list, sheet_name='iTru5', cache=self.cache,
+                          max_cache_size=cap)
+        self.assertEqual(len(self._entries()), 3)
+
+        with patch('pandas.read_excel', side_effect=AssertionError):
+            read_excel_cached(INDEX_LIST, sheet_name='iTru7',
+                              cache=self.cache)
+            read_excel_cached(temp_list, sheet_name='iTru5',
+                              cache=self.cache)
+
+        clear_cache(self.cache)
+        self.assertEqual(self._entries(), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+from unittest import TestCase, main
+
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from metapool.cli import main as cli_main, read_plate_df
+from metapool.metapool import (compute_qpcr_concentration,
+                               compute_shotgun_pooling_values_eqvol,
+                               compute_shotgun_pooling_values_qpcr_minvol,
+                               format_pooling_echo_pick_list, make_2D_array)
+
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def _repo_file(*parts):
+    return(os.path.join(REPO, *parts))
+
+
+class CliTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.runs = [os.path.join(self.tmp, 'run%d' % i) for i in (1, 2)]
+        for run in self.runs:
+            os.mkdir(run)
+            shutil.copy(_repo_file('test_data', 'Plate_Maps',
+                                   'Finrisk 33-36_plate_map.tsv'),
+                        os.path.join(run, 'plate_map.tsv'))
+            shutil.copy(_repo_file('test_data', 'Quant', 'MiniPico',
+                                   'FinRisk_33-36_gDNA_quant.tsv'),
+                        os.path.join(run, 'pico.tsv'))
+            shutil.copy(_repo_file('test_data', 'Quant', 'qPCR',
+                                   '20170914_KHP_FinRisk_33-36_qPCR.txt'),
+                        os.path.join(run, 'qpcr.txt'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, *argv):
+        err = StringIO()
+        with redirect_stdout(StringIO()), redirect_stderr(err):
+            status = cli_main(list(argv))
+
+        return(status, err.getvalue())
+
+    def assertSameFile(self, obs_fp, *exp_parts):
+        with open(obs_fp) as obs, open(_repo_file(*exp_parts)) as exp:
+            self.assertEqual(obs.read(), exp.read())
+
+    def test_pipeline(self):
+        status, err = self._run('normalize', *self.runs)
+        self.assertEqual(status, 0)
+        self.assertIn('384 samples normalized', err)
+
+        status, _ = self._run('index', *self.runs, '--index-combos',
+                              _repo_file('test_output', 'iTru',
+                                         'temp_iTru_combos.csv'))
+        self.assertEqual(status, 0)
+
+        status, _ = self._run('pool', *self.runs, '--profile',
+                              'profile.csv')
+        self.assertEqual(status, 0)
+
+        status, _ = self._run('samplesheet', *self.runs,
+                              '--sequencer', 'HiSeq4000', '--lanes', '5',
+                              '--project-name', 'FinRisk',
+                              '--project-plate', 'FinRisk Plate 33-36',
+                              '--experiment', 'RKL_experiment',
+                              '--date', 'YYYY-MM-DD',
+                              '--pi', 'Knight=robknight@ucsd.edu',
+                              '--contact', 'Gail Ackermann=ackermag@ucsd.edu',
+                              '--contact', 'Greg Humphrey=ghsmu414@gmail.com',
+                              '--contact', 'Jeff Dereus=jdereus@ucsd.edu',
+                              '--contact', 'Jon Sanders=jonsan@gmail.com')
+        self.assertEqual(status, 0)
+
+        for run in self.runs:
+            self.assertSameFile(os.path.join(run, 'input_norm.txt'),
+                                'test_output', 'Input_Norm',
+                                'YYYY_MM_DD_FinRisk_33-36_inputnorm.txt')
+            self.assertSameFile(os.path.join(run, 'indices.txt'),
+                                'test_output', 'Indices',
+                                'YYYY_MM_DD_FinRisk_33-36_indices.txt')
+            self.assertSameFile(os.path.join(run, 'pooling.csv'),
+                                'test_output', 'Pooling',
+                                'YYYY_MM_DD_FinRisk_qPCR_normpool.csv')
+            self.assertSameFile(os.path.join(run, 'samplesheet.csv'),
+                                'test_output', 'SampleSheets',
+                                'YYYY_MM_DD_FinRisk_33-36_samplesheet.csv')
+
+        profile = pd.read_csv(os.path.join(self.runs[0], 'profile.csv'))
+        self.assertIn('write_pooling_echo_pick_list', set(profile['stage']))
+        self.assertEqual(profile['stage'].iloc[-1], 'pool')
+
+        plate_df = read_plate_df(self.runs[0])
+        self.assertEqual(len(plate_df), 384)
+        self.assertEqual(plate_df['Well'].dtype, plate_df['Sample'].dtype)
+
+    def test_order_transfers(self):
+        status, err = self._run('normalize', self.runs[0],
+                                '--order-transfers')
+        self.assertEqual(status, 0)
+        self.assertRegex(err, r'stage travel \d+ -> \d+ wells')
+
+        with open(os.path.join(self.runs[0], 'input_norm.txt')) as f:
+            obs = f.read().split('\n')
+        with open(_repo_file('test_output', 'Input_Norm',
+                             'YYYY_MM_DD_FinRisk_33-36_inputnorm.txt')) as f:
+            exp = f.read().split('\n')
+
+        # the same transfers, with the header first
+        self.assertEqual(obs[0], exp[0])
+        self.assertEqual(sorted(obs), sorted(exp))
+        self.assertNotEqual(obs, exp)
+
+    def test_order_pooling_transfers(self):
+        self._run('normalize', self.runs[0])
+        self._run('index', self.runs[0], '--index-combos',
+                  _repo_file('test_output', 'iTru', 'temp_iTru_combos.csv'))
+
+        # a small well volume spreads the pool over destination wells
+        # named 'A1', 'B0', 'C0', ...
+        fp = os.path.join(self.runs[0], 'pooling.csv')
+        status, _ = self._run('pool', self.runs[0], '--max-vol-per-well',
+                              '1000')
+        self.assertEqual(status, 0)
+        with open(fp) as f:
+            exp = f.read().split('\n')
+        self.assertIn('B0', {line.split(',')[-1] for line in exp})
+
+        status, err = self._run('pool', self.runs[0], '--max-vol-per-well',
+                                '1000', '--order-transfers')
+        self.assertEqual(status, 0)
+        self.assertRegex(err, r'stage travel \d+ -> \d+ wells')
+        with open(fp) as f:
+            obs = f.read().split('\n')
+
+        self.assertEqual(obs[0], exp[0])
+        self.assertEqual(sorted(obs), sorted(exp))
+
+    def test_pool_partial_plate(self):
+        # half of the samples of the plate
+        fp = os.path.join(self.runs[0], 'plate_map.tsv')
+        plate_map = pd.read_csv(fp, sep='\t', dtype=str)
+        plate_map.iloc[::2].to_csv(fp, sep='\t', index=False)
+
+        self._run('normalize', self.runs[0])
+        self._run('index', self.runs[0], '--index-combos',
+                  _repo_file('test_output', 'iTru', 'temp_iTru_combos.csv'))
+
+        # the cells of the qPCR normalization notebook
+        plate_df = read_plate_df(self.runs[0])
+        self.assertEqual(len(plate_df), 192)
+        qpcr_df = pd.read_csv(os.path.join(self.runs[0], 'qpcr.txt'),
+                              sep='\t', skiprows=1, header=0)
+        plate_df = pd.merge(plate_df, qpcr_df[['Pos', 'Cp']],
+                            left_on='Library Well', right_on='Pos')
+        plate_df['Library Concentration'] = \
+            compute_qpcr_concentration(plate_df['Cp'])
+        concs = np.nan_to_num(plate_df['Library Concentration'])
+
+        for method, vols in [
+                ('eqvol', compute_shotgun_pooling_values_eqvol(
+                    concs, total_vol=100)),
+                ('minvol', compute_shotgun_pooling_values_qpcr_minvol(
+                    concs, floor_vol=80, floor_conc=40, total_nmol=.008))]:
+            plate_df['Pooled Volume'] = vols
+            exp = format_pooling_echo_pick_list(
+                make_2D_array(plate_df, data_col='Pooled Volume',
+                              well_col='Library Well').astype(float),
+                max_vol_per_well=30000)
+
+            status, _ = self._run('pool', self.runs[0], '--method', method)
+            self.assertEqual(status, 0)
+            with open(os.path.join(self.runs[0], 'pooling.csv')) as f:
+                self.assertEqual(f.read(), exp)
+
+    def test_failed_run(self):
+        missing = os.path.join(self.tmp, 'missing')
+
+        status, err = self._run('normalize', self.runs[0], missing)
+
+        # the other runs are still processed
+        self.assertEqual(status, 1)
+        self.assertIn('%s: failed' % missing, err)
+        self.assertTrue(os.path.exists(os.path.join(self.runs[0],
+                                                    'input_norm.txt')))
+
+
+if __name__ == '__main__':
+    main()
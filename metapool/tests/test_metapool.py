@@ -1,22 +1,34 @@
 from unittest import TestCase, main
 
+import json
 import os
+import shutil
+import tempfile
 import pandas as pd
 import numpy as np
 import numpy.testing as npt
 from io import StringIO
 
 from metapool.metapool import (read_plate_map_csv, read_pico_csv,
+            read_pico_csvs, read_quant_plate,
             calculate_norm_vol,
-            format_dna_norm_picklist, assign_index, format_index_picklist,
+            format_dna_norm_picklist, write_dna_norm_picklist, IndexCombos,
+            assign_index, format_index_picklist, encode_sequences,
+            hamming_distances, check_index_distances,
+            write_index_picklist,
             compute_qpcr_concentration, compute_shotgun_pooling_values_eqvol,
             compute_shotgun_pooling_values_qpcr,
-            compute_shotgun_pooling_values_qpcr_minvol, estimate_pool_conc_vol,
-            format_pooling_echo_pick_list, plot_plate_vals, make_2D_array,
+            compute_shotgun_pooling_values_qpcr_minvol,
+            compute_shotgun_repooling_values, estimate_pool_conc_vol,
+            format_pooling_echo_pick_list, write_pooling_echo_pick_list,
+            order_echo_pick_list, plot_plate_vals, make_2D_array,
             combine_dfs, parse_dna_conc_csv, add_dna_conc,
             compute_pico_concentration, ss_temp, format_sheet_comments,
-            format_sample_sheet, bcl_scrub_name, rc, sequencer_i5_index,
-            format_sample_data, reformat_interleaved_to_columns)
+            format_sample_sheet, write_sample_sheet, parse_sample_sheet,
+            read_sample_sheets, bcl_scrub_name, rc, rc_array, sequencer_i5_index,
+            format_sample_data, write_sample_data, find_index_collisions,
+            read_stats_json, read_multiqc_counts,
+            reformat_interleaved_to_columns)
 
 
 class Tests(TestCase):
@@ -142,6 +154,110 @@ class Tests(TestCase):
 
         pd.testing.assert_frame_equal(obs_pico_df, exp_pico_df, check_like=True)
 
+    def test_read_pico_csv_no_footer(self):
+        pico_csv = ('Results\n'
+                    '\n'
+                    'Well ID\tWell\t[Blanked-RFU]\t[Concentration]\n'
+                    'SPL1\tA1\t5243.000\t3.432\n'
+                    'SPL2\tA2\t4949.000\t<0.000\n')
+
+        exp_pico_df = pd.DataFrame({'Well': ['A1','A2'],
+                                    'Sample DNA Concentration':
+                                     [3.432, np.nan]})
+
+        obs_pico_df = read_pico_csv(StringIO(pico_csv))
+
+        pd.testing.assert_frame_equal(obs_pico_df, exp_pico_df, check_like=True)
+
+    def test_read_pico_csvs(self):
+        pico_csv = ('Results\n'
+                    '\n'
+                    'Well ID\tWell\t[Blanked-RFU]\t[Concentration]\n'
+                    'SPL1\tA1\t5243.000\t3.432\n'
+                    'SPL2\tA2\t4949.000\t3.239\n'
+                    '\n'
+                    'Curve2 Fitting Results\n'
+                    '\n'
+                    'Curve Name\tCurve Formula\tA\tB\tR2\tFit F Prob\n'
+                    'Curve2\tY=A*X+B\t1.53E+003\t0\t0.995\t?????\n')
+
+        exp_pico_df = pd.DataFrame({'Plate': pd.Categorical(
+                                        ['plate1', 'plate1',
+                                         'plate2', 'plate2']),
+                                    'Well': ['A1','A2','A1','A2'],
+                                    'Sample DNA Concentration':
+                                     [3.432, 3.239, 3.432, 3.239]})
+
+        obs_pico_df = read_pico_csvs([StringIO(pico_csv), StringIO(pico_csv)],
+                                     plate_names=['plate1', 'plate2'])
+
+        pd.testing.assert_frame_equal(obs_pico_df, exp_pico_df, check_like=True)
+
+        # filehandles without a file name are named by position
+        obs_pico_df = read_pico_csvs([StringIO(pico_csv), StringIO(pico_csv)])
+        self.assertEqual(obs_pico_df['Plate'].tolist(),
+                         ['Plate1', 'Plate1', 'Plate2', 'Plate2'])
+
+        with self.assertRaises(ValueError):
+            read_pico_csvs([StringIO(pico_csv)], plate_names=['a', 'b'])
+
+    def test_read_quant_plate(self):
+        quant = ('Plate reader export\n'
+                 'Results\t\t\t\n'
+                 '\t\t\t\n'
+                 'Well ID\tWell\t[Blanked-RFU]\t[Concentration]\n'
+                 'SPL1\tA1\t5243\t3.432\n'
+                 'SPL2\tC1\t4949\t<0.000\n'
+                 'SPL3\tH12\t15302\t10.016\n'
+                 '\t\t\t\n'
+                 'Curve Name\tCurve Formula\tA\tB\n'
+                 'Curve2\tY=A*X+B\t1.53E+03\t0\n')
+
+        exp = np.full(96, np.nan)
+        exp[[0, 95]] = [3.432, 10.016]
+
+        obs = read_quant_plate(StringIO(quant))
+        npt.assert_array_equal(obs, exp)
+
+        obs = read_quant_plate(StringIO(quant), plate_size=384)
+        self.assertEqual(obs.shape, (384,))
+        # H12 is the 8th row and 12th column of the larger plate
+        self.assertEqual(obs[7 * 24 + 11], 10.016)
+
+        with self.assertRaisesRegex(ValueError, 'No header'):
+            read_quant_plate(StringIO(quant), conc_col='Conc')
+
+        # workbooks, with the header further down
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        for _ in range(4):
+            ws.append(['Results'])
+        ws.append([None, 'Well ID', 'Well', '[Concentration]'])
+        ws.append([None, 'SPL1', 'A1', 3.432])
+        ws.append([None, 'SPL2', 'C1', '<0.000'])
+        ws.append([None, 'SPL3', 'P24', 10.016])
+        ws.append([])
+        ws.append([None, 'Curve2', 'Y=A*X+B', 1530])
+
+        tmp = tempfile.mkdtemp()
+        try:
+            fp = os.path.join(tmp, 'quant.xlsx')
+            wb.save(fp)
+
+            exp = np.full(384, np.nan)
+            exp[[0, 383]] = [3.432, 10.016]
+
+            npt.assert_array_equal(read_quant_plate(fp), exp)
+
+            obs = parse_dna_conc_csv(fp)
+            self.assertListEqual(list(obs.columns), ['Well', 'pico_conc'])
+            self.assertEqual(obs['Well'][383], 'P24')
+            npt.assert_array_equal(obs['pico_conc'], exp)
+        finally:
+            shutil.rmtree(tmp)
+
     def test_calculate_norm_vol(self):
         dna_concs = np.array([[2, 7.89],
                               [np.nan, .0]])
@@ -259,6 +375,145 @@ class Tests(TestCase):
 
         self.assertEqual(exp_picklist, obs_picklist)
 
+    def test_write_dna_norm_picklist(self):
+        dna_vols = np.array([[2500., 632.5],
+                              [3500., 3500.]])
+
+        water_vols = 3500 - dna_vols
+
+        wells = np.array([['A1', 'A2'],
+                          ['B1', 'B2']])
+
+        sample_names =  np.array([['sam1', 'sam2'],
+                          ['blank1', 'sam3']])
+
+        dna_concs = np.array([[2, 7.89],
+                              [np.nan, .0]])
+
+        exp_picklist = format_dna_norm_picklist(dna_vols, water_vols, wells,
+                                                sample_names = sample_names,
+                                                dna_concs = dna_concs)
+
+        obs_f = StringIO()
+        write_dna_norm_picklist(obs_f, dna_vols, water_vols, wells,
+                                sample_names = sample_names,
+                                dna_concs = dna_concs)
+
+        self.assertEqual(exp_picklist, obs_f.getvalue())
+
+        # header only if there is nothing to transfer
+        obs_f = StringIO()
+        write_dna_norm_picklist(obs_f, np.array([]), np.array([]),
+                                np.array([]))
+
+        self.assertEqual('Sample\tSource Plate Name\tSource Plate Type\t'
+                         'Source Well\tConcentration\tTransfer Volume\t'
+                         'Destination Plate Name\tDestination Well',
+                         obs_f.getvalue())
+
+    def test_index_combos(self):
+        i5 = pd.DataFrame({'Primer Name': ['iTru5_01_A', 'iTru5_01_B'],
+                           'Primer Index Sequence': ['ACCGACAA', 'AGTGGCAA'],
+                           'Row': ['A', 'B'],
+                           'Col': [1, 1]})
+        i7 = pd.DataFrame({'Primer Name': ['iTru7_101_01', 'iTru7_101_02',
+                                           'iTru7_101_03'],
+                           'Primer Index Sequence': ['ACGTTACC', 'CTGTGTTG',
+                                                     'TGAGGTGT'],
+                           'Row': ['A', 'A', 'A'],
+                           'Col': [1, 2, 3]})
+
+        combos = IndexCombos(i5, i7)
+
+        self.assertEqual(len(combos), 6)
+
+        exp_df = pd.DataFrame(
+            {'index combo': [0, 1, 2, 3, 4, 5],
+             'index combo seq': ['ACCGACAAACGTTACC', 'AGTGGCAACTGTGTTG',
+                                 'ACCGACAACTGTGTTG', 'AGTGGCAATGAGGTGT',
+                                 'ACCGACAATGAGGTGT', 'AGTGGCAAACGTTACC'],
+             'i5 name': ['iTru5_01_A', 'iTru5_01_B'] * 3,
+             'i5 sequence': ['ACCGACAA', 'AGTGGCAA'] * 3,
+             'i5 well': ['A1', 'B1'] * 3,
+             'i5 plate': ['iTru5_plate'] * 6,
+             'i7 name': ['iTru7_101_01', 'iTru7_101_02', 'iTru7_101_02',
+                         'iTru7_101_03', 'iTru7_101_03', 'iTru7_101_01'],
+             'i7 sequence': ['ACGTTACC', 'CTGTGTTG', 'CTGTGTTG',
+                             'TGAGGTGT', 'TGAGGTGT', 'ACGTTACC'],
+             'i7 well': ['A1', 'A2', 'A2', 'A3', 'A3', 'A1'],
+             'i7 plate': ['iTru7_plate'] * 6})
+
+        obs_df = combos.to_frame()
+
+        pd.testing.assert_frame_equal(obs_df, exp_df, check_dtype=False)
+
+        # every combination is used once
+        self.assertEqual(len(set(obs_df['index combo seq'])), 6)
+
+        # windows only build the rows asked for
+        obs_df = assign_index(2, combos, start_idx=3)
+
+        pd.testing.assert_frame_equal(obs_df, exp_df.iloc[3:5],
+                                      check_dtype=False)
+        pd.testing.assert_frame_equal(obs_df,
+                                      assign_index(2, exp_df, start_idx=3),
+                                      check_dtype=False)
+
+    def test_index_combos_reproduce_combo_file(self):
+        repo = os.path.join(os.path.dirname(__file__), '..', '..')
+        index_fp = os.path.join(repo, 'test_data', 'iTru',
+                                'temp_iTru_index_list.xlsx')
+        combos = IndexCombos(pd.read_excel(index_fp, sheet_name='iTru5'),
+                             pd.read_excel(index_fp, sheet_name='iTru7'))
+
+        exp_df = pd.read_csv(os.path.join(repo, 'test_output', 'iTru',
+                                          'temp_iTru_combos.csv'))
+        obs_df = combos.to_frame()
+
+        self.assertEqual(len(combos), 2304)
+        self.assertEqual(list(obs_df.columns), list(exp_df.columns))
+        for i in range(len(exp_df)):
+            self.assertEqual(obs_df.iloc[i].tolist(), exp_df.iloc[i].tolist(),
+                             'index combo %d differs' % i)
+
+    def test_hamming_distances(self):
+        codes = encode_sequences(['ACGTACGT', 'ACGTACGA', 'TTTTTTTT',
+                                  'acgtacgt'])
+
+        npt.assert_array_equal(hamming_distances(codes),
+                               [[0, 1, 6, 0],
+                                [1, 0, 7, 1],
+                                [6, 7, 0, 6],
+                                [0, 1, 6, 0]])
+
+        with self.assertRaisesRegex(ValueError, 'same length'):
+            encode_sequences(['ACGT', 'ACG'])
+        with self.assertRaisesRegex(ValueError, 'ACNT'):
+            encode_sequences(['ACGT', 'ACNT'])
+
+    def test_check_index_distances(self):
+        indices = pd.DataFrame(
+            {'index combo': [10, 11, 12, 13],
+             'i5 sequence': ['ACCGACAA', 'ACCGACTT', 'ACCGACAA', 'TTTTTTTT'],
+             'i7 sequence': ['ACGTTACC', 'ACGTTAGG', 'TGAGGTGT', 'ACGTTACC']})
+
+        exp = pd.DataFrame({'index combo 1': [10],
+                            'index combo 2': [11],
+                            'i5 distance': [2],
+                            'i7 distance': [2]})
+
+        obs = check_index_distances(indices, barcode_mismatches=1)
+        pd.testing.assert_frame_equal(obs, exp, check_dtype=False)
+
+        obs = check_index_distances(indices, barcode_mismatches=0)
+        self.assertEqual(len(obs), 0)
+
+        with self.assertRaisesRegex(ValueError, '1 pair'):
+            assign_index(4, indices, barcode_mismatches=1)
+
+        pd.testing.assert_frame_equal(
+            assign_index(4, indices, barcode_mismatches=0), indices)
+
     def test_format_index_picklist(self):
         exp_picklist = \
             'Sample\tSource Plate Name\tSource Plate Type\tSource Well\tTransfer Volume\tIndex Name\t' + \
@@ -308,6 +563,20 @@ class Tests(TestCase):
 
         self.assertEqual(exp_picklist, obs_picklist)
 
+        obs_f = StringIO()
+        write_index_picklist(obs_f, pd.Series(sample_names),
+                             pd.Series(sample_wells), indices)
+
+        self.assertEqual(exp_picklist, obs_f.getvalue())
+
+        # every sample needs its own index combination, and every well
+        with self.assertRaisesRegex(ValueError, 'index list \\(3\\)'):
+            format_index_picklist(sample_names, sample_wells,
+                                  indices.iloc[:3])
+        with self.assertRaisesRegex(ValueError, 'sample_wells \\(3\\)'):
+            write_index_picklist(StringIO(), sample_names, sample_wells[:3],
+                                 indices)
+
     def test_compute_qpcr_concentration(self):
         obs = compute_qpcr_concentration(self.cp_vals)
         exp = self.qpcr_conc
@@ -354,6 +623,48 @@ class Tests(TestCase):
 
         npt.assert_allclose(exp_vols, obs_vols)
 
+    def test_compute_shotgun_repooling_values(self):
+        read_counts = np.array([[400000, 100000, 0],
+                                [200000, 0, 50000]])
+        sample_vols = np.array([[100, 100, 100],
+                                [50, 0, 0]])
+        sample_concs = np.array([[10, 5, 0],
+                                 [10, 10, np.nan]])
+
+        # the unpooled sample in B2 yields the median 400 reads per nM per nL
+        # of its pool, and nothing is known of A3 and B3
+        exp_vols = np.array([[0, 300, np.nan],
+                             [50, 100, np.nan]])
+
+        obs_vols = compute_shotgun_repooling_values(read_counts, sample_vols,
+                                                    sample_concs)
+
+        npt.assert_allclose(exp_vols, obs_vols)
+
+        obs_vols = compute_shotgun_repooling_values(
+            read_counts, sample_vols, sample_concs, max_vol=80,
+            blanks=np.array([[False, False, True],
+                             [False, False, False]]))
+
+        npt.assert_allclose(np.array([[0, np.nan, 0],
+                                      [50, np.nan, np.nan]]), obs_vols)
+
+        # several pools at once, with a target per pool
+        stack = compute_shotgun_repooling_values(
+            np.stack([read_counts, read_counts]),
+            np.stack([sample_vols, sample_vols]),
+            np.stack([sample_concs, sample_concs * 2]),
+            target_reads=[400000, 100000])
+
+        npt.assert_allclose(stack[0], exp_vols)
+        npt.assert_allclose(stack[1], np.array([[0, 0, np.nan],
+                                                [0, 25, np.nan]]))
+
+        # the volumes can be pooled directly
+        picklist = format_pooling_echo_pick_list(exp_vols)
+        self.assertEqual(picklist.split('\n')[2],
+                         '1,384LDV_AQ_B2_HT,A2,,300.00,NormalizedDNA,A1')
+
     def test_estimate_pool_conc_vol(self):
         obs_sample_vols = compute_shotgun_pooling_values_eqvol(
                                         self.qpcr_conc, total_vol=60.0)
@@ -368,6 +679,53 @@ class Tests(TestCase):
         npt.assert_almost_equal(obs_pool_vol, exp_pool_vol)
 
 
+    def test_plate_stack_computations(self):
+        # each plate of a stack is computed as if it were passed on its own
+        plate1 = self.qpcr_conc
+        plate2 = self.qpcr_conc[::-1] * 2
+        stack = np.stack([plate1, plate2])
+
+        obs = calculate_norm_vol(stack, ng=[5, 10])
+        npt.assert_allclose(obs[0], calculate_norm_vol(plate1, ng=5))
+        npt.assert_allclose(obs[1], calculate_norm_vol(plate2, ng=10))
+
+        obs = compute_qpcr_concentration(np.stack([self.cp_vals,
+                                                   self.cp_vals]),
+                                         b=[12.059, 13], dil_factor=25000)
+        npt.assert_allclose(obs[0], self.qpcr_conc)
+        npt.assert_allclose(obs[1],
+                            compute_qpcr_concentration(self.cp_vals, b=13))
+
+        obs = compute_shotgun_pooling_values_eqvol(stack, total_vol=[60, 30])
+        npt.assert_allclose(obs[0], np.zeros([3, 4]) + 60.0/12*1000)
+        npt.assert_allclose(obs[1], np.zeros([3, 4]) + 30.0/12*1000)
+
+        obs = compute_shotgun_pooling_values_qpcr(stack, min_conc=10,
+                                                  floor_conc=[50, 100],
+                                                  total_nmol=[.01, .02])
+        npt.assert_allclose(obs[0], compute_shotgun_pooling_values_qpcr(
+            plate1, min_conc=10, floor_conc=50, total_nmol=.01))
+        npt.assert_allclose(obs[1], compute_shotgun_pooling_values_qpcr(
+            plate2, min_conc=10, floor_conc=100, total_nmol=.02))
+
+        obs = compute_shotgun_pooling_values_qpcr_minvol(
+            stack, floor_vol=[100, 50], floor_conc=40, total_nmol=[.01, .02])
+        npt.assert_allclose(obs[0], compute_shotgun_pooling_values_qpcr_minvol(
+            plate1, floor_vol=100, floor_conc=40, total_nmol=.01))
+        npt.assert_allclose(obs[1], compute_shotgun_pooling_values_qpcr_minvol(
+            plate2, floor_vol=50, floor_conc=40, total_nmol=.02))
+
+        vols = compute_shotgun_pooling_values_qpcr(stack)
+        obs_pool_conc, obs_pool_vol = estimate_pool_conc_vol(vols, stack)
+        exp1 = estimate_pool_conc_vol(vols[0], plate1)
+        exp2 = estimate_pool_conc_vol(vols[1], plate2)
+        npt.assert_allclose(obs_pool_conc, [exp1[0], exp2[0]])
+        npt.assert_allclose(obs_pool_vol, [exp1[1], exp2[1]])
+
+        # one value per plate is required
+        with self.assertRaises(ValueError):
+            compute_shotgun_pooling_values_qpcr(stack, total_nmol=[.01])
+
     def test_format_pooling_echo_pick_list(self):
         vol_sample = np.array([[10.00, 10.00, 5.00, 5.00, 10.00, 10.00]])
 
@@ -415,6 +773,151 @@ class Tests(TestCase):
       
 
 
+    def test_write_pooling_echo_pick_list(self):
+        # a volume over the maximum gets a well of its own, including the
+        # very first one
+        vol_sample = np.array([[30.00, 10.00, 10.00],
+                               [30.00, 5.00, 0.00]])
+
+        header = ['Source Plate Name,Source Plate Type,Source Well,'
+                'Concentration,Transfer Volume,Destination Plate Name,'
+                'Destination Well']
+
+        exp_values = ['1,384LDV_AQ_B2_HT,A1,,30.00,NormalizedDNA,A2',
+                      '1,384LDV_AQ_B2_HT,A2,,10.00,NormalizedDNA,A3',
+                      '1,384LDV_AQ_B2_HT,A3,,10.00,NormalizedDNA,A3',
+                      '1,384LDV_AQ_B2_HT,B1,,30.00,NormalizedDNA,A4',
+                      '1,384LDV_AQ_B2_HT,B2,,5.00,NormalizedDNA,A5',
+                      '1,384LDV_AQ_B2_HT,B3,,0.00,NormalizedDNA,A5']
+
+        exp_str = '\n'.join(header + exp_values)
+
+        obs_f = StringIO()
+        write_pooling_echo_pick_list(obs_f, vol_sample,
+                                     max_vol_per_well=26,
+                                     dest_plate_shape=[16,24])
+
+        self.assertEqual(exp_str, obs_f.getvalue())
+        self.assertEqual(exp_str,
+                         format_pooling_echo_pick_list(vol_sample,
+                                                       max_vol_per_well=26))
+
+    def test_pooling_echo_pick_list_ffd(self):
+        # filling in order takes three wells, packing takes two
+        vol_sample = np.array([[30.00, 30.00, 20.00],
+                               [20.00, 0.00, 0.00]])
+
+        header = ['Source Plate Name,Source Plate Type,Source Well,'
+                  'Concentration,Transfer Volume,Destination Plate Name,'
+                  'Destination Well']
+
+        exp_values = ['1,384LDV_AQ_B2_HT,A1,,30.00,NormalizedDNA,A1',
+                      '1,384LDV_AQ_B2_HT,A2,,30.00,NormalizedDNA,B1',
+                      '1,384LDV_AQ_B2_HT,A3,,20.00,NormalizedDNA,A1',
+                      '1,384LDV_AQ_B2_HT,B1,,20.00,NormalizedDNA,B1',
+                      '1,384LDV_AQ_B2_HT,B2,,0.00,NormalizedDNA,A1',
+                      '1,384LDV_AQ_B2_HT,B3,,0.00,NormalizedDNA,A1']
+
+        obs = format_pooling_echo_pick_list(vol_sample, max_vol_per_well=50,
+                                            dest_plate_shape=[2, 1],
+                                            packing='ffd')
+        self.assertEqual('\n'.join(header + exp_values), obs)
+
+        sequential = format_pooling_echo_pick_list(vol_sample,
+                                                   max_vol_per_well=50)
+        self.assertEqual(len({line.split(',')[-1] for line in
+                              sequential.split('\n')[1:]}), 3)
+
+        # no well is filled over the maximum, and few wells are used
+        vols = np.random.RandomState(0).uniform(0, 3000, (32, 48))
+        obs = pd.read_csv(StringIO(format_pooling_echo_pick_list(
+            vols, max_vol_per_well=30000, packing='ffd')))
+        totals = obs.groupby('Destination Well')['Transfer Volume'].sum()
+        self.assertLessEqual(totals.max(), 30000)
+        self.assertEqual(len(totals), np.ceil(vols.sum() / 30000))
+
+        with self.assertRaisesRegex(ValueError, 'needs 2 destination wells'):
+            format_pooling_echo_pick_list(vol_sample, max_vol_per_well=50,
+                                          dest_plate_shape=[1, 1],
+                                          packing='ffd')
+        with self.assertRaisesRegex(ValueError, 'packing must be'):
+            format_pooling_echo_pick_list(vol_sample, packing='best')
+
+    def test_order_echo_pick_list(self):
+        header = ('Sample\tSource Plate Name\tSource Well\t'
+                  'Destination Plate Name\tDestination Well')
+        rows = ['a\tSample\tA1\tNormalizedDNA\tA1',
+                'b\tWater\tA1\tNormalizedDNA\tA1',
+                'c\tSample\tA2\tNormalizedDNA\tA2',
+                'd\tWater\tA2\tNormalizedDNA\tA2',
+                'e\tSample\tB1\tNormalizedDNA\tB1',
+                'f\tSample\tB2\tNormalizedDNA\tB2',
+                'g\tSample\tB2\tOtherPlate\tA1']
+        picklist = '\n'.join([header] + rows)
+
+        obs, moves = order_echo_pick_list(picklist)
+
+        # grouped by source plate, then destination plate, with the source
+        # wells in a serpentine
+        exp = '\n'.join([header] + [rows[i] for i in [0, 2, 5, 4, 6, 1, 3]])
+        self.assertEqual(obs, exp)
+
+        exp_moves = pd.DataFrame({'plate swaps': [5, 2],
+                                  'source travel': [1, 4],
+                                  'destination travel': [1, 4],
+                                  'stage travel': [1, 4]},
+                                 index=['before', 'after'])
+        pd.testing.assert_frame_equal(moves, exp_moves)
+
+        # ordering an ordered pick list changes nothing
+        again, moves = order_echo_pick_list(obs)
+        self.assertEqual(again, obs)
+        self.assertEqual(moves.loc['before'].tolist(),
+                         moves.loc['after'].tolist())
+
+        # blank lines are dropped rather than shifting the rows
+        obs, _ = order_echo_pick_list('\n'.join([header, ''] + rows + ['']))
+        self.assertEqual(obs, exp)
+
+        # quoted fields, even spanning lines, are kept whole
+        quoted = ['"a\nb"\tSample\tB1\tNormalizedDNA\tB1',
+                  '"c\td"\tSample\tA1\tNormalizedDNA\tA1']
+        obs, _ = order_echo_pick_list('\n'.join([header] + quoted))
+        self.assertEqual(obs, '\n'.join([header] + quoted[::-1]))
+
+        with self.assertRaisesRegex(ValueError, 'no Destination Well'):
+            order_echo_pick_list('Source Plate Name\tSource Well\t'
+                                 'Destination Plate Name\n1\tA1\t2')
+
+        # the rows of a pooling pick list are kept as written
+        vols = np.arange(1, 7, dtype=float).reshape(2, 3)
+        picklist = format_pooling_echo_pick_list(vols, max_vol_per_well=8)
+        obs, moves = order_echo_pick_list(picklist)
+
+        lines = picklist.split('\n')
+        self.assertEqual(obs.split('\n'), [lines[i] for i in
+                                           [0, 1, 2, 3, 6, 5, 4]])
+        self.assertLess(moves['source travel']['after'],
+                        moves['source travel']['before'])
+
+        # sequential pooling names destination wells that are not on a
+        # plate, such as 'B0', which are only counted when they change
+        picklist = format_pooling_echo_pick_list(np.full((16, 24), 5000.),
+                                                 max_vol_per_well=30000)
+        self.assertIn(',B0', picklist)
+        obs, moves = order_echo_pick_list(picklist)
+
+        self.assertEqual(sorted(obs.split('\n')),
+                         sorted(picklist.split('\n')))
+        self.assertEqual(moves['destination travel'].tolist(), [63, 63])
+        self.assertLess(moves['source travel']['after'],
+                        moves['source travel']['before'])
+
+        # an empty pick list has nothing to order
+        obs, moves = order_echo_pick_list(header)
+        self.assertEqual(obs, header)
+        self.assertEqual(moves['plate swaps'].tolist(), [0, 0])
+
     def test_make_2D_array(self):
         example_qpcr_df = pd.DataFrame({'Cp': [12, 0, 5, np.nan],
                                         'Pos': ['A1','A2','A3','A4']})
@@ -433,7 +936,28 @@ class Tests(TestCase):
 
         np.testing.assert_allclose(make_2D_array(example2_qpcr_df, rows=2, cols=4).astype(float), exp2_cp_array)
 
-    def combine_dfs(self):
+        # numeric data come back as float, with NaN in wells without values
+        example3_qpcr_df = pd.DataFrame({'Cp': [12, 0, 5],
+                                         'Pos': ['A1','B2','a3']})
+        exp3_cp_array = np.array([[12.0,np.nan,5.0],
+                                  [np.nan,0.0,np.nan]])
+
+        obs3_cp_array = make_2D_array(example3_qpcr_df, rows=2, cols=3)
+
+        self.assertEqual(obs3_cp_array.dtype, np.float64)
+        np.testing.assert_allclose(obs3_cp_array, exp3_cp_array)
+
+        # other data are kept as is
+        example4_qpcr_df = pd.DataFrame({'Sample': ['sam1', 'sam2'],
+                                         'Pos': ['A1','B2']})
+        exp4_array = np.array([['sam1', None], [None, 'sam2']], dtype=object)
+
+        np.testing.assert_array_equal(make_2D_array(example4_qpcr_df,
+                                                    data_col='Sample',
+                                                    rows=2, cols=2),
+                                      exp4_array)
+
+    def test_combine_dfs(self):
         exp_df_f = '''Sample\tWell\tPlate\tCounter\tPrimer_i5\tSource_Well_i5\tIndex_i5\tPrimer_i7\tSource_Well_i7\tIndex_i7\tDNA_concentration\tTransfer_Volume\tCp
         8_29_13_rk_rh\tA1\tABTX_35\t1841.0\tiTru5_01_G\tG1\tGTTCCATG\tiTru7_110_05\tA23\tCGCTTAAC\t12.751753\t80.0\t20.55
         8_29_13_rk_lh\tC1\tABTX_35\t1842.0\tiTru5_01_H\tH1\tTAGCTGAG\tiTru7_110_06\tB23\tCACCACTA\t17.582063\t57.5\t9.15'''
@@ -454,19 +978,52 @@ class Tests(TestCase):
         0\tTRUE\t255\tA1\tSample 1\t20.55\tNaN\t0\tNaN
         1\tTRUE\t255\tC1\tSample 2\t9.15\tNaN\t0\tNaN'''
 
-        exp_out_f = '''Well\tCp\tDNA Concentration\tDNA Transfer Volume\tSample Name\tPlate\tCounter\tPrimer i7\tSource Well i7\tIndex i7\tPrimer i5\tSource Well i5\tIndex i5
-        A1\t20.55\t12.751753\t80.0\t8_29_13_rk_rh\tABTX_35\t1841.0\tiTru7_110_05\tA23\tCGCTTAAC\tiTru5_01_G\tG1\tGTTCCATG
-        C1\t9.15\t17.582063\t57.5\t8_29_13_rk_lh\tABTX_35\t1842.0\tiTru7_110_06\tB23\tCACCACTA\tiTru5_01_H\tH1\tTAGCTGAG'''
+        exp_out_f = '''Well\tCp\tDNA Concentration\tDNA Transfer Volume\tSample Name\tPlate\tCounter\tSource Well i7\tIndex i7\tPrimer i7\tSource Well i5\tIndex i5\tPrimer i5
+        A1\t20.55\t12.751753\t80.0\t8_29_13_rk_rh\tABTX_35\t1841.0\tA23\tCGCTTAAC\tiTru7_110_05\tG1\tGTTCCATG\tiTru5_01_G
+        C1\t9.15\t17.582063\t57.5\t8_29_13_rk_lh\tABTX_35\t1842.0\tB23\tCACCACTA\tiTru7_110_06\tH1\tTAGCTGAG\tiTru5_01_H'''
+
+        def read(f):
+            # the tables above are indented along with the code
+            f = '\n'.join(line.lstrip() for line in f.splitlines())
+            return(pd.read_csv(StringIO(f), header=0, sep='\t'))
 
-        test_index_picklist_df = pd.read_csv(StringIO(test_index_picklist_f), header=0, sep='\t')
-        test_dna_picklist_df = pd.read_csv(StringIO(test_dna_picklist_f), header=0, sep='\t')
-        test_qpcr_df = pd.read_csv(StringIO(test_qpcr_f), header=0, sep='\t')
+        test_index_picklist_df = read(test_index_picklist_f)
+        test_dna_picklist_df = read(test_dna_picklist_f)
+        test_qpcr_df = read(test_qpcr_f)
 
-        exp_df = pd.read_csv(StringIO(exp_out_f), header=0, sep='\t')
+        exp_df = read(exp_out_f)
 
         combined_df = combine_dfs(test_qpcr_df, test_dna_picklist_df, test_index_picklist_df)
 
-        pd.testing.assert_frame_equal(combined_df, exp_df, check_like=True)
+        pd.testing.assert_frame_equal(combined_df, exp_df)
+
+        # several plates, keyed on plate as well as well
+        def two_plates(df):
+            other = df.copy()
+            if 'Cp' in other:
+                other['Cp'] = other['Cp'] + 1
+            return(pd.concat([df.assign(Run='p1'), other.assign(Run='p2')],
+                             ignore_index=True))
+
+        combined_df = combine_dfs(two_plates(test_qpcr_df),
+                                  two_plates(test_dna_picklist_df),
+                                  two_plates(test_index_picklist_df),
+                                  plate_col='Run')
+
+        exp_2 = two_plates(exp_df)
+        exp_2 = exp_2[['Run'] + list(exp_df.columns)]
+        pd.testing.assert_frame_equal(combined_df, exp_2)
+
+        # wells missing from a pick list are left empty
+        combined_df = combine_dfs(test_qpcr_df, test_dna_picklist_df.iloc[:3],
+                                  test_index_picklist_df)
+        self.assertTrue(np.isnan(combined_df['DNA Concentration'][1]))
+        self.assertEqual(combined_df['Index i5'][1], 'TAGCTGAG')
+
+        with self.assertRaisesRegex(ValueError, 'more than one'):
+            combine_dfs(test_qpcr_df,
+                        pd.concat([test_dna_picklist_df] * 2),
+                        test_index_picklist_df)
 
     def test_add_dna_conc(self):
         test_dna = '''Well\tpico_conc
@@ -648,6 +1205,141 @@ class Tests(TestCase):
 
         self.assertEqual(exp_sample_sheet_2, obs_sample_sheet_2)
 
+    def test_write_sample_sheet(self):
+        sample_sheet_dict = {'comments': 'PI\tKnight\n',
+                             'IEMFileVersion': '4',
+                             'Investigator Name': 'Knight',
+                             'Experiment Name': '',
+                             'Date': '2017-08-13',
+                             'Workflow': 'GenerateFASTQ',
+                             'Application': 'FASTQ Only',
+                             'Assay': 'Metagenomics',
+                             'Description': '',
+                             'Chemistry': 'Default',
+                             'read1': 150,
+                             'read2': 150,
+                             'ReverseComplement': '0'}
+
+        data_f = StringIO()
+        write_sample_data(data_f, ['sam1', 'sam2'],
+                          ['iTru7_101_01', 'iTru7_101_02'],
+                          ['ACGTTACC', 'CTGTGTTG'],
+                          ['iTru5_01_A', 'iTru5_01_B'],
+                          ['ACCGACAA', 'AGTGGCAA'], 'example', 'example_proj',
+                          wells=['A1', 'A2'], lanes=[1, 2], sep='\t')
+        data = data_f.getvalue()
+        data_f.seek(0)
+
+        obs_f = StringIO()
+        write_sample_sheet(obs_f, dict(sample_sheet_dict, data=data_f),
+                           sep='\t')
+
+        exp = format_sample_sheet(dict(sample_sheet_dict, data=data),
+                                  sep='\t')
+
+        self.assertEqual(obs_f.getvalue(), exp)
+        self.assertTrue(exp.startswith('# PI\tKnight\n[Header]\n'))
+        self.assertTrue(exp.endswith(
+            '[Data]\n'
+            'Lane\tSample_ID\tSample_Name\tSample_Plate\tSample_Well\t'
+            'I7_Index_ID\tindex\tI5_Index_ID\tindex2\tSample_Project\t'
+            'Description\n'
+            '1\tsam1\tsam1\texample\tA1\tiTru7_101_01\tACGTTACC\t'
+            'iTru5_01_A\tACCGACAA\texample_proj\t\n'
+            '1\tsam2\tsam2\texample\tA2\tiTru7_101_02\tCTGTGTTG\t'
+            'iTru5_01_B\tAGTGGCAA\texample_proj\t\n'
+            '2\tsam1\tsam1\texample\tA1\tiTru7_101_01\tACGTTACC\t'
+            'iTru5_01_A\tACCGACAA\texample_proj\t\n'
+            '2\tsam2\tsam2\texample\tA2\tiTru7_101_02\tCTGTGTTG\t'
+            'iTru5_01_B\tAGTGGCAA\texample_proj\t'))
+
+        # the caller's comments are left as they were
+        self.assertEqual(sample_sheet_dict['comments'], 'PI\tKnight\n')
+
+        with self.assertRaises(ValueError):
+            write_sample_data(StringIO(), ['sam1', 'sam2'], ['i7'], ['A'],
+                              ['i5'], ['C'], 'example', 'example_proj')
+
+    def test_parse_sample_sheet(self):
+        sample_sheet_dict = {'comments': 'PI,Knight,robknight@ucsd.edu\n'
+                                         'Contact,Gail\n,ackermag@ucsd.edu\n',
+                             'IEMFileVersion': '4',
+                             'Investigator Name': 'Knight',
+                             'Experiment Name': '',
+                             'Date': '2017-08-13',
+                             'Workflow': 'GenerateFASTQ',
+                             'Application': 'FASTQ Only',
+                             'Assay': 'Metagenomics',
+                             'Description': '',
+                             'Chemistry': 'Default',
+                             'read1': '150',
+                             'read2': '150',
+                             'ReverseComplement': '0',
+                             'data': format_sample_data(
+                                 ['sam1', 'NA'],
+                                 ['iTru7_101_01', 'iTru7_101_02'],
+                                 ['ACGTTACC', 'CTGTGTTG'],
+                                 ['iTru5_01_A', 'iTru5_01_B'],
+                                 ['ACCGACAA', 'AGTGGCAA'], 'example',
+                                 'example_proj', wells=['A1', 'A2'],
+                                 lanes=[1, 2])}
+        sheet = format_sample_sheet(sample_sheet_dict)
+
+        obs = parse_sample_sheet(StringIO(sheet))
+
+        data = obs.pop('data')
+        exp = dict(sample_sheet_dict)
+        exp_data = pd.read_csv(StringIO(exp.pop('data')),
+                               keep_default_na=False,
+                               dtype={'Sample_ID': str, 'Sample_Name': str})
+        self.assertEqual(obs, exp)
+        pd.testing.assert_frame_equal(data, exp_data, check_dtype=False)
+        self.assertEqual(data['Lane'].dtype, np.int64)
+        self.assertEqual(data['Sample_ID'].tolist(), ['sam1', 'NA'] * 2)
+
+        # the parsed sheet formats back to the same text
+        self.assertEqual(format_sample_sheet(parse_sample_sheet(
+            StringIO(sheet))), sheet)
+
+        sheet = format_sample_sheet(dict(sample_sheet_dict, comments=''),
+                                    sep='\t')
+        self.assertEqual(format_sample_sheet(parse_sample_sheet(
+            StringIO(sheet), sep='\t'), sep='\t'), sheet)
+
+        with self.assertRaisesRegex(ValueError, 'no \\[Data\\] section'):
+            parse_sample_sheet(StringIO(sheet.split('[Data]')[0]))
+
+    def test_read_sample_sheets(self):
+        fp = os.path.join(os.path.dirname(__file__), '..', '..',
+                          'test_output', 'SampleSheets',
+                          'YYYY_MM_DD_FinRisk_33-36_samplesheet.csv')
+        with open(fp) as f:
+            sheet = f.read()
+        self.assertEqual(format_sample_sheet(parse_sample_sheet(fp)), sheet)
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        for name in ['run_2.csv', 'run_1.csv']:
+            shutil.copy(fp, os.path.join(tmp, name))
+        with open(os.path.join(tmp, 'notes.txt'), 'w') as f:
+            f.write('not a sample sheet')
+
+        data = parse_sample_sheet(fp)['data']
+        for processes in [1, 2]:
+            obs = read_sample_sheets(tmp, processes=processes)
+
+            self.assertEqual(obs.columns.tolist(),
+                             ['Sample Sheet'] + data.columns.tolist())
+            self.assertEqual(obs['Sample Sheet'].tolist(),
+                             ['run_1.csv'] * len(data) +
+                             ['run_2.csv'] * len(data))
+            pd.testing.assert_frame_equal(
+                obs.iloc[len(data):, 1:].reset_index(drop=True), data)
+
+        obs = read_sample_sheets([fp], processes=1)
+        self.assertEqual(len(obs), len(data))
+        self.assertEqual(len(read_sample_sheets([])), 0)
+
     def test_bcl_scrub_name(self):
         self.assertEqual('test_1', bcl_scrub_name('test.1'))
         self.assertEqual('test-1', bcl_scrub_name('test-1'))
@@ -655,6 +1347,14 @@ class Tests(TestCase):
 
     def test_rc(self):
         self.assertEqual(rc('AGCCT'), 'AGGCT')
+        self.assertEqual(rc('ANCcT'), 'AcGNT')
+
+    def test_rc_array(self):
+        obs = rc_array(['AGCCT', 'ANC', '', 'CGGA'])
+        npt.assert_array_equal(obs, ['AGGCT', 'GNT', '', 'TCCG'])
+
+        obs = rc_array(np.array([['AG', 'C'], ['TTA', 'G']]))
+        npt.assert_array_equal(obs, [['CT', 'G'], ['TAA', 'C']])
 
     def test_sequencer_i5_index(self):
         indices = ['AGCT','CGGA','TGCC']
@@ -672,6 +1372,19 @@ class Tests(TestCase):
         with self.assertRaises(ValueError):
             sequencer_i5_index('foo', indices)
 
+        # the container type is kept
+        obs = sequencer_i5_index('HiSeq4000', tuple(indices))
+        self.assertEqual(obs, tuple(exp_rc))
+
+        obs = sequencer_i5_index('HiSeq4000', np.array(indices))
+        npt.assert_array_equal(obs, exp_rc)
+
+        series = pd.Series(indices, index=[3, 4, 5], name='i5 sequence')
+        obs = sequencer_i5_index('HiSeq4000', series)
+        pd.testing.assert_series_equal(
+            obs, pd.Series(exp_rc, index=[3, 4, 5], name='i5 sequence',
+                           dtype=series.dtype))
+
     def test_format_sample_data(self):
         # test that single lane works
         exp_data = (
@@ -760,6 +1473,160 @@ class Tests(TestCase):
 
         self.assertEqual(obs_data, exp_data)
 
+    def test_format_sample_data_barcode_mismatches(self):
+        args = (['sam1', 'sam2', 'sam3'], ['i7_1', 'i7_2', 'i7_3'],
+                ['ACGTTACC', 'ACGTTACA', 'TGAGGTGT'], ['i5_1', 'i5_2', 'i5_3'],
+                ['ACCGACAA', 'ACCGACTA', 'CACAGACT'])
+        kwargs = dict(sample_plate='example', sample_proj='example_proj',
+                      lanes=[1, 2])
+
+        # sam1 and sam2 are one mismatch apart in each index
+        obs = format_sample_data(*args, barcode_mismatches=0, **kwargs)
+        self.assertEqual(obs, format_sample_data(*args, **kwargs))
+
+        with self.assertRaisesRegex(ValueError, '1 pair\\(s\\) of samples '
+                                    'cannot be demultiplexed with 1 barcode '
+                                    'mismatch\\(es\\) in lane\\(s\\) 1, 2'):
+            format_sample_data(*args, barcode_mismatches=1, **kwargs)
+
+    def test_find_index_collisions(self):
+        data = pd.DataFrame({'Lane': [1, 1, 1, 1, 2, 2],
+                             'Sample_ID': ['sam1', 'sam2', 'sam3', 'sam4',
+                                           'sam1', 'sam5'],
+                             'index': ['ACGTTACC', 'ACGTTACA', 'TGAGGTGT',
+                                       'TGAGGTGT', 'ACGTTACC', 'ACGTTACC'],
+                             'index2': ['ACCGACAA', 'ACCGACTA', 'CACAGACT',
+                                        'GTTCGTCC', 'ACCGACAA', 'ACCGACAA']})
+
+        obs = find_index_collisions(data)
+        exp = pd.DataFrame({'Lane': [1, 2],
+                            'Sample_ID 1': ['sam1', 'sam1'],
+                            'Sample_ID 2': ['sam2', 'sam5'],
+                            'index distance': [1, 0],
+                            'index2 distance': [1, 0]})
+        pd.testing.assert_frame_equal(obs, exp, check_dtype=False)
+
+        # the same pairs are found when comparing all of them
+        obs = find_index_collisions(data, barcode_mismatches=2)
+        self.assertEqual(obs[['Sample_ID 1', 'Sample_ID 2']].values.tolist(),
+                         [['sam1', 'sam2'], ['sam1', 'sam5']])
+
+        obs = find_index_collisions(data, barcode_mismatches=0)
+        self.assertEqual(obs[['Lane', 'Sample_ID 1', 'Sample_ID 2']]
+                         .values.tolist(), [[2, 'sam1', 'sam5']])
+
+        # single indexed sheets without lanes
+        obs = find_index_collisions(data.loc[:3, ['Sample_ID', 'index']])
+        self.assertEqual(obs.values.tolist(), [[0, 'sam1', 'sam2', 1, 0],
+                                               [0, 'sam3', 'sam4', 0, 0]])
+
+        # every pair of samples sharing indices is reported, whichever way
+        # the pairs are found
+        data = pd.DataFrame({'Lane': [1, 1, 1, 1],
+                             'Sample_ID': ['a', 'b', 'c', 'd'],
+                             'index': ['ACGTACGT'] * 3 + ['TGAGGTGT'],
+                             'index2': ['TTGGCCAA'] * 3 + ['CACAGACT']})
+        for barcode_mismatches in (0, 1, 2):
+            obs = find_index_collisions(data, barcode_mismatches)
+            self.assertEqual(obs[['Sample_ID 1', 'Sample_ID 2']]
+                             .values.tolist(),
+                             [['a', 'b'], ['a', 'c'], ['b', 'c']])
+
+        # parsed sample sheets are checked as they are
+        obs = find_index_collisions(self._sample_data())
+        self.assertEqual(len(obs), 0)
+        self.assertEqual(list(obs.columns),
+                         ['Lane', 'Sample_ID 1', 'Sample_ID 2',
+                          'index distance', 'index2 distance'])
+
+    def _sample_data(self):
+        return(pd.read_csv(StringIO(format_sample_data(
+            ['sam1', 'sam2'], ['iTru7_101_01', 'iTru7_101_02'],
+            ['ACGTTACC', 'CTGTGTTG'], ['iTru5_01_A', 'iTru5_01_B'],
+            ['ACCGACAA', 'AGTGGCAA'], wells=['A1', 'A2'],
+            sample_plate='example', sample_proj='example_proj',
+            lanes=[1, 2]))))
+
+    def test_read_stats_json(self):
+        def sample(sample_id, reads):
+            return({'SampleId': sample_id, 'SampleName': sample_id,
+                    'IndexMetrics': [{'IndexSequence': 'ACGTTACC+ACCGACAA',
+                                      'MismatchCounts': {'0': reads,
+                                                         '1': 0}}],
+                    'NumberReads': reads, 'Yield': reads * 151,
+                    'ReadMetrics': [{'ReadNumber': 1, 'Yield': reads}]})
+
+        stats = {'Flowcell': 'HXXXXXXXX', 'RunNumber': 1, 'RunId': 'run',
+                 'ReadInfosForLanes': [{'LaneNumber': 1, 'ReadInfos': []},
+                                       {'LaneNumber': 2, 'ReadInfos': []}],
+                 'ConversionResults': [
+                     {'LaneNumber': 1, 'TotalClustersRaw': 1000,
+                      'TotalClustersPF': 900, 'Yield': 1,
+                      'DemuxResults': [sample('sam1', 400), sample('sam2',
+                                                                   300)],
+                      'Undetermined': {'NumberReads': 200, 'Yield': 1}},
+                     {'LaneNumber': 2, 'TotalClustersRaw': 1000,
+                      'TotalClustersPF': 900, 'Yield': 1,
+                      'DemuxResults': [sample('sam1', 350), sample('sam2',
+                                                                   0)],
+                      'Undetermined': {'NumberReads': 550, 'Yield': 1}}],
+                 'UnknownBarcodes': [{'Lane': 1,
+                                      'Barcodes': {'AAAAAAAA+CCCCCCCC': 90}}]}
+
+        exp = pd.DataFrame({'Sample_ID': ['sam1', 'sam2', 'sam1', 'sam2'],
+                            'Lane': [1, 1, 2, 2],
+                            'Reads': [400, 300, 350, 0]})
+
+        for text in [json.dumps(stats), json.dumps(stats, indent=4)]:
+            obs = read_stats_json(StringIO(text))
+            pd.testing.assert_frame_equal(obs, exp, check_dtype=False)
+
+        # the counts join the sample sheet rows
+        joined = pd.merge(self._sample_data(), obs, on=['Sample_ID', 'Lane'])
+        self.assertEqual(joined['Reads'].tolist(), [400, 300, 350, 0])
+
+        obs = read_stats_json(StringIO('{"ConversionResults": []}'))
+        self.assertEqual(len(obs), 0)
+
+        with self.assertRaisesRegex(ValueError, 'ends within'):
+            read_stats_json(StringIO(json.dumps(stats)[:400]))
+
+    def test_read_multiqc_counts(self):
+        multiqc = ('Sample\tFilename\tTotal Sequences\t%GC\n'
+                   'sam1_S1_L001_R1_001\tsam1_S1_L001_R1_001.fastq.gz\t'
+                   '400.0\t45.0\n'
+                   'sam1_S1_L001_R2_001\tsam1_S1_L001_R2_001.fastq.gz\t'
+                   '400.0\t46.0\n'
+                   'sam2_S2_L001_R1_001\tsam2_S2_L001_R1_001.fastq.gz\t'
+                   '300.0\t45.0\n'
+                   'sam1_S1_L002_R1_001\tsam1_S1_L002_R1_001.fastq.gz\t'
+                   '350.0\t45.0\n'
+                   'multiqc_report\tother.txt\t1.0\t0.0\n')
+
+        obs = read_multiqc_counts(StringIO(multiqc))
+
+        exp = pd.DataFrame({'Sample_ID': ['sam1', 'sam2', 'sam1'],
+                            'Lane': [1, 1, 2],
+                            'Reads': [400, 300, 350]})
+        pd.testing.assert_frame_equal(obs, exp, check_dtype=False)
+
+        joined = pd.merge(self._sample_data(), obs, on=['Sample_ID', 'Lane'],
+                          how='left')
+        self.assertEqual(joined['Reads'].fillna(0).tolist(),
+                         [400, 300, 350, 0])
+
+        # the names of the repooling notebook, which have no lane
+        multiqc = ('Sample\tTotal Sequences\n'
+                   'sam1.R1.trimmed.filtered.fastq\t400\n'
+                   'sam1.R2.trimmed.filtered.fastq\t400\n')
+        obs = read_multiqc_counts(
+            StringIO(multiqc),
+            regex=r'^(?P<sample>.+?)\.R(?P<read>\d)\.trimmed\.filtered\.')
+        self.assertEqual(obs.values.tolist(), [['sam1', 0, 400]])
+
+        with self.assertRaisesRegex(ValueError, 'no Sample'):
+            read_multiqc_counts(StringIO(multiqc), count_col='Reads')
+
     def test_reformat_interleaved_to_columns(self):
         wells = ['A1','A23','C1','C23',
                  'A2','A24','C2','C24',
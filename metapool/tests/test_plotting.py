@@ -0,0 +1,108 @@
+from unittest import TestCase, main
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# seconds allowed for `import metapool.metapool` in a fresh interpreter; the
+# plotting stack is not part of this budget
+IMPORT_BUDGET = 3.0
+
+
+class PlottingTests(TestCase):
+
+    def _python(self, code):
+        env = dict(os.environ, MPLBACKEND='agg')
+        start = time.time()
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+
+        return(out.decode().strip(), time.time() - start)
+
+    def assertValidPdf(self, data, pages):
+        # the cross-reference table points at every object
+        xref = int(data[data.rindex(b'startxref') + 9:].split()[0])
+        table, trailer = data[xref:].split(b'trailer', 1)
+        objects = {}
+        for number, entry in enumerate(table.split(b'\n')[2:-1]):
+            if entry.endswith(b'n '):
+                offset = int(entry.split()[0])
+                self.assertTrue(data.startswith(b'%d 0 obj' % number, offset))
+                objects[number] = data[offset:data.index(b'endobj', offset)]
+
+        # references outside of streams are to objects of the file
+        for body in objects.values():
+            for ref in re.findall(rb'(\d+) 0 R', body.split(b'stream\n')[0]):
+                self.assertIn(int(ref), objects)
+
+        root = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+        tree = int(re.search(rb'/Pages (\d+) 0 R', objects[root]).group(1))
+        self.assertIn(b'/Count %d' % pages, objects[tree])
+        kids = re.search(rb'/Kids \[(.*?)\]', objects[tree]).group(1)
+        kids = [int(kid) for kid in re.findall(rb'(\d+) 0 R', kids)]
+        self.assertEqual(len(kids), pages)
+        for kid in kids:
+            self.assertIn(b'/Type /Page ', objects[kid])
+            self.assertIn(b'/Parent %d 0 R' % tree, objects[kid])
+
+    def test_import_is_headless(self):
+        out, elapsed = self._python(
+            'import sys\n'
+            'import metapool.metapool, metapool.cli\n'
+            'print(sorted(m for m in sys.modules\n'
+            '             if m.split(".")[0] in ("matplotlib", "seaborn")))')
+
+        self.assertEqual(out, '[]')
+        self.assertLess(elapsed, IMPORT_BUDGET)
+
+    def test_plot_plate_vals(self):
+        out, _ = self._python(
+            'import sys\n'
+            'import numpy as np\n'
+            'from metapool.metapool import plot_plate_vals\n'
+            'plot_plate_vals(np.arange(96, dtype=float).reshape(8, 12))\n'
+            'import matplotlib.pyplot as plt\n'
+            'print(len(plt.get_fignums()))')
+
+        self.assertEqual(out.splitlines()[-1], '1')
+
+    def test_render_plates(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+
+        out, _ = self._python(
+            'import os\n'
+            'import numpy as np\n'
+            'from metapool.plotting import render_plates\n'
+            'import matplotlib.pyplot as plt\n'
+            'plates = {"A": np.arange(96.).reshape(8, 12),\n'
+            '          "B": np.ones((8, 12))}\n'
+            'names = np.full((8, 12), "sample", dtype=object)\n'
+            'tmp = %r\n'
+            'print(render_plates(plates, os.path.join(tmp, "plates.pdf"),\n'
+            '                    distribution=False, processes=2))\n'
+            'print(render_plates(list(plates.values()),\n'
+            '                    os.path.join(tmp, "png"),\n'
+            '                    annot_strs=[None, names], processes=1))\n'
+            'print(len(plt.get_fignums()))' % tmp)
+        pdf, pngs, figures = out.splitlines()[-3:]
+
+        self.assertEqual(pdf, str([os.path.join(tmp, 'plates.pdf')]))
+        self.assertEqual(pngs, str([os.path.join(tmp, 'png', 'plate_1.png'),
+                                    os.path.join(tmp, 'png', 'plate_2.png')]))
+        # nothing is left open in the calling process
+        self.assertEqual(figures, '0')
+
+        with open(os.path.join(tmp, 'plates.pdf'), 'rb') as f:
+            self.assertValidPdf(f.read(), pages=2)
+        for name in ('plate_1.png', 'plate_2.png'):
+            with open(os.path.join(tmp, 'png', name), 'rb') as f:
+                self.assertEqual(f.read(8), b'\x89PNG\r\n\x1a\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+from unittest import TestCase, main
+
+import json
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from metapool.metapool import calculate_norm_vol, format_dna_norm_picklist
+from metapool.profiling import Profile, STAGES, instrument, stage
+
+
+@instrument
+def _allocate(n):
+    return(np.ones(n).sum())
+
+
+class ProfilingTests(TestCase):
+
+    def test_registry(self):
+        self.assertIn('calculate_norm_vol', STAGES)
+        self.assertIn('format_dna_norm_picklist', STAGES)
+        self.assertEqual(calculate_norm_vol.__name__, 'calculate_norm_vol')
+
+    def test_disabled(self):
+        prof = Profile()
+        calculate_norm_vol(np.array([1., 2.]))
+        self.assertEqual(prof.records, {})
+
+    def test_profile(self):
+        with Profile() as prof:
+            with stage('normalize', rows=4):
+                vols = calculate_norm_vol(np.array([[1., 2.], [5., 10.]]))
+                format_dna_norm_picklist(vols.ravel(), 3500 - vols.ravel(),
+                                         np.array(['A1', 'A2', 'B1', 'B2']))
+            _allocate(1000000)
+            _allocate(10)
+
+        # nothing is recorded once the profile is closed
+        _allocate(10)
+
+        obs = prof.to_frame()
+        self.assertListEqual(list(obs.columns), Profile.columns)
+        self.assertListEqual(list(obs['stage']),
+                             ['calculate_norm_vol', 'write_dna_norm_picklist',
+                              'format_dna_norm_picklist', 'normalize',
+                              '_allocate'])
+
+        obs = obs.set_index('stage')
+        self.assertListEqual(list(obs['calls']), [1, 1, 1, 1, 2])
+        self.assertEqual(obs.loc['calculate_norm_vol', 'rows'], 4)
+        self.assertEqual(obs.loc['normalize', 'rows'], 4)
+        self.assertTrue(pd.isnull(obs.loc['_allocate', 'rows']))
+
+        # the enclosing stage includes the time of the stages it calls
+        self.assertGreaterEqual(obs.loc['normalize', 'wall time'],
+                                obs.loc['format_dna_norm_picklist',
+                                        'wall time'])
+        self.assertGreaterEqual(obs.loc['_allocate', 'peak memory'],
+                                1000000 * 8)
+        self.assertGreaterEqual(obs.loc['normalize', 'peak memory'],
+                                obs.loc['write_dna_norm_picklist',
+                                        'peak memory'])
+
+        f = StringIO()
+        prof.to_json(f)
+        records = json.loads(f.getvalue())
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[-1]['stage'], '_allocate')
+        self.assertEqual(records[-1]['calls'], 2)
+
+        f = StringIO()
+        prof.to_csv(f)
+        self.assertTrue(f.getvalue().startswith(
+            'stage,calls,wall time,rows,peak memory\n'
+            'calculate_norm_vol,1,'))
+
+    def test_without_memory(self):
+        with Profile(memory=False) as prof:
+            _allocate(1000)
+
+        self.assertEqual(prof.records['_allocate']['peak memory'], 0)
+        self.assertEqual(prof.records['_allocate']['calls'], 1)
+
+
+if __name__ == '__main__':
+    main()
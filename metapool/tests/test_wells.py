@@ -0,0 +1,147 @@
+from unittest import TestCase, main
+
+import numpy as np
+
+from metapool.wells import (plate_shape, row_name, well_names, well_to_index,
+                            index_to_well, well_to_rowcol, LAYOUT_TRANSFORMS,
+                            layout_shapes, layout_permutation,
+                            transform_wells, transform_layout)
+
+
+class Tests(TestCase):
+
+    def test_plate_shape(self):
+        self.assertEqual(plate_shape(96), (8, 12))
+        self.assertEqual(plate_shape(384), (16, 24))
+        self.assertEqual(plate_shape(1536), (32, 48))
+
+        with self.assertRaises(ValueError):
+            plate_shape(100)
+
+    def test_row_name(self):
+        self.assertEqual(row_name(0), 'A')
+        self.assertEqual(row_name(25), 'Z')
+        self.assertEqual(row_name(26), 'AA')
+        self.assertEqual(row_name(31), 'AF')
+
+    def test_well_names(self):
+        np.testing.assert_array_equal(well_names(2, 3),
+                                      ['A1', 'A2', 'A3', 'B1', 'B2', 'B3'])
+
+        obs = well_names(32, 48)
+        self.assertEqual(len(obs), 1536)
+        self.assertEqual(obs[-1], 'AF48')
+
+        # tables are shared, so must not be modified in place
+        with self.assertRaises(ValueError):
+            obs[0] = 'foo'
+
+    def test_well_to_index(self):
+        obs = well_to_index(['A1', 'A24', 'B1', 'P24'])
+        np.testing.assert_array_equal(obs, [0, 23, 24, 383])
+
+        # zero-padded and lower-case names
+        obs = well_to_index(['A01', 'b02', 'C10'], rows=8, cols=12)
+        np.testing.assert_array_equal(obs, [0, 13, 33])
+
+        # shape is kept
+        obs = well_to_index([['A1', 'A2'], ['B1', 'B2']], rows=2, cols=2)
+        np.testing.assert_array_equal(obs, [[0, 1], [2, 3]])
+
+        with self.assertRaises(ValueError):
+            well_to_index(['A1', 'I1'], rows=8, cols=12)
+
+        with self.assertRaises(ValueError):
+            well_to_index(['A13'], rows=8, cols=12)
+
+    def test_index_to_well(self):
+        np.testing.assert_array_equal(index_to_well([0, 23, 24, 383]),
+                                      ['A1', 'A24', 'B1', 'P24'])
+        np.testing.assert_array_equal(index_to_well([1535], 32, 48),
+                                      ['AF48'])
+
+    def test_well_to_rowcol(self):
+        row, col = well_to_rowcol(['A1', 'B12', 'AF48'], rows=32, cols=48)
+
+        np.testing.assert_array_equal(row, [0, 1, 31])
+        np.testing.assert_array_equal(col, [0, 11, 47])
+
+    def test_layout_permutation(self):
+        for transform in LAYOUT_TRANSFORMS:
+            obs = layout_permutation(transform)
+            source, destination = layout_shapes(transform)
+            self.assertEqual(len(obs), np.prod(source))
+            np.testing.assert_array_equal(np.sort(obs), np.arange(len(obs)))
+
+            # compiled once
+            self.assertIs(layout_permutation(transform), obs)
+            with self.assertRaises(ValueError):
+                obs[0] = 1
+
+        # each transform is undone by the next one
+        for forward, inverse in zip(LAYOUT_TRANSFORMS[::2],
+                                    LAYOUT_TRANSFORMS[1::2]):
+            obs = layout_permutation(inverse)[layout_permutation(forward)]
+            np.testing.assert_array_equal(obs, np.arange(len(obs)))
+
+        with self.assertRaisesRegex(ValueError, 'not recognized'):
+            layout_permutation('96_to_1536')
+
+    def test_transform_wells(self):
+        # as the quadrants of a 384 well plate are stamped from 96 well plates
+        obs = transform_wells(['A1', 'A1', 'A1', 'A1', 'B3', 'H12'],
+                              '96_to_384', plates=[0, 1, 2, 3, 0, 3])
+        np.testing.assert_array_equal(obs, ['A1', 'A2', 'B1', 'B2', 'C5',
+                                            'P24'])
+
+        plates, obs = transform_wells(['A1', 'A2', 'B1', 'B2', 'C5', 'P24'],
+                                      '384_to_96')
+        np.testing.assert_array_equal(plates, [0, 1, 2, 3, 0, 3])
+        np.testing.assert_array_equal(obs, ['A1', 'A1', 'A1', 'A1', 'B3',
+                                            'H12'])
+
+        obs = transform_wells(['A1', 'A24'], '384_to_1536', plates=[1, 2])
+        np.testing.assert_array_equal(obs, ['A2', 'B47'])
+
+        obs = transform_wells(['A1', 'B6', 'D24'], 'columns_to_interleaved')
+        np.testing.assert_array_equal(
+            transform_wells(obs, 'interleaved_to_columns'),
+            ['A1', 'B6', 'D24'])
+
+        with self.assertRaisesRegex(ValueError, 'plate of each well'):
+            transform_wells(['A1'], '96_to_384')
+
+        with self.assertRaisesRegex(ValueError, 'numbered 0 to 3'):
+            transform_wells(['A1'], '96_to_384', plates=[4])
+
+    def test_transform_layout(self):
+        plates = np.arange(384).reshape(4, 8, 12)
+
+        obs = transform_layout(plates, '96_to_384')
+        self.assertEqual(obs.shape, (16, 24))
+        np.testing.assert_array_equal(obs[:2, :3], [[0, 96, 1],
+                                                    [192, 288, 193]])
+
+        np.testing.assert_array_equal(transform_layout(obs, '384_to_96'),
+                                      plates)
+
+        # flat values stay flat, and further dimensions are kept
+        obs = transform_layout(np.arange(384), '96_to_384')
+        np.testing.assert_array_equal(obs[:3], [0, 96, 1])
+
+        obs = transform_layout(np.zeros((16, 24, 2)), '384_to_96')
+        self.assertEqual(obs.shape, (4, 8, 12, 2))
+
+        # values follow the wells they were measured in
+        wells = well_names(16, 24)
+        np.testing.assert_array_equal(
+            transform_layout(transform_wells(wells, 'interleaved_to_columns'),
+                             'interleaved_to_columns'),
+            wells)
+
+        with self.assertRaisesRegex(ValueError, 'Expected 384 wells'):
+            transform_layout(np.zeros((8, 12)), '96_to_384')
+
+
+if __name__ == "__main__":
+    main()
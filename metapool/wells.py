@@ -0,0 +1,386 @@
+import string
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+# (rows, cols) of the standard microplate formats
+PLATE_SHAPES = {96: (8, 12),
+                384: (16, 24),
+                1536: (32, 48)}
+
+
+def plate_shape(n_wells):
+    """
+    Looks up the (rows, cols) shape of a standard plate
+
+    Parameters
+    ----------
+    n_wells: int
+        number of wells on the plate (96, 384 or 1536)
+
+    Returns
+    -------
+    shape: tuple of int
+        the number of rows and columns of the plate
+    """
+    try:
+        return(PLATE_SHAPES[n_wells])
+    except KeyError:
+        raise ValueError('Plate size %r is not recognized. Recognized sizes '
+                         'are: %s' % (n_wells,
+                                      ', '.join(map(str, PLATE_SHAPES))))
+
+
+def row_name(row):
+    """
+    Names a zero-based plate row, 'A'-'Z' then 'AA', 'AB', ... as on
+    1536 well plates
+
+    Parameters
+    ----------
+    row: int
+        zero-based row number
+
+    Returns
+    -------
+    str
+        the row letters
+    """
+    letters = string.ascii_uppercase
+    if row < len(letters):
+        return(letters[row])
+
+    return(row_name(row // len(letters) - 1) + letters[row % len(letters)])
+
+
+@lru_cache(maxsize=None)
+def _well_table(rows, cols):
+    """Well names of a plate in row-major order, and a hash index on them
+
+    Zero-padded column numbers ('A01') are indexed alongside the plain
+    names so that either spelling decodes to the same well.
+    """
+    names = np.array(['%s%d' % (row_name(r), c + 1)
+                      for r in range(rows) for c in range(cols)],
+                     dtype=object)
+    names.flags.writeable = False
+
+    flat = np.arange(rows * cols)
+    padded = np.array(['%s%02d' % (row_name(r), c + 1)
+                       for r in range(rows) for c in range(cols)],
+                      dtype=object)
+    aliased = padded != names
+
+    index = pd.Index(np.concatenate([names, padded[aliased]]))
+    codes = np.concatenate([flat, flat[aliased]])
+
+    return(names, index, codes)
+
+
+def well_names(rows=16, cols=24):
+    """
+    Lists the well names of a plate in row-major order
+
+    Parameters
+    ----------
+    rows: int
+        number of rows on the plate
+    cols: int
+        number of cols on the plate
+
+    Returns
+    -------
+    names: numpy array of str
+        read-only array of `rows * cols` well names, 'A1', 'A2', ...
+    """
+    return(_well_table(rows, cols)[0])
+
+
+def well_to_index(wells, rows=16, cols=24):
+    """
+    Encodes well names as flat, row-major well indices
+
+    Parameters
+    ----------
+    wells: array-like of str
+        well names, in 'A1,B12' format
+    rows: int
+        number of rows on the plate
+    cols: int
+        number of cols on the plate
+
+    Returns
+    -------
+    index: numpy array of int
+        flat well indices, in the same shape as `wells`
+
+    Raises
+    ------
+    ValueError
+        if any of the wells is not on a plate of the given shape
+    """
+    shape = np.shape(wells)
+    wells = np.asarray(wells, dtype=object).ravel()
+
+    _, table, codes = _well_table(rows, cols)
+    found = table.get_indexer(wells)
+
+    # retry lower-case or otherwise untidy well names
+    missing = found < 0
+    if missing.any():
+        tidy = pd.Series(wells[missing], dtype=object).str.strip().str.upper()
+        found[missing] = table.get_indexer(tidy.values)
+        missing = found < 0
+
+    if missing.any():
+        raise ValueError('Well(s) %s are not on a %d x %d plate' %
+                         (', '.join(map(str, wells[missing][:5])), rows, cols))
+
+    return(codes[found].reshape(shape))
+
+
+def index_to_well(index, rows=16, cols=24):
+    """
+    Decodes flat, row-major well indices to well names
+
+    Parameters
+    ----------
+    index: array-like of int
+        flat well indices
+    rows: int
+        number of rows on the plate
+    cols: int
+        number of cols on the plate
+
+    Returns
+    -------
+    wells: numpy array of str
+        the well names, in the same shape as `index`
+    """
+    return(well_names(rows, cols)[np.asarray(index)])
+
+
+def well_to_rowcol(wells, rows=16, cols=24):
+    """
+    Encodes well names as zero-based row and column numbers
+
+    Parameters
+    ----------
+    wells: array-like of str
+        well names, in 'A1,B12' format
+    rows: int
+        number of rows on the plate
+    cols: int
+        number of cols on the plate
+
+    Returns
+    -------
+    row: numpy array of int
+        zero-based row of each well
+    col: numpy array of int
+        zero-based column of each well
+    """
+    return(np.divmod(well_to_index(wells, rows, cols), cols))
+
+
+def _interleaved_to_columns():
+    """Destination of each well when unpacking interleaved 384 well plates
+
+    The four 96 well plates condensed as plate1 | plate2 over plate3 |
+    plate4 are packed into contiguous columns, plate1 | plate2 | plate3 |
+    plate4.
+    """
+    row, col = np.indices((16, 24)).reshape(2, -1)
+
+    roffset = row % 2
+    nrow = row - roffset + col // 12
+    ncol = (col % 2 + roffset * 2) * 6 + (col // 2) % 6
+
+    return(nrow * 24 + ncol)
+
+
+def _quadrants(rows, cols):
+    """Destination of each well when interleaving four plates into one
+
+    Wells of the first plate go to odd rows and odd columns of the larger
+    plate, the second plate to odd rows and even columns, the third plate
+    to even rows and odd columns and the fourth to even rows and columns.
+    """
+    plate, row, col = np.indices((4, rows, cols)).reshape(3, -1)
+
+    return((2 * row + plate // 2) * 2 * cols + 2 * col + plate % 2)
+
+
+# transform: ((plates, rows, cols) of the source layout, (plates, rows, cols)
+# of the destination layout, destination of each source well)
+_LAYOUTS = {'interleaved_to_columns': ((1, 16, 24), (1, 16, 24),
+                                       _interleaved_to_columns),
+            '96_to_384': ((4, 8, 12), (1, 16, 24),
+                          lambda: _quadrants(8, 12)),
+            '384_to_1536': ((4, 16, 24), (1, 32, 48),
+                            lambda: _quadrants(16, 24))}
+
+_INVERSES = {'columns_to_interleaved': 'interleaved_to_columns',
+             '384_to_96': '96_to_384',
+             '1536_to_384': '384_to_1536'}
+_INVERSES.update({v: k for k, v in _INVERSES.items()})
+
+# names of the layout transforms, each followed by its inverse
+LAYOUT_TRANSFORMS = ('interleaved_to_columns', 'columns_to_interleaved',
+                     '96_to_384', '384_to_96', '384_to_1536', '1536_to_384')
+
+
+def layout_shapes(transform):
+    """
+    Looks up the source and destination layouts of a transform
+
+    Parameters
+    ----------
+    transform: str
+        one of `LAYOUT_TRANSFORMS`
+
+    Returns
+    -------
+    source: tuple of int
+        the number of plates, rows and columns transformed
+    destination: tuple of int
+        the number of plates, rows and columns they are transformed into
+    """
+    if transform in _LAYOUTS:
+        return(_LAYOUTS[transform][:2])
+    if transform in _INVERSES:
+        return(_LAYOUTS[_INVERSES[transform]][1::-1])
+
+    raise ValueError('Layout transform %r is not recognized. Recognized '
+                     'transforms are: %s' % (transform,
+                                             ', '.join(LAYOUT_TRANSFORMS)))
+
+
+@lru_cache(maxsize=None)
+def layout_permutation(transform):
+    """
+    Compiles a layout transform into a permutation of flat well indices
+
+    Wells are numbered row-major within each plate, plate after plate, so
+    that the wells of the third 96 well plate of a stack are numbered 192
+    to 287.
+
+    Parameters
+    ----------
+    transform: str
+        one of `LAYOUT_TRANSFORMS`
+
+    Returns
+    -------
+    permutation: numpy array of int
+        read-only array holding the destination index of each source well
+    """
+    # raises ValueError for unknown transforms
+    layout_shapes(transform)
+
+    if transform in _LAYOUTS:
+        permutation = _LAYOUTS[transform][2]()
+    else:
+        permutation = np.argsort(layout_permutation(_INVERSES[transform]))
+
+    permutation.flags.writeable = False
+
+    return(permutation)
+
+
+def transform_wells(wells, transform, plates=None):
+    """
+    Moves well names from one plate layout to another
+
+    Parameters
+    ----------
+    wells: array-like of str
+        well names, in 'A1,B12' format, on the source plates
+    transform: str
+        one of `LAYOUT_TRANSFORMS`
+    plates: array-like of int
+        zero-based number of the source plate of each well, required when
+        the source layout has several plates
+
+    Returns
+    -------
+    new_wells: numpy array of str
+        the destination well names, in the same shape as `wells`. When the
+        destination layout has several plates, a tuple of the zero-based
+        destination plate numbers and the well names is returned.
+
+    Raises
+    ------
+    ValueError
+        if the plates of the wells are missing or out of range
+    """
+    (n_source, rows, cols), (n_destination, new_rows, new_cols) = \
+        layout_shapes(transform)
+
+    index = well_to_index(wells, rows, cols)
+    if n_source > 1:
+        if plates is None:
+            raise ValueError('The plate of each well is needed to transform '
+                             'from %d plates' % n_source)
+        plates = np.asarray(plates)
+        if plates.size and (plates.min() < 0 or plates.max() >= n_source):
+            raise ValueError('Plates must be numbered 0 to %d'
+                             % (n_source - 1))
+        index = index + plates * (rows * cols)
+
+    index = layout_permutation(transform)[index]
+    if n_destination == 1:
+        return(index_to_well(index, new_rows, new_cols))
+
+    plates, index = np.divmod(index, new_rows * new_cols)
+
+    return(plates, index_to_well(index, new_rows, new_cols))
+
+
+def transform_layout(values, transform):
+    """
+    Moves per-well values from one plate layout to another
+
+    Parameters
+    ----------
+    values: array-like
+        per-well values of the source layout, either flat, as a plate or as
+        a stack of plates. Any further dimensions are kept.
+    transform: str
+        one of `LAYOUT_TRANSFORMS`
+
+    Returns
+    -------
+    new_values: numpy array
+        the values in the destination layout, flat if `values` was flat,
+        otherwise as a plate or as a stack of plates
+
+    Raises
+    ------
+    ValueError
+        if `values` does not hold one value per source well
+    """
+    source, destination = layout_shapes(transform)
+    values = np.asarray(values)
+
+    # the leading dimensions of values that hold the source wells
+    n = int(np.prod(source))
+    size, k = 1, 0
+    while size < n and k < values.ndim:
+        size *= values.shape[k]
+        k += 1
+    if size != n:
+        raise ValueError('Expected %d wells, found %s' % (n, values.shape))
+
+    # each destination well takes the value of the source well mapped to it
+    new_values = values.reshape((n,) + values.shape[k:])[
+        layout_permutation(_INVERSES[transform])]
+
+    if k == 1:
+        return(new_values)
+
+    shape = destination if destination[0] > 1 else destination[1:]
+
+    return(new_values.reshape(shape + values.shape[k:]))
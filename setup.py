@@ -71,5 +71,5 @@ setup(name='metapool',
                       'coverage': ["coverage"]},
       entry_points={
           'console_scripts': [
-              'calour=calour.cli:cmd',
+              'metapool=metapool.cli:main',
           ]})